@@ -0,0 +1,278 @@
+"""
+This file is used to benchmark building the whole chart catalog, offline.
+FRED is replaced by the stand-in in fedchallenge/offline.py (recorded series
+if you point it at recordings, made-up ones otherwise) and the cache lives
+in a temporary directory, so the numbers don't depend on the network, an API
+key, or what happens to be cached already.
+
+Every run times these stages over the catalog charts:
+
+fetch_cold   prefetch every series into an empty cache
+fetch_warm   prefetch again, now served from the SQLite cache
+shaping      get_datasets for every chart (arrays -> DataFrames)
+traces       one line trace per series per chart
+shapes       recession/FOMC shapes for every chart window
+build        create_line_graph for every chart, from the prefetched data
+layout       validating every chart's finished layout
+serialize    fig.to_json() for every chart
+export       rendering every chart with kaleido (skip with --no-export)
+
+Results are saved to benchmarks/results/<commit>.json, so a run can be
+compared to one from another commit:
+
+python benchmarks/bench_catalog.py
+python benchmarks/bench_catalog.py --compare <ref>
+
+where <ref> is anything git can resolve to a commit that has saved
+results: a branch, a tag or a merge-base, e.g.
+--compare $(git merge-base HEAD main).
+"""
+
+# Libraries
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+import pandas as pd
+import plotly
+import plotly.graph_objects as go
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fedchallenge import cache, fred_client, offline, traces, annotations, get_datasets, get_series_arrays
+from fedchallenge.catalog import select_specs, plan_build, prefetch, build_spec, _spec_window
+from fedchallenge.export import export_figures
+
+##############
+### SET-UP ###
+##############
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+STAGES = ('fetch_cold', 'fetch_warm', 'shaping', 'traces', 'shapes', 'build', 'layout',
+          'serialize', 'export')
+
+# a stage this much slower than the baseline counts as a regression
+REGRESSION_THRESHOLD = 1.10
+
+######################
+## HELPER FUNCTIONS ##
+######################
+
+def _timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def _commit():
+    # short hash of HEAD, marked dirty if tracked files have changed
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ('-dirty' if dirty else '')
+
+def _resolve(ref):
+    # the full hash of any git ref (a tag, a branch, HEAD~3, a merge-base),
+    # or None if git doesn't know it
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        return subprocess.run(['git', 'rev-parse', '--verify', '--quiet', ref + '^{commit}'],
+                              cwd=root, capture_output=True, text=True,
+                              check=True).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _chart_windows(specs):
+    # (start, end, units) for every spec, with open ends run to today
+    windows = []
+    for spec in specs:
+        start, end, units = _spec_window(spec)
+        windows.append((start, pd.Timestamp.now() if end is None else end, units))
+    return windows
+
+###############
+## BENCHMARK ##
+###############
+
+def run_once(specs, windows, plan, export = True, formats = ('png',), out_dir = None):
+    """
+    Runs every stage once, starting from an empty cache. Returns
+    {stage: seconds}.
+    """
+    seconds = {}
+    cache.purge_cache()
+    fred_client.forget_info()
+
+    _, seconds['fetch_cold'] = _timed(prefetch, plan)
+    store, seconds['fetch_warm'] = _timed(prefetch, plan)
+
+    def shaping():
+        for spec, (start, end, units) in zip(specs, windows):
+            get_datasets(spec['datalist'], units, start, end, preloaded = store)
+    _, seconds['shaping'] = _timed(shaping)
+
+    arrays = [get_series_arrays(spec['datalist'], units, start, end, preloaded = store)[0]
+              for spec, (start, end, units) in zip(specs, windows)]
+    def trace_stage():
+        for chart_arrays in arrays:
+            for data in chart_arrays:
+                traces.line_trace(data.dates, data.values, 'series', 'darkblue', 3)
+    _, seconds['traces'] = _timed(trace_stage)
+
+    def shapes():
+        for start, end, _ in windows:
+            annotations.recession_shapes(start, end) + annotations.fomc_shapes(start, end)
+    _, seconds['shapes'] = _timed(shapes)
+
+    figures_list, seconds['build'] = _timed(lambda: [build_spec(spec, store) for spec in specs])
+
+    layouts = [fig.layout.to_plotly_json() for fig in figures_list]
+    _, seconds['layout'] = _timed(lambda: [go.Figure(layout=layout) for layout in layouts])
+
+    _, seconds['serialize'] = _timed(lambda: [fig.to_json() for fig in figures_list])
+
+    if export:
+        chart_titles = [spec['chart_title'] for spec in specs]
+        _, seconds['export'] = _timed(export_figures, figures_list, chart_titles, out_dir, formats)
+    return seconds
+
+def run(names = None, tags = None, repeat = 5, recordings = None, latency = 0.0,
+        export = True, formats = ('png',)):
+    """
+    Benchmarks the catalog charts matching names/tags (everything if neither
+    is given) `repeat` times against the offline stand-in. Returns the
+    results as a dict, ready for save_results.
+    """
+    specs = select_specs(names, tags)
+    plan = plan_build(specs)
+    windows = _chart_windows(specs)
+
+    old_cache_dir = cache.CACHE_DIR
+    with tempfile.TemporaryDirectory() as tmp:
+        cache.CACHE_DIR = os.path.join(tmp, 'cache')
+        client = offline.install(recordings, latency = latency)
+        try:
+            runs = [run_once(specs, windows, plan, export, formats, os.path.join(tmp, 'charts'))
+                    for _ in range(repeat)]
+        finally:
+            cache.CACHE_DIR = old_cache_dir
+            fred_client.set_client(None)
+            fred_client.forget_info()
+
+    stages = {}
+    for stage in STAGES:
+        times = [seconds[stage] * 1000 for seconds in runs if stage in seconds]
+        if times:
+            stages[stage] = {'median_ms': float(np.median(times)),
+                             'min_ms': float(np.min(times)),
+                             'runs': len(times)}
+
+    return {'commit': _commit(),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'plotly': plotly.__version__,
+            'machine': platform.machine(),
+            'charts': len(specs),
+            'series': plan['unique_series'],
+            'recordings': recordings,
+            'latency': latency,
+            'requests': dict(client.calls),
+            'stages': stages}
+
+#############
+## RESULTS ##
+#############
+
+def save_results(results, results_dir = RESULTS_DIR):
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, f"{results['commit']}.json")
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    return path
+
+def load_results(ref, results_dir = RESULTS_DIR):
+    """
+    Loads saved results by file path, by any git ref to their commit (e.g.
+    main or a tag) or by a prefix of the commit's hash.
+    """
+    if os.path.exists(ref):
+        path = ref
+    else:
+        # results are saved under short hashes, which are prefixes of the full one
+        commit = _resolve(ref)
+        names = sorted(os.listdir(results_dir), key=lambda name: name.endswith('-dirty.json'))
+        matches = [name for name in names if name.startswith(ref)
+                   or (commit and commit.startswith(name[:-len('.json')].split('-')[0]))]
+        if not matches:
+            raise ValueError("No saved results for '%s' in %s" % (ref, results_dir))
+        path = os.path.join(results_dir, matches[0])
+    with open(path) as f:
+        return json.load(f)
+
+def compare(baseline, results):
+    """
+    Median time per stage for two sets of results side by side, with the
+    ratio new / baseline.
+    """
+    rows = []
+    for stage in STAGES:
+        if stage in baseline['stages'] and stage in results['stages']:
+            before = baseline['stages'][stage]['median_ms']
+            after = results['stages'][stage]['median_ms']
+            rows.append({'stage': stage,
+                         baseline['commit']: before,
+                         results['commit']: after,
+                         'ratio': after / before if before else float('nan')})
+    return pd.DataFrame(rows).set_index('stage')
+
+def report(results):
+    table = pd.DataFrame(results['stages']).T[['median_ms', 'min_ms', 'runs']]
+    return (f"{results['commit']}: {results['charts']} charts, {results['series']} series, "
+            f"requests {results['requests']}\n{table.round(2).to_string()}")
+
+##########
+## MAIN ##
+##########
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description='Benchmark building the chart catalog offline.')
+    parser.add_argument('--names', nargs='*', help='chart names (default: all)')
+    parser.add_argument('--tags', nargs='*', help='chart tags (default: all)')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--recordings', help='directory of recorded series (see offline.record_catalog)')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds added to every stand-in FRED request')
+    parser.add_argument('--no-export', action='store_true', help='skip the kaleido export stage')
+    parser.add_argument('--formats', nargs='*', default=['png'])
+    parser.add_argument('--compare', help='git ref, commit or results file to compare against')
+    parser.add_argument('--no-save', action='store_true', help="don't write the results file")
+    args = parser.parse_args(argv)
+
+    results = run(args.names, args.tags, args.repeat, args.recordings, args.latency,
+                  not args.no_export, tuple(args.formats))
+    print(report(results))
+    if not args.no_save:
+        print('saved to', save_results(results))
+
+    if args.compare:
+        table = compare(load_results(args.compare), results)
+        print(table.round(3).to_string())
+        regressions = table.index[table['ratio'] > REGRESSION_THRESHOLD].tolist()
+        if regressions:
+            print('slower than %s: %s' % (args.compare, ', '.join(regressions)))
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -26,59 +26,304 @@ Full input instructions can be found in the README.md file.
 """
 
 # Libraries
-from fredapi import Fred
 import config
-import plotly.express as px
 import pandas as pd
 import plotly.graph_objects as go
-from IPython.display import Image
 from plotly.subplots import make_subplots
-import datetime
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import warnings
 warnings.filterwarnings("ignore", category=FutureWarning) #stfu pandas
 from dotenv import load_dotenv
 load_dotenv()
+from fedchallenge import (cache, fred_client, transforms, annotations, traces, snapshot,
+                          instrument, vintages, expressions, align as alignment)
+from fedchallenge.store import SeriesArray
+
+# number of series fetch_many downloads at the same time
+FETCH_WORKERS = 8
 
 ######################
 ## HELPER FUNCTIONS ##
 ######################
 
-# Wrapper function for using FRED API
-def fred_api(data_series, units = 'lin'):
-    fred = Fred(api_key=FRED_API_KEY)
-    data = fred.get_series(data_series, units = units)
-    info = fred.get_series_info(data_series)
+# Wrapper function for using FRED API. Only observations between start and
+# end are requested (None means the whole history on that side). We only ever
+# download the level ('lin') of a series, any other units are computed
+# locally (see transforms.py) so one cached copy serves every transformation.
+# refresh = True forces a new download of the whole window (use it to pick up
+# revisions to old observations), ttl overrides cache.CACHE_TTL for this call,
+# and use_cache = False skips the cache entirely. vintage gets the series as
+# it was known on a past date, or 'first' for first releases (see
+# vintages.py).
+def fred_api(data_series, units = 'lin', start = None, end = None,
+             refresh = False, ttl = None, use_cache = True, vintage = None):
+    transformed, info = _fetch_units(data_series, [units], start, end,
+                                     refresh = refresh, ttl = ttl, use_cache = use_cache,
+                                     vintage = vintage)
+    return transformed[units].to_series(), info
+
+# Info for a series from the on-disk cache when it's there, so working out
+# how much history units need doesn't go to FRED for a cached series.
+def _cached_info(data_series):
+    entry = cache.load_entry(data_series)
+    if entry is None:
+        return fred_client.get_series_info(data_series)
+    fred_client.remember_info(data_series, entry['info'])
+    return entry['info']
+
+# Gets the level series once, wide enough to compute every one of units
+# inside start..end, and returns ({units: SeriesArray}, info) (see store.py).
+# If level is passed as (data, info) it's used instead of fetching, e.g. when
+# a catalog build has already loaded the series.
+def _fetch_units(data_series, units_list, start = None, end = None,
+                 refresh = False, ttl = None, use_cache = True, level = None,
+                 vintage = None):
+    for units in units_list:
+        if units not in transforms.UNITS:
+            raise ValueError("Unknown units '%s', expected one of %s"
+                             % (units, ', '.join(transforms.UNITS)))
+
+    start = None if start is None else pd.Timestamp(start)
+    level_start = start
+    if start is not None and any(units != 'lin' for units in units_list):
+        info = level[1] if level is not None else _cached_info(data_series)
+        level_start = start - max(transforms.lookback(units, info) for units in units_list)
+
+    if level is None and vintage is not None:
+        data, info = vintages.vintage_series(data_series, vintage, refresh, ttl, use_cache)
+    elif level is None:
+        data, info = _fetch_level(data_series, level_start, end, refresh, ttl, use_cache)
+    else:
+        data, info = level
+    if not isinstance(data, SeriesArray):
+        data = SeriesArray.from_series(data)
+    data = data.window(level_start, end)
+
+    transformed = {}
+    with instrument.span('shaping', series_id=data_series):
+        for units in units_list:
+            values = SeriesArray(data.dates, transforms.transform_array(data.values, units, info))
+            if level_start != start:
+                values = values.window(start, None)
+            transformed[units] = values
+    return transformed, info
+
+# Downloads/caches the level of a series. Series are served from the local
+# cache (see cache.py) when we have a fresh copy, and only the missing dates
+# are downloaded when we don't.
+def _fetch_level(data_series, start = None, end = None,
+                 refresh = False, ttl = None, use_cache = True):
+    units = 'lin'
+    start = None if start is None else pd.Timestamp(start)
+    end = None if end is None else pd.Timestamp(end)
+
+    # windows ending in the last year can still get new (or late) observations,
+    # so those get downloaded through to the latest one
+    fetch_end = end
+    if end is not None and end > pd.Timestamp.now() - pd.DateOffset(years=1):
+        fetch_end = None
+
+    def download(obs_start, obs_end):
+        data = fred_client.call('get_series', data_series, observation_start = obs_start,
+                                observation_end = obs_end, units = units)
+        data.index = pd.to_datetime(data.index)
+        return data
+
+    entry = cache.load_entry(data_series, units) if use_cache and not refresh else None
+
+    # nothing usable cached, download the window
+    if entry is None:
+        if use_cache:
+            instrument.count('cache_misses', series_id=data_series)
+        data = download(start, fetch_end)
+        info = fred_client.get_series_info(data_series, refresh = refresh)
+        if use_cache:
+            cache.store_series(data_series, units, data, info, start, fetch_end)
+        if end is not None:
+            data = data[data.index <= end]
+        return data, info
+
+    info = entry['info']
+    fred_client.remember_info(data_series, info)
+    one_day = pd.Timedelta(days=1)
+    downloaded = False
+
+    # copy past the TTL, only download again if FRED says the series moved.
+    # An open-ended copy just needs what's new, a closed window is
+    # downloaded again since the update may be a revision inside it
+    if not cache.is_fresh(entry['fetched_at'], ttl):
+        latest_info = fred_client.get_series_info(data_series, refresh = True)
+        if latest_info.get('last_updated') == info.get('last_updated'):
+            cache.touch_series(data_series, units, latest_info)
+        elif entry['window_end'] is None:
+            tail = download(entry['last_date'], None)
+            cache.append_observations(data_series, units, tail, info = latest_info)
+            downloaded = True
+        else:
+            window = download(entry['window_start'], entry['window_end'])
+            cache.append_observations(data_series, units, window, info = latest_info)
+            downloaded = True
+        info = latest_info
+
+    # asked for earlier dates than we have
+    if entry['window_start'] is not None and (start is None or start < entry['window_start']):
+        head = download(start, entry['window_start'] - one_day)
+        cache.append_observations(data_series, units, head, window_start = start)
+        downloaded = True
+
+    # asked for later dates than we have
+    if entry['window_end'] is not None and (end is None or end > entry['window_end']):
+        tail = download(entry['window_end'] + one_day, fetch_end)
+        cache.append_observations(data_series, units, tail, window_end = fetch_end)
+        downloaded = True
+
+    # a hit is a series served without downloading any observations
+    instrument.count('cache_misses' if downloaded else 'cache_hits', series_id=data_series)
+    data = cache.load_series(data_series, units, start, end)
     return data, info
 
-# Wrapper function for getting just info data
+# Wrapper function for getting just info data, only asks FRED the first time
+# a series is seen in this process. Expressions (see expressions.py) get info
+# made up from the series in them.
 def fred_api_info(data_series):
-    fred = Fred(api_key=FRED_API_KEY)
-    info = fred.get_series_info(data_series)
+    if expressions.is_expression(data_series):
+        return expressions.expression_info(data_series)
+    info = fred_client.get_series_info(data_series)
     return info
 
-# Retreiving Dataframes
-def get_datasets(datalist, units):
-  # create data structures to return
-  dataframes = []
-  datanames = []
-
-  for series_id in datalist:
-    # get data from fred
-    data, info = fred_api(series_id, units)
-
-    # get data into good df format
-    df = pd.DataFrame(data)
-    df = df.rename(columns={df.columns[0]: 'values'})
-    df['index'] = df.index
-    df = df[['index', 'values']]
-
-    # add df and name to lists
-    dataframes.append(df)
-    datanames.append(info['title'])
+# Fetches several series at once on a thread pool. units, start and end can
+# each be a single value or one per series. Each series is only downloaded
+# once no matter how many units or windows it's asked for in. Requests go
+# through fred_client's rate limiter, so this never goes over FRED's
+# per-minute limit. Series found in preloaded (a SeriesStore, a dict of
+# {series_id: (level data, info)}, see catalog.prefetch, or the path of a
+# snapshot, see snapshot.py) aren't downloaded at all if they cover the
+# window, unless a vintage is asked for, since preloaded data is always the
+# latest. Returns a list of (data, info) in the same order as series_ids.
+def fetch_many(series_ids, units = 'lin', start = None, end = None,
+               refresh = False, ttl = None, max_workers = FETCH_WORKERS,
+               preloaded = None, vintage = None):
+    fetched = _fetch_arrays(series_ids, units, start, end, refresh, ttl, max_workers, preloaded,
+                            vintage)
+    return [(data.to_series(), info) for data, info in fetched]
+
+# Whether preloaded has a series over start..end, including the history
+# units need before start. Plain dicts don't say what they were fetched for,
+# so they're taken to have everything.
+def _preloaded_covers(preloaded, series_id, units_list, start, end):
+    if series_id not in preloaded:
+        return False
+    covers = getattr(preloaded, 'covers', None)
+    if covers is None:
+        return True
+    if start is not None and any(units != 'lin' for units in units_list):
+        info = preloaded[series_id][1]
+        start = start - max(transforms.lookback(units, info) for units in units_list)
+    return covers(series_id, start, end)
+
+# fetch_many without the conversion back to pandas, returns a list of
+# (SeriesArray, info). The arrays are views onto one transformed copy per
+# series and units, so the same series in several windows isn't copied.
+def _fetch_arrays(series_ids, units = 'lin', start = None, end = None,
+                  refresh = False, ttl = None, max_workers = FETCH_WORKERS,
+                  preloaded = None, vintage = None):
+    def per_series(value):
+        if isinstance(value, (list, tuple)):
+            return [None if v is None else pd.Timestamp(v) for v in value]
+        return [None if value is None else pd.Timestamp(value)] * len(series_ids)
+
+    if isinstance(units, str):
+        units = [units] * len(series_ids)
+    starts, ends = per_series(start), per_series(end)
+    if isinstance(preloaded, str):
+        preloaded = snapshot.load_snapshot(preloaded)
+    if vintage is not None:
+        preloaded = None
+    preloaded = preloaded or {}
+
+    # expressions are computed from the series in them (see expressions.py),
+    # over all of the preloaded data so charts share the results, as long as
+    # it covers every window they're charted over
+    if any(expressions.is_expression(series_id) for series_id in series_ids):
+        whole = bool(preloaded) and all(
+            _preloaded_covers(preloaded, leaf, [series_units], series_start, series_end)
+            for series_id, series_units, series_start, series_end in zip(series_ids, units, starts, ends)
+            for leaf in expressions.series_ids([series_id]))
+        def fetch_series(ids, ids_units, ids_starts, ids_ends):
+            # already checked, so the whole preloaded copy is used as is
+            leaves = {series_id: preloaded[series_id] for series_id in ids} if whole else preloaded
+            return _fetch_arrays(ids, ids_units, ids_starts, ids_ends, refresh, ttl, max_workers,
+                                 leaves, vintage)
+        return expressions.fetch(series_ids, units, starts, ends, fetch_series,
+                                 whole = whole, context = (str(vintage),))
+
+    # group the units and windows we need by series
+    wanted = {}
+    for series_id, series_units, series_start, series_end in zip(series_ids, units, starts, ends):
+        if series_id not in wanted:
+            wanted[series_id] = {'units': [], 'start': series_start, 'end': series_end}
+        group = wanted[series_id]
+        if series_units not in group['units']:
+            group['units'].append(series_units)
+        if group['start'] is not None:
+            group['start'] = None if series_start is None else min(group['start'], series_start)
+        if group['end'] is not None:
+            group['end'] = None if series_end is None else max(group['end'], series_end)
+
+    # preloaded data that doesn't reach the window (e.g. a chart overridden
+    # to start earlier) is fetched like anything else
+    covered = [series_id for series_id, group in wanted.items()
+               if _preloaded_covers(preloaded, series_id, group['units'], group['start'], group['end'])]
+    to_download = [series_id for series_id in wanted if series_id not in covered]
+    results = {series_id: _fetch_units(series_id, wanted[series_id]['units'], wanted[series_id]['start'],
+                                       wanted[series_id]['end'], level = preloaded[series_id])
+               for series_id in covered}
+    if to_download:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(to_download)))) as pool:
+            futures = {series_id: pool.submit(_fetch_units, series_id, wanted[series_id]['units'],
+                                              wanted[series_id]['start'], wanted[series_id]['end'],
+                                              refresh = refresh, ttl = ttl, vintage = vintage)
+                       for series_id in to_download}
+            results.update({series_id: future.result() for series_id, future in futures.items()})
+
+    fetched = []
+    for series_id, series_units, series_start, series_end in zip(series_ids, units, starts, ends):
+        transformed, info = results[series_id]
+        fetched.append((transformed[series_units].window(series_start, series_end), info))
+    return fetched
+
+# Retreiving series as arrays (see store.py), what create_line_graph uses
+def get_series_arrays(datalist, units, start = None, end = None, refresh = False, ttl = None,
+                      preloaded = None, vintage = None):
+  # get data from fred, only for the dates we're going to chart
+  fetched = _fetch_arrays(datalist, units, start, end, refresh = refresh, ttl = ttl,
+                          preloaded = preloaded, vintage = vintage)
+
+  arrays = [data for data, info in fetched]
+  return arrays, _datanames([info for data, info in fetched], vintage)
+
+# Line names for series infos, saying which vintage the lines are
+def _datanames(infos, vintage = None):
+  datanames = [info['title'] for info in infos]
+  if vintage is not None:
+    datanames = [name + vintages.vintage_label(vintage) for name in datanames]
+  return datanames
 
+# Retreiving Dataframes
+def get_datasets(datalist, units, start = None, end = None, refresh = False, ttl = None,
+                 preloaded = None, vintage = None):
+  arrays, datanames = get_series_arrays(datalist, units, start, end, refresh = refresh,
+                                        ttl = ttl, preloaded = preloaded, vintage = vintage)
+
+  # get data into good df format
+  with instrument.span('shaping', series=len(arrays)):
+    dataframes = [data.to_frame() for data in arrays]
   return dataframes, datanames
 
+def _ordinal(n):
+  suffix = 'th' if 10 <= n % 100 <= 20 else {1: 'st', 2: 'nd', 3: 'rd'}.get(n % 10, 'th')
+  return f'{n}{suffix}'
+
 ########################
 ## PLOTTING FUNCTIONS ##
 ########################
@@ -105,6 +350,10 @@ def create_line_graph(
     two_time_periods = False,
     second_start_date = '2021-01-01',
     second_end_date = '2023-12-31',
+    periods = None,
+    preloaded = None,
+    vintage = None,
+    align = None,
     hor_line = 'Default',
     recessions = True,
     fomc = True,
@@ -115,16 +364,77 @@ def create_line_graph(
     line_colors = ['darkblue', 'darkgoldenrod', 'green', '#9cb6f5', 'grey'],
     second_line_colors = ['green', '#9cb6f5', 'grey', 'darkblue', 'darkgoldenrod'],
     line_width = 3,
+    downsample = None,
+    render_mode = 'svg',
+    webgl_threshold = traces.WEBGL_THRESHOLD,
+    compact_arrays = False,
     width=1400,
     height=500
     ):
   """
   This function creates all of the plots. THe defaults are set in the function
   definition, but can be overridden by the user.
+
+  periods is a list of (start, end) date pairs to overlay on top of the main
+  window, e.g. [('2001-01-01', '2003-12-31'), ('2007-01-01', '2010-12-31')].
+  two_time_periods = True is the same as periods = [(second_start_date,
+  second_end_date)]. Only the first overlay period gets tick labels (along
+  the top), the rest share the plot area without their own axis.
+
+  preloaded is the shared series data from a catalog build (see
+  catalog.prefetch) or the path of a snapshot (see snapshot.py). Series
+  found there aren't fetched again.
+
+  vintage charts the data as it was known on a past date (e.g. at an FOMC
+  meeting), or as first released with vintage = 'first', from ALFRED (see
+  vintages.py).
+
+  align puts every series on one calendar before charting: a frequency
+  ('D', 'W', 'M', 'Q' or 'A'), or a dict of align_arrays arguments such as
+  {'frequency': 'M', 'how': 'last', 'fill': 'ffill'} (see align.py).
+
+  downsample ('minmax' or 'lttb') thins out long series to about one point
+  per pixel column of a `width` pixel wide figure. render_mode ('svg',
+  'webgl' or 'auto') picks go.Scatter or go.Scattergl, switching to WebGL
+  above webgl_threshold points in 'auto'. compact_arrays = True serializes
+  dates as epoch milliseconds so x and y are both typed arrays. See
+  traces.py for all of these.
   """
 
-  # get data
-  dataframes, datanames = get_datasets(datalist, units)
+  # time each stage of the chart, see instrument.py
+  timer = instrument.StageTimer(total = 'chart', chart = chart_title)
+
+  # one line on the chart
+  def line(data, name, color, **kwargs):
+      return traces.line_trace(data.dates, data.values, name, color, line_width,
+                               downsample, width, render_mode, webgl_threshold,
+                               compact_arrays, **kwargs)
+
+  # collect the overlay periods
+  overlay_periods = list(periods) if periods is not None else []
+  if two_time_periods:
+      overlay_periods.insert(0, (second_start_date, second_end_date))
+
+  # get data once for the main window and every overlay period
+  fetch_start = min(pd.Timestamp(d) for d in [start_date] + [p[0] for p in overlay_periods])
+  fetch_end = None
+  if end_date != 'Default':
+      fetch_end = max(pd.Timestamp(d) for d in [end_date] + [p[1] for p in overlay_periods])
+  if align is not None:
+      # aligned results are memoized per series set, window and settings
+      settings = {'frequency': align} if isinstance(align, str) else dict(align)
+      settings = dict({'start': fetch_start, 'end': fetch_end}, **settings)
+      dates, values, infos = alignment.get_aligned_arrays(datalist, units = units,
+                                                          preloaded = preloaded,
+                                                          vintage = vintage, **settings)
+      all_arrays = [SeriesArray(dates, values[:, i]) for i in range(len(datalist))]
+      datanames = _datanames(infos, vintage)
+  else:
+      all_arrays, datanames = get_series_arrays(datalist, units, start = fetch_start,
+                                                end = fetch_end, preloaded = preloaded,
+                                                vintage = vintage)
+  arrays = [data.window(start_date, None if end_date == 'Default' else end_date)
+            for data in all_arrays]
 
   # if passed in, rename lines
   if legend_titles != 'Default':
@@ -137,29 +447,30 @@ def create_line_graph(
   #determine x-axis stopping point
   if end_date == 'Default':
       latest_date = pd.Timestamp("1900-01-01")  # Set to a very old date
-      for df in dataframes:
-          if not df.empty:
-              max_date_in_df = df.iloc[:, 0].max()
-          if max_date_in_df > latest_date:
-              latest_date = max_date_in_df
+      for data in arrays:
+          # dates are sorted, so the last one is the latest
+          if len(data) and data.last_date() > latest_date:
+              latest_date = data.last_date()
 
       end_date = latest_date
 
+  timer.start('traces')
+
   ## Split Y Axis Case ##
   if split_y_axis:
       # create Plotly figure with subplots
       fig = make_subplots(specs=[[{"secondary_y": True}]])
 
       # find which data series should be in y1 or y2
-      index_split = len(dataframes)-num_lines_split_axis
+      index_split = len(arrays)-num_lines_split_axis
 
       # add lines to y-axis 1
-      for i, (df, line_color) in enumerate(zip(dataframes[:index_split], line_colors[:index_split])):
-        fig.add_trace(go.Scatter(x=df.iloc[:, 0], y=df.iloc[:, 1], mode='lines', name=f'{datanames[i]}', line=dict(width=line_width, color=line_color)), secondary_y=False)
+      for i, (data, line_color) in enumerate(zip(arrays[:index_split], line_colors[:index_split])):
+        fig.add_trace(line(data, f'{datanames[i]}', line_color), secondary_y=False)
 
       # add lines to y-axis 2
-      for i, (df, line_color) in enumerate(zip(dataframes[index_split:], line_colors[index_split:])):
-        fig.add_trace(go.Scatter(x=df.iloc[:, 0], y=df.iloc[:, 1], mode='lines', name=f'{datanames[i+index_split]}', line=dict(width=line_width, color=line_color)), secondary_y = True)
+      for i, (data, line_color) in enumerate(zip(arrays[index_split:], line_colors[index_split:])):
+        fig.add_trace(line(data, f'{datanames[i+index_split]}', line_color), secondary_y = True)
 
       # get y-axis 2 title
       if split_y_axis_title == "Default":
@@ -180,15 +491,17 @@ def create_line_graph(
   else:
       fig = go.Figure()
 
-      # Else no split axis, add lines for all dataframes
-      for i, (df, line_color) in enumerate(zip(dataframes, line_colors)):
-          fig.add_trace(go.Scatter(x=df.iloc[:, 0], y=df.iloc[:, 1], mode='lines', name=f'{datanames[i]}', line=dict(width=line_width, color=line_color)))
+      # Else no split axis, add lines for all series
+      for i, (data, line_color) in enumerate(zip(arrays, line_colors)):
+          fig.add_trace(line(data, f'{datanames[i]}', line_color))
       # Name y-axis
       fig.update_layout(yaxis_title=y_axis_title)
       fig.update_layout(yaxis=dict(showgrid=y_gridlines, gridcolor='grey', showline=y_axis_line, linecolor='black'))
 
 
 
+  timer.start('shapes')
+
   ## Add horizontal line
   if hor_line != 'Default':
 
@@ -219,82 +532,33 @@ def create_line_graph(
     )
 
 
-  rec_list = [('1857-06-01', '1858-12-01'),
-              ('1860-10-01', '1861-06-01'),
-              ('1865-04-01', '1867-12-01'),
-              ('1869-06-01', '1870-12-01'),
-              ('1873-10-01', '1879-03-01'),
-              ('1882-03-01', '1885-05-01'),
-              ('1887-03-01', '1888-04-01'),
-              ('1890-07-01', '1891-05-01'),
-              ('1893-01-01', '1894-06-01'),
-              ('1895-12-01', '1897-06-01'),
-              ('1899-06-01', '1900-12-01'),
-              ('1902-09-01', '1904-08-01'),
-              ('1907-05-01', '1908-06-01'),
-              ('1910-01-01', '1912-01-01'),
-              ('1913-01-01', '1914-12-01'),
-              ('1918-08-01', '1919-03-01'),
-              ('1920-01-01', '1921-07-01'),
-              ('1923-05-01', '1924-07-01'),
-              ('1926-10-01', '1927-11-01'),
-              ('1929-08-01', '1933-03-01'),
-              ('1937-05-01', '1938-06-01'),
-              ('1945-02-01', '1945-10-01'),
-              ('1948-11-01', '1949-10-01'),
-              ('1953-07-01', '1954-05-01'),
-              ('1957-08-01', '1958-04-01'),
-              ('1960-04-01', '1961-02-01'),
-              ('1969-12-01', '1970-11-01'),
-              ('1973-11-01', '1975-03-01'),
-              ('1980-01-01', '1980-07-01'),
-              ('1981-07-01', '1982-11-01'),
-              ('1990-07-01', '1991-03-01'),
-              ('2001-03-01', '2001-11-01'),
-              ('2007-12-01', '2009-06-01'),
-              ('2020-02-01', '2020-04-01')]
-  if recessions:
-
-    for (rec0, rec1) in rec_list:
-        fig.add_shape(
-            go.layout.Shape(
-                type="rect",
-                fillcolor = "grey",
-                line = dict(color = "grey"),
-                opacity = 0.3,
-                x0 = rec0,
-                x1 = rec1,
-                xref = "x",
-                y0 = 0,
-                y1 = 1,
-                yref = "paper"
-            )
-        )
-  fomc_dates = ["01-30", "03-19", "04-30", "06-11", "07-30", "09-17", "11-06", "12-17"]
-  fomc_list = []
-  for year in range(2005, datetime.now().year + 1):
-      for date in fomc_dates:
-          fomc_list.append(f"{year}-{date}")
-  if fomc:
-      for fomc in fomc_list:
-          fig.add_shape(
-              go.layout.Shape(
-                  type="line",
-                  line=dict(
-                      color="rgba(255, 0, 0, 0.5)",  # semi-transparent red
-                      width=1,
-                      dash="dash"  # dashed line
-                  ),
-                  x0=fomc,
-                  x1=fomc,
-                  y0=0,
-                  y1=1,
-                  xref="x",
-                  yref="paper"
-              )
-          )
+  ## Recession bands and FOMC meetings inside the chart window, added in one go
+  annotations.add_annotations(fig, start_date, end_date, recessions = recessions, fomc = fomc)
+
+  timer.start('layout')
+
   ## Graph Layouts (Split and Nonsplit Cases)##
 
+  # x-axis for an overlay period, drawn along the top
+  def overlay_axis(period_start, period_end, visible=True):
+      return dict(
+        showgrid=x_gridlines,
+        gridcolor='grey',
+        showline=x_axis_line,
+        linecolor='black',
+        showticklabels=True,
+        ticks='outside',
+        tickmode='auto',  # Automatically calculate the date ticks
+        nticks=num_ticks,  # Adjust the number of ticks as needed
+        tickformat= tick_format,  # Format of the date ticks
+        tickfont=dict(family=font_family, size=font_size), # Set the font family and size
+        range=[period_start, period_end],
+        type='date',  # dates may come through as epoch milliseconds
+        side='top',
+        overlaying='x',
+        visible=visible,
+      )
+
   # Non-parameterized layout
   fig.update_layout(
       paper_bgcolor='white',  # Set background color to white
@@ -317,22 +581,10 @@ def create_line_graph(
           nticks=num_ticks,  # Adjust the number of ticks as needed
           tickformat= tick_format,  # Format of the date ticks
           tickfont=dict(family=font_family, size=font_size), # Set the font family and size
-          range=[start_date, end_date]),
-      xaxis2=dict(
-        showgrid=x_gridlines,
-        gridcolor='grey',
-        showline=x_axis_line,
-        linecolor='black',
-        showticklabels=True,
-        ticks='outside',
-        tickmode='auto',  # Automatically calculate the date ticks
-        nticks=num_ticks,  # Adjust the number of ticks as needed
-        tickformat= tick_format,  # Format of the date ticks
-        tickfont=dict(family=font_family, size=font_size), # Set the font family and size
-        range=[second_start_date, second_end_date],
-        side='top',
-        overlaying='x',
-    ),
+          range=[start_date, end_date],
+          type='date'),  # dates may come through as epoch milliseconds
+      xaxis2=overlay_axis(*(overlay_periods[0] if overlay_periods
+                            else (second_start_date, second_end_date))),
       font=dict(family=font_family, size=font_size), # Set the font family and size for all non-tick text on graph
       legend = dict(orientation = "h",   # show entries horizontally
                      xanchor = "center",  # use center of legend as anchor
@@ -341,483 +593,37 @@ def create_line_graph(
                     ),
   )
 
-  # Check if two_time_periods is True
-  if two_time_periods:
-      # Fetch the data for the second time period
-      second_dataframes, second_datanames = get_datasets(datalist, units)
-      second_dataframes = [df[(df.iloc[:, 0] >= second_start_date) & (df.iloc[:, 0] <= second_end_date)] for df in second_dataframes]
-
-      # Add a new line to the graph for each dataset on the secondary x-axis
-      for i, (df, line_color) in enumerate(zip(second_dataframes, second_line_colors)):
-          fig.add_trace(go.Scatter(x=df.iloc[:, 0], y=df.iloc[:, 1], mode='lines', name=f'{second_datanames[i]} (2nd period)', line=dict(width=line_width, color=line_color), xaxis='x2'))
-          
+  # Overlay periods, sliced out of the data we already have
+  timer.start('traces')
+  for p, (period_start, period_end) in enumerate(overlay_periods):
+      axis_number = p + 2
+      if p > 0:
+          fig.update_layout({f'xaxis{axis_number}': overlay_axis(period_start, period_end, visible=False)})
+
+      # Add a new line to the graph for each dataset on this period's x-axis
+      for i, data in enumerate(all_arrays):
+          data = data.window(period_start, period_end)
+          line_color = second_line_colors[(i + p * len(all_arrays)) % len(second_line_colors)]
+          fig.add_trace(line(data, f'{datanames[i]} ({_ordinal(axis_number)} period)', line_color, xaxis=f'x{axis_number}'))
+
   # Auto Populate Cases
+  timer.start('layout')
   if y_axis_range != "Default":
     fig.update_layout(yaxis=dict(range=y_axis_range))
     # else graph will use defaults
 
+  timer.finish()
+
   # Show the plot
   # fig.show() not using basic show() because of resolution issues
   return fig
 
 
-###############
-## PLOT CODE ##
-###############
-
-
-"""
-This code serves as a repository for the code that creates all the graphs. 
-Running this code will generate all of these graphs and save them to local 
-memory where they can be referenced. Once you're satisfied with all of
-the graphs, you can save them with code below this.
-"""
-
-
-##############
-### SET-UP ###
-##############
-
-figures_list = []
-chart_titles = []
-
-########################
-### 2006-2010 GRAPHS ###
-########################
-
-datalist = ["GDPC1", "GDPPOT"]
-chart_title = "GDP vs. Potential GDP, 2006-2010"
-fig1_1 = create_line_graph(datalist, chart_title = chart_title,
-                                         legend_titles = ['Real GDP', 
-                                                          'Real Potential GDP'],
-                                         start_date = '2006-01-01',
-                                         end_date = '2010-09-01',
-                                         y_axis_title = "Billions of Dollars",
-                                         y_axis_range = [15000, 20000]                                         
-                                        )
-figures_list.append(fig1_1)
-chart_titles.append(chart_title)
-
-datalist = ["MEDLISPRIUS", "MEDLISPRIPERSQUFEEUS"]
-chart_title = "Home List Price vs. Home List Price per Square Foot, 2006-2010"
-fig1_2 = create_line_graph(datalist, chart_title = chart_title,
-                                         start_date = '2006-01-01',
-                                         end_date = '2010-09-01',
-                                         y_axis_title = "U.S. Dollars",
-                                         split_y_axis_title = "U.S. Dollars",
-                                         split_y_axis = True,
-                                         num_lines_split_axis = 1
-                                        )
-figures_list.append(fig1_2)
-chart_titles.append(chart_title)
-
-
-datalist = ["MSPUS"]
-chart_title = "Home Sale Price, 2006-2010"
-fig1_3 = create_line_graph(datalist, chart_title = chart_title,
-                                         start_date = '2006-01-01',
-                                         end_date = '2010-09-01',
-                                         y_axis_title = "U.S. Dollars",
-                                         y_axis_range = [200000, 300000]
-                                        )
-figures_list.append(fig1_3)
-chart_titles.append(chart_title)
-
-datalist = ["MORTGAGE30US"]
-chart_title = "30 Year Fixed Rate Mortage Average, 2006-2010"
-fig1_4 = create_line_graph(datalist, chart_title = chart_title,
-                                         start_date = '2006-01-01',
-                                         end_date = '2010-09-01',
-                                         y_axis_title = "Percent",
-                                         y_axis_range = [4, 8]
-                                        )
-figures_list.append(fig1_4)
-chart_titles.append(chart_title)
-
-
-datalist = ["DPCCRV1Q225SBEA", "FEDFUNDS", "IORB"]
-chart_title = """Core PCE, Federal Funds Rate, vs. Interest on Reserved Balances
-                  , 2006-2010"""
-fig1_5 = create_line_graph(datalist, chart_title = chart_title,
-                                         start_date = '2006-01-01',
-                                         end_date = '2010-09-01',
-                                         y_axis_title = "Percent",
-                                         split_y_axis = True,
-                                         num_lines_split_axis = 2,
-                                         split_y_axis_title = 'Percent',
-                                         y_axis_range = [-1, 10],
-                                         split_y_axis_range = [0, 6]
-                                        )
-figures_list.append(fig1_5)
-chart_titles.append(chart_title)
-
-
-datalist = ["NFCI"]
-chart_title = "Chicago Fed National Financial Conditions Index, 2006-2010"
-fig1_6 = create_line_graph(datalist, chart_title = chart_title,
-                                         start_date = '2006-01-01',
-                                         end_date = '2010-09-01',
-                                         y_axis_title = "Index",
-                                         y_axis_range = [-1, 3]
-                                        )
-figures_list.append(fig1_6)
-chart_titles.append(chart_title)
-
-
-datalist = ["DJIA", "SP500"]
-chart_title = "DJIA & S&P500, 2006-2010"
-fig1_7 = create_line_graph(datalist, chart_title = chart_title,
-                                         start_date = '2006-01-01',
-                                         end_date = '2010-09-01',
-                                         y_axis_title = "Index",
-                                         split_y_axis = True,
-                                         num_lines_split_axis = 1,
-                                         split_y_axis_title= "Index",
-                                         y_axis_range = [0, 15000],
-                                         split_y_axis_range = [1000, 2000]
-                                        )
-figures_list.append(fig1_7)
-chart_titles.append(chart_title)
-
-datalist = ["T10Y2Y"]
-chart_title = """10-Year Treasury Constant Maturity Minus 2-Year Treasury 
-                Constant Maturity, 2006-2010"""
-fig1_8 = create_line_graph(datalist, chart_title = chart_title,
-                                         start_date = '2006-01-01',
-                                         end_date = '2010-09-01',
-                                         y_axis_title = "Percent"
-                                        )
-figures_list.append(fig1_8)
-chart_titles.append(chart_title)
-
-datalist = ["UMCSENT"]
-chart_title = "University of Michigan Consumer Sentiment, 2006-2010"
-fig1_9 = create_line_graph(datalist, chart_title = chart_title,
-                                         start_date = '2006-01-01',
-                                         end_date = '2010-09-01',
-                                         y_axis_title = "Index: 1996"
-                                        )
-figures_list.append(fig1_9)
-chart_titles.append(chart_title)
-
-datalist = ["VIXCLS"]
-chart_title = "CBOE Volatility Index, 2006-2010"
-fig1_10 = create_line_graph(datalist, chart_title = chart_title,
-                                         start_date = '2006-01-01',
-                                         end_date = '2010-09-01',
-                                         y_axis_title = "Index"
-                                        )
-figures_list.append(fig1_10)
-chart_titles.append(chart_title)
-
-datalist = ['WLEMUINDXD']
-chart_title = "Equity Market-related Economic Uncertainty Index, 2006-2010"
-fig1_101 = create_line_graph(datalist, chart_title = chart_title,
-                                         start_date = '2006-01-01',
-                                         end_date = '2010-09-01',
-                                         y_axis_title = "Index",
-                                         y_axis_range = [0, 1500]
-                                        )
-figures_list.append(fig1_101)
-chart_titles.append(chart_title)
-
-
-########################
-### 2018-2024 GRAPHS ###
-########################
-
-datalist = ["GDPC1", "GDPPOT"]
-chart_title = "GDP vs. Potential GDP, 2018-2024"
-fig1_11 = create_line_graph(datalist, chart_title = chart_title,
-                                         legend_titles = ['Real GDP', 
-                                                          'Real Potential GDP'],
-                                         start_date = '2018-01-01',
-                                         end_date = '2024-09-01',
-                                         y_axis_title = "Billions of Dollars",
-                                         y_axis_range = [18500, 24000]                                         
-                                        )
-figures_list.append(fig1_11)
-chart_titles.append(chart_title)
-
-datalist = ["MEDLISPRIUS", "MEDLISPRIPERSQUFEEUS"]
-chart_title = "Home List Price vs. Home List Price per Square Foot, 2018-2024"
-fig1_12 = create_line_graph(datalist, chart_title = chart_title,
-                                         start_date = '2018-01-01',
-                                         end_date = '2024-09-01',
-                                         y_axis_title = "U.S. Dollars",
-                                         split_y_axis_title = "U.S. Dollars",
-                                         split_y_axis = True,
-                                         num_lines_split_axis = 1
-                                        )
-figures_list.append(fig1_12)
-chart_titles.append(chart_title)
-
-
-datalist = ["MSPUS"]
-chart_title = "Home Sale Price, 2018-2024"
-fig1_13 = create_line_graph(datalist, chart_title = chart_title,
-                                         start_date = '2018-01-01',
-                                         end_date = '2024-09-01',
-                                         y_axis_title = "U.S. Dollars",
-                                         y_axis_range = [300000, 450000]
-                                        )
-figures_list.append(fig1_13)
-chart_titles.append(chart_title)
-
-datalist = ["MORTGAGE30US"]
-chart_title = "30 Year Fixed Rate Mortage Average, 2018-2024"
-fig1_14 = create_line_graph(datalist, chart_title = chart_title,
-                                         start_date = '2018-01-01',
-                                         end_date = '2024-09-01',
-                                         y_axis_title = "Percent",
-                                         y_axis_range = [1, 8]
-                                        )
-figures_list.append(fig1_14)
-chart_titles.append(chart_title)
-
-
-datalist = ["DPCCRV1Q225SBEA", "FEDFUNDS", "IORB"]
-chart_title = """Core PCE, Federal Funds Rate, vs. Interest on Reserved 
-                  Balances, 2018-2024"""
-fig1_15 = create_line_graph(datalist, chart_title = chart_title,
-                                         start_date = '2018-01-01',
-                                         end_date = '2024-09-01',
-                                         y_axis_title = "Percent",
-                                         split_y_axis = True,
-                                         num_lines_split_axis = 2,
-                                         split_y_axis_title = 'Percent',
-                                         y_axis_range = [-1, 10],
-                                         split_y_axis_range = [0, 6]
-                                        )
-figures_list.append(fig1_15)
-chart_titles.append(chart_title)
-
-
-datalist = ["NFCI"]
-chart_title = "Chicago Fed National Financial Conditions Index, 2018-2024"
-fig1_16 = create_line_graph(datalist, chart_title = chart_title,
-                                         start_date = '2018-01-01',
-                                         end_date = '2024-09-01',
-                                         y_axis_title = "Index",
-                                         y_axis_range = [-1, 1]
-                                        )
-figures_list.append(fig1_16)
-chart_titles.append(chart_title)
-
-
-datalist = ["DJIA", "SP500"]
-chart_title = "DJIA & S&P500, 2018-2024"
-fig1_16 = create_line_graph(datalist, chart_title = chart_title,
-                                         start_date = '2018-01-01',
-                                         end_date = '2024-09-01',
-                                         y_axis_title = "Index",
-                                         split_y_axis = True,
-                                         num_lines_split_axis = 1,
-                                         split_y_axis_title= "Index",
-                                         y_axis_range = [20000, 45000],
-                                         split_y_axis_range = [2000, 6000]
-                                        )
-figures_list.append(fig1_16)
-chart_titles.append(chart_title)
-
-datalist = ["T10Y2Y"]
-chart_title = """10-Year Treasury Constant Maturity Minus 2-Year Treasury 
-                  Constant Maturity, 2018-2024"""
-fig1_17 = create_line_graph(datalist, chart_title = chart_title,
-                                         start_date = '2018-01-01',
-                                         end_date = '2024-09-01',
-                                         y_axis_title = "Percent"
-                                        )
-figures_list.append(fig1_17)
-chart_titles.append(chart_title)
-
-datalist = ["UMCSENT"]
-chart_title = "University of Michigan Consumer Sentiment, 2018-2024"
-fig1_18 = create_line_graph(datalist, chart_title = chart_title,
-                                         start_date = '2018-01-01',
-                                         end_date = '2024-09-01',
-                                         y_axis_title = "Index: 1996"
-                                        )
-figures_list.append(fig1_18)
-chart_titles.append(chart_title)
-
-datalist = ["VIXCLS"]
-chart_title = "CBOE Volatility Index, 2018-2024"
-fig1_19 = create_line_graph(datalist, chart_title = chart_title,
-                                         start_date = '2018-01-01',
-                                         end_date = '2024-09-01',
-                                         y_axis_title = "Index"
-                                        )
-figures_list.append(fig1_19)
-chart_titles.append(chart_title)
-
-datalist = ['WLEMUINDXD']
-chart_title = "Equity Market-related Economic Uncertainty Index, 2018-2024"
-fig1_21 = create_line_graph(datalist, chart_title = chart_title,
-                                         start_date = '2018-01-01',
-                                         end_date = '2024-09-01',
-                                         y_axis_title = "Index",
-                                         y_axis_range = [0, 1500]
-                                        )
-figures_list.append(fig1_21)
-chart_titles.append(chart_title)
-
-########################
-### 2006-2024 GRAPHS ###
-########################
-
-datalist = ["GDPC1", "GDPPOT"]
-chart_title = "GDP vs. Potential GDP, 2006-2024"
-fig1_22 = create_line_graph(datalist, chart_title = chart_title,
-                                         legend_titles = ['Real GDP', 
-                                                          'Real Potential GDP'],
-                                         start_date = '2006-01-01',
-                                         end_date = '2024-09-01',
-                                         fomc = False,
-                                         y_axis_title = "Billions of Dollars",
-                                         y_axis_range = [15000, 24000]                                         
-                                        )
-figures_list.append(fig1_22)
-chart_titles.append(chart_title)
-
-datalist = ["MEDLISPRIUS", "MEDLISPRIPERSQUFEEUS"]
-chart_title = "Home List Price vs. Home List Price per Square Foot, 2006-2024"
-fig1_23 = create_line_graph(datalist, chart_title = chart_title,
-                                         start_date = '2006-01-01',
-                                         end_date = '2024-09-01',
-                                         fomc = False,
-                                         y_axis_title = "U.S. Dollars",
-                                         split_y_axis_title = "U.S. Dollars",
-                                         split_y_axis = True,
-                                         num_lines_split_axis = 1
-                                        )
-figures_list.append(fig1_23)
-chart_titles.append(chart_title)
-
-
-datalist = ["MSPUS"]
-chart_title = "Home Sale Price, 2006-2024"
-fig1_24 = create_line_graph(datalist, chart_title = chart_title,
-                                         start_date = '2006-01-01',
-                                         end_date = '2024-09-01',
-                                         fomc = False,
-                                         y_axis_title = "U.S. Dollars",
-                                         y_axis_range = [200000, 450000]
-                                        )
-figures_list.append(fig1_24)
-chart_titles.append(chart_title)
-
-datalist = ["MORTGAGE30US"]
-chart_title = "30 Year Fixed Rate Mortage Average, 2006-2024"
-fig1_25 = create_line_graph(datalist, chart_title = chart_title,
-                                         start_date = '2006-01-01',
-                                         end_date = '2024-09-01',
-                                         fomc = False,
-                                         y_axis_title = "Percent",
-                                         y_axis_range = [1, 8]
-                                        )
-figures_list.append(fig1_25)
-chart_titles.append(chart_title)
-
-
-datalist = ["DPCCRV1Q225SBEA", "FEDFUNDS", "IORB"]
-chart_title = """Core PCE, Federal Funds Rate, vs. Interest on Reserved 
-                  Balances, 2006-2024"""
-fig1_26 = create_line_graph(datalist, chart_title = chart_title,
-                                         start_date = '2006-01-01',
-                                         end_date = '2024-09-01',
-                                         fomc = False,
-                                         y_axis_title = "Percent",
-                                         split_y_axis = True,
-                                         num_lines_split_axis = 2,
-                                         split_y_axis_title = 'Percent',
-                                         y_axis_range = [-1, 10],
-                                         split_y_axis_range = [0, 6]
-                                        )
-figures_list.append(fig1_26)
-chart_titles.append(chart_title)
-
-
-datalist = ["NFCI"]
-chart_title = "Chicago Fed National Financial Conditions Index, 2006-2024"
-fig1_27 = create_line_graph(datalist, chart_title = chart_title,
-                                         start_date = '2006-01-01',
-                                         end_date = '2024-09-01',
-                                         fomc = False,
-                                         y_axis_title = "Index",
-                                         y_axis_range = [-1, 3]
-                                        )
-figures_list.append(fig1_27)
-chart_titles.append(chart_title)
-
-
-datalist = ["DJIA", "SP500"]
-chart_title = "DJIA & S&P500, 2006-2024"
-fig1_28 = create_line_graph(datalist, chart_title = chart_title,
-                                         start_date = '2006-01-01',
-                                         end_date = '2024-09-01',
-                                         fomc = False,
-                                         y_axis_title = "Index",
-                                         split_y_axis = True,
-                                         num_lines_split_axis = 1,
-                                         split_y_axis_title= "Index",
-                                         y_axis_range = [0, 45000],
-                                         split_y_axis_range = [1000, 6000]
-                                        )
-figures_list.append(fig1_28)
-chart_titles.append(chart_title)
-
-datalist = ["T10Y2Y"]
-chart_title = """10-Year Treasury Constant Maturity Minus 2-Year Treasury 
-                  Constant Maturity, 2006-2024"""
-fig1_29 = create_line_graph(datalist, chart_title = chart_title,
-                                         start_date = '2006-01-01',
-                                         end_date = '2024-09-01',
-                                         fomc = False,
-                                         y_axis_title = "Percent"
-                                        )
-figures_list.append(fig1_29)
-chart_titles.append(chart_title)
-
-datalist = ["UMCSENT"]
-chart_title = "University of Michigan Consumer Sentiment, 2006-2024"
-fig1_18 = create_line_graph(datalist, chart_title = chart_title,
-                                         start_date = '2006-01-01',
-                                         end_date = '2024-09-01',
-                                         fomc = False,
-                                         y_axis_title = "Index: 1996"
-                                        )
-figures_list.append(fig1_29)
-chart_titles.append(chart_title)
-
-datalist = ["VIXCLS"]
-chart_title = "CBOE Volatility Index, 2006-2024"
-fig1_31 = create_line_graph(datalist, chart_title = chart_title,
-                                         start_date = '2006-01-01',
-                                         end_date = '2024-09-01',
-                                         fomc = False,
-                                         y_axis_title = "Index"
-                                        )
-figures_list.append(fig1_31)
-chart_titles.append(chart_title)
-
-datalist = ['WLEMUINDXD']
-chart_title = "Equity Market-related Economic Uncertainty Index, 2006-2024"
-fig1_32 = create_line_graph(datalist, chart_title = chart_title,
-                                         start_date = '2006-01-01',
-                                         end_date = '2024-09-01',
-                                         fomc = False,
-                                         y_axis_title = "Index",
-                                         y_axis_range = [0, 1500]
-                                        )
-figures_list.append(fig1_32)
-chart_titles.append(chart_title)
-
-
-########################
-### 2006+2024 GRAPHS ###
-########################
-
-# TODO: Add this lol
+#############
+## CATALOG ##
+#############
 
-# TODO: Change output functions to save files to downloads folder.
\ No newline at end of file
+# The graphs themselves live in catalog.py as data and are only built on
+# demand, e.g. build_chart('fig1_1') or build_charts(tags = '2006-2010')
+from fedchallenge.catalog import (CHART_SPECS, get_spec, select_specs, list_tags,
+                                  build_chart, build_charts)
@@ -0,0 +1,296 @@
+"""
+This file is used to put series of different frequencies onto one common
+calendar, e.g. quarterly core PCE, monthly FEDFUNDS and daily IORB all as
+monthly data:
+
+df = get_aligned(["DPCCRV1Q225SBEA", "FEDFUNDS", "IORB"], frequency = 'M')
+
+frequency   'D' (business days), 'W' (weeks ending Friday), 'M', 'Q' or 'A'.
+            Periods are labelled like FRED labels them: months, quarters and
+            years by their first day, weeks by their Friday.
+how         how the observations inside one period are combined: 'mean',
+            'last', 'first', 'sum', 'min' or 'max'. One for every series,
+            or a list with one per series.
+fill        what happens to periods with no observations: None leaves them
+            missing, 'ffill' carries the last value forward (e.g. a
+            quarterly series onto a monthly calendar), 'bfill' carries the
+            next one back and 'interpolate' draws a straight line between
+            observations. limit caps how many periods ffill/bfill fill.
+
+Everything runs on the series' date/value arrays (see store.py) with
+NumPy: each date becomes an integer period code, each series is reduced
+per period with one ufunc.reduceat, and fills are cumulative index scans,
+so there are no Python loops over observations. Aligned results are
+memoized per series set and settings, looked up by the cache's stamps
+before anything is fetched, and recomputed when one of the series is
+updated on FRED.
+"""
+
+# Libraries
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from fedchallenge import instrument
+from fedchallenge.store import SeriesArray
+
+##############
+### SET-UP ###
+##############
+
+FREQUENCIES = ('D', 'W', 'M', 'Q', 'A')
+AGGREGATIONS = ('mean', 'last', 'first', 'sum', 'min', 'max')
+FILLS = (None, 'ffill', 'bfill', 'interpolate')
+
+# FRED frequency_short -> the calendar that holds it without losing anything,
+# and how coarse each calendar is (used to pick a common one)
+FRED_FREQUENCIES = {'D': 'D', 'W': 'W', 'BW': 'W', 'M': 'M', 'Q': 'Q', 'SA': 'A', 'A': 'A'}
+COARSENESS = {'D': 0, 'W': 1, 'M': 2, 'Q': 3, 'A': 4}
+
+# aligned results kept, most recently used last
+MEMO_SIZE = 64
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+
+######################
+## HELPER FUNCTIONS ##
+######################
+
+def _check(frequency, how, fill):
+    if frequency not in FREQUENCIES:
+        raise ValueError("Unknown frequency '%s', expected one of %s"
+                         % (frequency, ', '.join(FREQUENCIES)))
+    for method in how:
+        if method not in AGGREGATIONS:
+            raise ValueError("Unknown aggregation '%s', expected one of %s"
+                             % (method, ', '.join(AGGREGATIONS)))
+    if fill not in FILLS:
+        raise ValueError("Unknown fill '%s', expected one of %s"
+                         % (fill, ', '.join(str(f) for f in FILLS)))
+
+def period_codes(dates, frequency):
+    """
+    An integer code for the period each date falls in, increasing with time.
+    """
+    days = np.asarray(dates, dtype='datetime64[ns]').astype('datetime64[D]')
+    if frequency == 'D':
+        # weekend observations count towards the Friday before
+        return np.busday_offset(days, 0, roll='backward').astype('int64')
+    if frequency == 'W':
+        # 1970-01-01 was a Thursday, so (day + 3) % 7 is 0 on Mondays
+        day = days.astype('int64')
+        return day + (4 - (day + 3) % 7) % 7
+    months = days.astype('datetime64[M]').astype('int64')
+    if frequency == 'M':
+        return months
+    return months // (3 if frequency == 'Q' else 12)
+
+def period_dates(codes, frequency):
+    """
+    The label date of each period code, as datetime64[ns].
+    """
+    codes = np.asarray(codes, dtype='int64')
+    if frequency in ('D', 'W'):
+        return codes.astype('datetime64[D]').astype('datetime64[ns]')
+    months = codes * {'M': 1, 'Q': 3, 'A': 12}[frequency]
+    return months.astype('datetime64[M]').astype('datetime64[ns]')
+
+def _calendar(lo, hi, frequency):
+    # every period code from lo through hi
+    if frequency == 'W':
+        return np.arange(lo, hi + 1, 7)
+    codes = np.arange(lo, hi + 1)
+    if frequency == 'D':
+        codes = codes[np.is_busday(codes.astype('datetime64[D]'))]
+    return codes
+
+def _reduce(values, starts, how):
+    # values reduced over the groups beginning at starts
+    if how == 'first':
+        return values[starts]
+    if how == 'last':
+        return values[np.append(starts[1:], len(values)) - 1]
+    if how == 'min':
+        return np.minimum.reduceat(values, starts)
+    if how == 'max':
+        return np.maximum.reduceat(values, starts)
+    sums = np.add.reduceat(values, starts)
+    if how == 'sum':
+        return sums
+    return sums / np.diff(np.append(starts, len(values)))
+
+def _fill(values, fill, limit = None):
+    if fill is None:
+        return values
+    n = len(values)
+    valid = ~np.isnan(values)
+    if not valid.any():
+        return values
+    positions = np.arange(n)
+
+    if fill == 'interpolate':
+        known = positions[valid]
+        inside = (positions >= known[0]) & (positions <= known[-1])
+        out = values.copy()
+        out[inside] = np.interp(positions[inside], known, values[valid])
+        return out
+
+    if fill == 'bfill':
+        return _fill(values[::-1], 'ffill', limit)[::-1]
+
+    # index of the last valid value at or before every position
+    last = np.maximum.accumulate(np.where(valid, positions, -1))
+    out = np.where(last >= 0, values[np.maximum(last, 0)], np.nan)
+    if limit is not None:
+        out[(positions - last) > limit] = np.nan
+        out[valid] = values[valid]
+    return out
+
+############
+## KERNEL ##
+############
+
+def align_arrays(arrays, frequency = 'M', how = 'mean', fill = None, limit = None,
+                 start = None, end = None):
+    """
+    Puts SeriesArrays onto one calendar. Returns (dates, values) where dates
+    is the datetime64[ns] calendar from start (or the earliest observation)
+    to end (or the latest one) and values is a 2D float64 array with one
+    column per series.
+    """
+    how = [how] * len(arrays) if isinstance(how, str) else list(how)
+    _check(frequency, how, fill)
+
+    codes = [period_codes(data.dates, frequency) for data in arrays]
+    non_empty = [c for c in codes if len(c)]
+    lo = period_codes([pd.Timestamp(start)], frequency)[0] if start is not None else \
+        min((c[0] for c in non_empty), default=0)
+    hi = period_codes([pd.Timestamp(end)], frequency)[0] if end is not None else \
+        max((c[-1] for c in non_empty), default=-1)
+    calendar = _calendar(lo, hi, frequency)
+
+    values = np.full((len(calendar), len(arrays)), np.nan)
+    for column, (data, series_codes, method) in enumerate(zip(arrays, codes, how)):
+        valid = ~np.isnan(data.values)
+        series_codes, series_values = series_codes[valid], data.values[valid]
+        if len(series_codes):
+            # dates are sorted, so each period's observations are a run
+            starts = np.flatnonzero(np.diff(series_codes, prepend=series_codes[0] - 1))
+            periods = series_codes[starts]
+            keep = (periods >= lo) & (periods <= hi)
+            positions = np.searchsorted(calendar, periods[keep])
+            on_calendar = calendar[np.minimum(positions, len(calendar) - 1)] == periods[keep]
+            reduced = _reduce(series_values, starts, method)[keep]
+            values[positions[on_calendar], column] = reduced[on_calendar]
+        values[:, column] = _fill(values[:, column], fill, limit)
+
+    return period_dates(calendar, frequency), values
+
+def common_frequency(infos):
+    """
+    The finest calendar every one of the series fits on without being
+    upsampled, i.e. the coarsest of their FRED frequencies.
+    """
+    frequencies = [FRED_FREQUENCIES.get(info['frequency_short'], 'A') for info in infos]
+    return max(frequencies, key=COARSENESS.get)
+
+#############
+## ALIGNED ##
+#############
+
+def _stamps(datalist, units, start, end, ttl, preloaded, vintage):
+    # what each series' data is, from the preloaded store or the cache's
+    # entry without reading any observations. A series that's been updated
+    # on FRED gets a new stamp, so the memo never hands back stale results.
+    # None when the data has to be fetched first (not cached, past the TTL,
+    # or a vintage)
+    from fedchallenge import expressions, cache, _preloaded_covers
+    if vintage is not None:
+        return None
+    units = [units] * len(datalist) if isinstance(units, str) else list(units)
+    stamps = []
+    for entry, entry_units in zip(datalist, units):
+        for series_id in expressions.series_ids([entry]):
+            if preloaded and _preloaded_covers(preloaded, series_id, [entry_units],
+                                               None if start is None else pd.Timestamp(start),
+                                               None if end is None else pd.Timestamp(end)):
+                data, info = preloaded[series_id]
+                stamps.append(('preloaded', series_id, str(info.get('last_updated')), len(data)))
+                continue
+            cached = cache.load_entry(series_id)
+            if cached is None or not cache.is_fresh(cached['fetched_at'], ttl):
+                return None
+            stamps.append((series_id, str(cached['info'].get('last_updated')),
+                           str(cached['window_start']), str(cached['window_end']),
+                           str(cached['last_date'])))
+    return tuple(stamps)
+
+def get_aligned_arrays(datalist, frequency = 'M', units = 'lin', start = None, end = None,
+                       how = 'mean', fill = None, limit = None, refresh = False, ttl = None,
+                       preloaded = None, vintage = None):
+    """
+    Fetches datalist like get_series_arrays does and aligns it. Returns
+    (dates, values, infos), memoized per series set and settings. The memo
+    is checked before anything is fetched, so a repeat costs a look at the
+    cache's stamps rather than a fetch.
+    """
+    from fedchallenge import _fetch_arrays
+    if isinstance(preloaded, str):
+        from fedchallenge.snapshot import load_snapshot
+        preloaded = load_snapshot(preloaded)
+
+    settings = (tuple(datalist), frequency, units if isinstance(units, str) else tuple(units),
+                None if start is None else str(pd.Timestamp(start)),
+                None if end is None else str(pd.Timestamp(end)),
+                how if isinstance(how, str) else tuple(how), fill, limit, str(vintage))
+    stamps = None if refresh else _stamps(datalist, units, start, end, ttl, preloaded, vintage)
+    if stamps is not None:
+        with _memo_lock:
+            if settings + stamps in _memo:
+                _memo.move_to_end(settings + stamps)
+                return _memo[settings + stamps]
+
+    fetched = _fetch_arrays(datalist, units, start, end, refresh = refresh, ttl = ttl,
+                            preloaded = preloaded, vintage = vintage)
+    infos = [info for _, info in fetched]
+
+    # stamps as they are after the fetch, which may have updated the cache.
+    # Vintages aren't stamped in the cache, so those use what was fetched
+    stamps = _stamps(datalist, units, start, end, ttl, preloaded, vintage)
+    if stamps is None:
+        stamps = tuple((str(info.get('last_updated')), len(data)) for data, info in fetched)
+    key = settings + stamps
+
+    with instrument.span('shaping', series=len(fetched), frequency=frequency):
+        dates, values = align_arrays([data for data, _ in fetched], frequency, how, fill, limit,
+                                     start, end)
+    result = (dates, values, infos)
+    with _memo_lock:
+        _memo[key] = result
+        while len(_memo) > MEMO_SIZE:
+            _memo.popitem(last=False)
+    return result
+
+def get_aligned(datalist, frequency = 'M', units = 'lin', start = None, end = None,
+                how = 'mean', fill = None, limit = None, refresh = False, ttl = None,
+                preloaded = None, vintage = None):
+    """
+    The series in datalist on one calendar as a DataFrame indexed by date,
+    one column per series ID. See the top of this file for the arguments.
+    """
+    dates, values, _ = get_aligned_arrays(datalist, frequency, units, start, end, how, fill,
+                                          limit, refresh, ttl, preloaded, vintage)
+    return pd.DataFrame(values.copy(), index=pd.DatetimeIndex(dates, name='date'),
+                        columns=list(datalist))
+
+def aligned_series(datalist, frequency = 'M', **kwargs):
+    """
+    Like get_aligned, but as one SeriesArray per series, all sharing the
+    same dates array.
+    """
+    dates, values, _ = get_aligned_arrays(datalist, frequency, **kwargs)
+    return [SeriesArray(dates, values[:, i]) for i in range(values.shape[1])]
+
+def clear_memo():
+    with _memo_lock:
+        _memo.clear()
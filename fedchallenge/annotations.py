@@ -0,0 +1,140 @@
+"""
+This file is used to draw the recession bands and FOMC meeting lines on the
+graphs. The dates are kept in sorted arrays, so for a chart covering
+2006-2010 we binary search for the handful of recessions and meetings inside
+that window instead of drawing every one since 1857:
+
+shapes = recession_shapes('2006-01-01', '2010-09-01') + fomc_shapes('2006-01-01', '2010-09-01')
+
+add_annotations adds everything in the window to a figure with a single
+layout update, rather than one add_shape call (and one round of plotly
+validation) per shape.
+"""
+
+# Libraries
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from functools import lru_cache
+
+##############
+### SET-UP ###
+##############
+
+# NBER recessions, (peak, trough)
+RECESSIONS = [('1857-06-01', '1858-12-01'),
+              ('1860-10-01', '1861-06-01'),
+              ('1865-04-01', '1867-12-01'),
+              ('1869-06-01', '1870-12-01'),
+              ('1873-10-01', '1879-03-01'),
+              ('1882-03-01', '1885-05-01'),
+              ('1887-03-01', '1888-04-01'),
+              ('1890-07-01', '1891-05-01'),
+              ('1893-01-01', '1894-06-01'),
+              ('1895-12-01', '1897-06-01'),
+              ('1899-06-01', '1900-12-01'),
+              ('1902-09-01', '1904-08-01'),
+              ('1907-05-01', '1908-06-01'),
+              ('1910-01-01', '1912-01-01'),
+              ('1913-01-01', '1914-12-01'),
+              ('1918-08-01', '1919-03-01'),
+              ('1920-01-01', '1921-07-01'),
+              ('1923-05-01', '1924-07-01'),
+              ('1926-10-01', '1927-11-01'),
+              ('1929-08-01', '1933-03-01'),
+              ('1937-05-01', '1938-06-01'),
+              ('1945-02-01', '1945-10-01'),
+              ('1948-11-01', '1949-10-01'),
+              ('1953-07-01', '1954-05-01'),
+              ('1957-08-01', '1958-04-01'),
+              ('1960-04-01', '1961-02-01'),
+              ('1969-12-01', '1970-11-01'),
+              ('1973-11-01', '1975-03-01'),
+              ('1980-01-01', '1980-07-01'),
+              ('1981-07-01', '1982-11-01'),
+              ('1990-07-01', '1991-03-01'),
+              ('2001-03-01', '2001-11-01'),
+              ('2007-12-01', '2009-06-01'),
+              ('2020-02-01', '2020-04-01')]
+
+# recessions don't overlap, so both of these are sorted
+REC_STARTS = np.array([rec[0] for rec in RECESSIONS], dtype='datetime64[D]')
+REC_ENDS = np.array([rec[1] for rec in RECESSIONS], dtype='datetime64[D]')
+
+# FOMC meetings, drawn on these days every year from FOMC_FIRST_YEAR on
+FOMC_DATES = ["01-30", "03-19", "04-30", "06-11", "07-30", "09-17", "11-06", "12-17"]
+FOMC_FIRST_YEAR = 2005
+
+RECESSION_STYLE = dict(type="rect",
+                       fillcolor="grey",
+                       line=dict(color="grey"),
+                       opacity=0.3,
+                       xref="x",
+                       y0=0,
+                       y1=1,
+                       yref="paper")
+
+FOMC_STYLE = dict(type="line",
+                  line=dict(color="rgba(255, 0, 0, 0.5)",  # semi-transparent red
+                            width=1,
+                            dash="dash"),  # dashed line
+                  xref="x",
+                  y0=0,
+                  y1=1,
+                  yref="paper")
+
+######################
+## HELPER FUNCTIONS ##
+######################
+
+def _day(date):
+    return np.datetime64(pd.Timestamp(date).date(), 'D')
+
+@lru_cache(maxsize=None)
+def _fomc_dates(last_year):
+    years = np.arange(FOMC_FIRST_YEAR, last_year + 1)
+    return np.array([f"{year}-{date}" for year in years for date in FOMC_DATES],
+                    dtype='datetime64[D]')
+
+def fomc_dates():
+    """
+    Sorted array of the FOMC meeting dates we draw, through this year.
+    """
+    return _fomc_dates(datetime.now().year)
+
+############
+## SHAPES ##
+############
+
+def recession_shapes(start, end):
+    """
+    Shape dicts for every recession that overlaps start..end.
+    """
+    start, end = _day(start), _day(end)
+    lo = REC_ENDS.searchsorted(start, side='left')
+    hi = REC_STARTS.searchsorted(end, side='right')
+    return [dict(RECESSION_STYLE, x0=str(REC_STARTS[i]), x1=str(REC_ENDS[i]))
+            for i in range(lo, hi)]
+
+def fomc_shapes(start, end):
+    """
+    Shape dicts for every FOMC meeting between start and end.
+    """
+    dates = fomc_dates()
+    lo = dates.searchsorted(_day(start), side='left')
+    hi = dates.searchsorted(_day(end), side='right')
+    return [dict(FOMC_STYLE, x0=str(date), x1=str(date)) for date in dates[lo:hi]]
+
+def add_annotations(fig, start, end, recessions = True, fomc = True):
+    """
+    Adds the recession bands and/or FOMC lines inside start..end to fig in
+    one layout update. Returns the figure.
+    """
+    shapes = []
+    if recessions:
+        shapes += recession_shapes(start, end)
+    if fomc:
+        shapes += fomc_shapes(start, end)
+    if shapes:
+        fig.update_layout(shapes=list(fig.layout.shapes) + shapes)
+    return fig
@@ -0,0 +1,319 @@
+"""
+This file is used to keep a local copy of every FRED series we download so
+that rebuilding the graphs doesn't have to go back to the API each time. The
+store is a single SQLite database under CACHE_DIR that looks something like
+this:
+
+series:        series_id | units | info (json) | last_updated | fetched_at
+               | window_start | window_end
+observations:  series_id | units | date       | value
+
+Entries are keyed by series ID and units. An entry younger than the TTL is
+served straight from disk. Once it's older than that, fred_api checks the
+series' last_updated stamp against FRED and only downloads the observations
+newer than what we already have.
+
+window_start/window_end record which date range has been downloaded. NULL
+means "from the first observation" and "up to the latest one" respectively,
+so a full-history download has both set to NULL.
+
+ALFRED vintages (see vintages.py) get two tables of their own:
+
+vintage_series:  series_id | fetched_at | realtime_end
+vintages:        series_id | date | realtime_start | value
+
+vintages only holds deltas: a row for the first release of an observation
+and one for every later revision that changed its value. realtime_end is
+the realtime date the stored vintages are complete through.
+"""
+
+# Libraries
+import os
+import json
+import time
+import sqlite3
+from contextlib import closing
+import pandas as pd
+
+##############
+### SET-UP ###
+##############
+
+# where the database lives, override with FEDCHALLENGE_CACHE_DIR
+CACHE_DIR = os.getenv("FEDCHALLENGE_CACHE_DIR",
+                      os.path.join(os.path.expanduser("~"), ".cache", "fedchallenge"))
+CACHE_FILE = "fred_cache.sqlite"
+
+# how long (in seconds) a cached series is trusted before we ask FRED
+# whether it has been updated, override with FEDCHALLENGE_CACHE_TTL
+CACHE_TTL = float(os.getenv("FEDCHALLENGE_CACHE_TTL", 12 * 60 * 60))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    series_id    TEXT NOT NULL,
+    units        TEXT NOT NULL,
+    info         TEXT NOT NULL,
+    last_updated TEXT,
+    fetched_at   REAL NOT NULL,
+    window_start TEXT,
+    window_end   TEXT,
+    PRIMARY KEY (series_id, units)
+);
+CREATE TABLE IF NOT EXISTS observations (
+    series_id TEXT NOT NULL,
+    units     TEXT NOT NULL,
+    date      TEXT NOT NULL,
+    value     REAL,
+    PRIMARY KEY (series_id, units, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS vintage_series (
+    series_id    TEXT NOT NULL PRIMARY KEY,
+    fetched_at   REAL NOT NULL,
+    realtime_end TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS vintages (
+    series_id      TEXT NOT NULL,
+    date           TEXT NOT NULL,
+    realtime_start TEXT NOT NULL,
+    value          REAL,
+    PRIMARY KEY (series_id, date, realtime_start)
+) WITHOUT ROWID;
+"""
+
+######################
+## HELPER FUNCTIONS ##
+######################
+
+def cache_path():
+    return os.path.join(CACHE_DIR, CACHE_FILE)
+
+def _connect():
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    conn = sqlite3.connect(cache_path(), timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+
+    # caches written before date windows existed only hold full histories,
+    # which is exactly what NULL windows mean
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(series)")]
+    for column in ('window_start', 'window_end'):
+        if column not in columns:
+            conn.execute("ALTER TABLE series ADD COLUMN %s TEXT" % column)
+    return conn
+
+def _date_str(date):
+    return None if date is None else pd.Timestamp(date).strftime('%Y-%m-%d')
+
+def _info_json(info):
+    info = {k: str(v) for k, v in dict(info).items()}
+    return json.dumps(info), info.get('last_updated')
+
+def _observation_rows(series_id, units, data):
+    return [(series_id, units, _date_str(d), None if pd.isna(v) else float(v))
+            for d, v in data.items()]
+
+def is_fresh(fetched_at, ttl=None):
+    """
+    Returns True if an entry fetched at `fetched_at` (epoch seconds) is still
+    inside the TTL. A ttl of None uses CACHE_TTL.
+    """
+    if ttl is None:
+        ttl = CACHE_TTL
+    return (time.time() - fetched_at) < ttl
+
+#######################
+## READ/WRITE SERIES ##
+#######################
+
+def load_entry(series_id, units = 'lin'):
+    """
+    Returns what we know about a cached series without reading its
+    observations, as a dict with info, fetched_at, window_start, window_end
+    and last_date (the newest cached observation). None if it isn't cached.
+    """
+    with closing(_connect()) as conn:
+        row = conn.execute(
+            "SELECT info, fetched_at, window_start, window_end FROM series "
+            "WHERE series_id = ? AND units = ?", (series_id, units)).fetchone()
+        if row is None:
+            return None
+        last_date = conn.execute(
+            "SELECT MAX(date) FROM observations WHERE series_id = ? AND units = ?",
+            (series_id, units)).fetchone()[0]
+
+    return {'info': pd.Series(json.loads(row[0])),
+            'fetched_at': row[1],
+            'window_start': None if row[2] is None else pd.Timestamp(row[2]),
+            'window_end': None if row[3] is None else pd.Timestamp(row[3]),
+            'last_date': None if last_date is None else pd.Timestamp(last_date)}
+
+def load_series(series_id, units = 'lin', start = None, end = None):
+    """
+    Returns the cached observations between start and end (inclusive, None
+    meaning unbounded) as a pandas Series indexed by date, the same shape
+    fredapi gives them to us. None if the series isn't cached.
+    """
+    query = "SELECT date, value FROM observations WHERE series_id = ? AND units = ?"
+    params = [series_id, units]
+    if start is not None:
+        query += " AND date >= ?"
+        params.append(_date_str(start))
+    if end is not None:
+        query += " AND date <= ?"
+        params.append(_date_str(end))
+
+    with closing(_connect()) as conn:
+        if conn.execute("SELECT 1 FROM series WHERE series_id = ? AND units = ?",
+                        (series_id, units)).fetchone() is None:
+            return None
+        rows = conn.execute(query + " ORDER BY date", params).fetchall()
+
+    dates = pd.to_datetime([r[0] for r in rows])
+    values = [float('nan') if r[1] is None else r[1] for r in rows]
+    return pd.Series(values, index=dates, dtype='float64')
+
+def store_series(series_id, units, data, info, window_start = None, window_end = None):
+    """
+    Replaces whatever we have for (series_id, units) with a fresh download
+    covering window_start..window_end.
+    """
+    info_json, last_updated = _info_json(info)
+
+    with closing(_connect()) as conn, conn:
+        conn.execute("DELETE FROM observations WHERE series_id = ? AND units = ?",
+                     (series_id, units))
+        conn.executemany("INSERT INTO observations VALUES (?, ?, ?, ?)",
+                         _observation_rows(series_id, units, data))
+        conn.execute("INSERT OR REPLACE INTO series VALUES (?, ?, ?, ?, ?, ?, ?)",
+                     (series_id, units, info_json, last_updated, time.time(),
+                      _date_str(window_start), _date_str(window_end)))
+
+def append_observations(series_id, units, data, info = None, **window):
+    """
+    Adds (or overwrites) observations for a series that's already cached, e.g.
+    the newest few points after FRED reports an update. Passing info also
+    updates the stored info and resets the TTL clock. window_start and/or
+    window_end can be passed as keywords to widen the recorded window.
+    """
+    with closing(_connect()) as conn, conn:
+        conn.executemany("INSERT OR REPLACE INTO observations VALUES (?, ?, ?, ?)",
+                         _observation_rows(series_id, units, data))
+        if info is not None:
+            info_json, last_updated = _info_json(info)
+            conn.execute("UPDATE series SET info = ?, last_updated = ?, fetched_at = ? "
+                         "WHERE series_id = ? AND units = ?",
+                         (info_json, last_updated, time.time(), series_id, units))
+        for column, date in window.items():
+            if column not in ('window_start', 'window_end'):
+                raise TypeError("unexpected window argument: %s" % column)
+            conn.execute("UPDATE series SET %s = ? WHERE series_id = ? AND units = ?" % column,
+                         (_date_str(date), series_id, units))
+
+def touch_series(series_id, units = 'lin', info = None):
+    """
+    Resets the TTL clock on a cached series after we've confirmed with FRED
+    that it hasn't changed. Also refreshes the stored info if we have it.
+    """
+    with closing(_connect()) as conn, conn:
+        if info is None:
+            conn.execute("UPDATE series SET fetched_at = ? WHERE series_id = ? AND units = ?",
+                         (time.time(), series_id, units))
+        else:
+            info_json, last_updated = _info_json(info)
+            conn.execute("UPDATE series SET fetched_at = ?, info = ?, last_updated = ? "
+                         "WHERE series_id = ? AND units = ?",
+                         (time.time(), info_json, last_updated, series_id, units))
+
+def _set_fetched_at(series_ids, fetched_at):
+    series_ids = list(series_ids)
+    with closing(_connect()) as conn, conn:
+        conn.executemany("UPDATE series SET fetched_at = ? WHERE series_id = ?",
+                         [(fetched_at, series_id) for series_id in series_ids])
+
+def touch_many(series_ids):
+    """
+    touch_series for several series (every units) at once, e.g. after one
+    bulk check has confirmed none of them changed.
+    """
+    _set_fetched_at(series_ids, time.time())
+
+def expire_series(series_ids):
+    """
+    Marks cached series as past their TTL, so the next fetch checks them with
+    FRED and, since their stamp moved, downloads them again (the new
+    observations, or the whole window for a closed one).
+    """
+    _set_fetched_at(series_ids, 0.0)
+
+#########################
+## READ/WRITE VINTAGES ##
+#########################
+
+def load_vintages(series_id):
+    """
+    Returns the stored vintage deltas of a series as a dict with fetched_at,
+    realtime_end and the rows as dates, realtime_starts and values lists,
+    sorted by date and then realtime_start. None if we have none.
+    """
+    with closing(_connect()) as conn:
+        row = conn.execute("SELECT fetched_at, realtime_end FROM vintage_series "
+                           "WHERE series_id = ?", (series_id,)).fetchone()
+        if row is None:
+            return None
+        rows = conn.execute("SELECT date, realtime_start, value FROM vintages WHERE series_id = ? "
+                            "ORDER BY date, realtime_start", (series_id,)).fetchall()
+
+    return {'fetched_at': row[0],
+            'realtime_end': pd.Timestamp(row[1]),
+            'dates': [r[0] for r in rows],
+            'realtime_starts': [r[1] for r in rows],
+            'values': [float('nan') if r[2] is None else r[2] for r in rows]}
+
+def append_vintages(series_id, dates, realtime_starts, values, realtime_end):
+    """
+    Adds (or overwrites) vintage delta rows for a series and records that
+    its vintages are now complete through realtime_end.
+    """
+    rows = [(series_id, _date_str(d), _date_str(r), None if pd.isna(v) else float(v))
+            for d, r, v in zip(dates, realtime_starts, values)]
+    with closing(_connect()) as conn, conn:
+        conn.executemany("INSERT OR REPLACE INTO vintages VALUES (?, ?, ?, ?)", rows)
+        conn.execute("INSERT OR REPLACE INTO vintage_series VALUES (?, ?, ?)",
+                     (series_id, time.time(), _date_str(realtime_end)))
+
+def purge_cache(series_id = None, units = None):
+    """
+    Deletes cached series. With no arguments the whole cache is cleared,
+    otherwise only entries matching the given series ID and/or units.
+    Returns the number of series removed.
+    """
+    where, params = [], []
+    if series_id is not None:
+        where.append("series_id = ?")
+        params.append(series_id)
+    if units is not None:
+        where.append("units = ?")
+        params.append(units)
+    clause = (" WHERE " + " AND ".join(where)) if where else ""
+
+    with closing(_connect()) as conn, conn:
+        removed = conn.execute("DELETE FROM series" + clause, params).rowcount
+        conn.execute("DELETE FROM observations" + clause, params)
+        if units is None:
+            vintage_clause = " WHERE series_id = ?" if series_id is not None else ""
+            vintage_params = [series_id] if series_id is not None else []
+            conn.execute("DELETE FROM vintage_series" + vintage_clause, vintage_params)
+            conn.execute("DELETE FROM vintages" + vintage_clause, vintage_params)
+    return removed
+
+def cached_series():
+    """
+    Lists what's in the cache as a DataFrame with one row per (series_id, units).
+    """
+    with closing(_connect()) as conn:
+        rows = conn.execute(
+            "SELECT series_id, units, last_updated, fetched_at FROM series ORDER BY series_id, units"
+        ).fetchall()
+    df = pd.DataFrame(rows, columns=['series_id', 'units', 'last_updated', 'fetched_at'])
+    df['fetched_at'] = pd.to_datetime(df['fetched_at'], unit='s')
+    return df
@@ -0,0 +1,593 @@
+"""
+This file is the repository for all the graphs we make. Each entry in
+CHART_SPECS is plain data: a unique name, a list of tags, and the arguments
+that get passed to create_line_graph. Nothing here is built when the package
+is imported, charts are only built when asked for:
+
+fig = build_chart('fig1_1')
+figures_list, chart_titles = build_charts(tags = '2006-2010')
+
+build_charts plans the whole build first: it works out which series every
+chart needs and over what dates, downloads each series once, and then
+renders all the charts from that shared data.
+
+To add a graph, add a dict to CHART_SPECS with a new name and whichever
+create_line_graph arguments it needs.
+"""
+
+# Libraries
+import pandas as pd
+from contextlib import nullcontext
+from fedchallenge import transforms, instrument, expressions
+from fedchallenge.store import SeriesStore
+
+#################
+## CHART SPECS ##
+#################
+
+CHART_SPECS = [
+    ########################
+    ### 2006-2010 GRAPHS ###
+    ########################
+
+    dict(name = 'fig1_1',
+         tags = ['2006-2010'],
+         datalist = ["GDPC1", "GDPPOT"],
+         chart_title = "GDP vs. Potential GDP, 2006-2010",
+         legend_titles = ["Real GDP", "Real Potential GDP"],
+         start_date = "2006-01-01",
+         end_date = "2010-09-01",
+         y_axis_title = "Billions of Dollars",
+         y_axis_range = [15000, 20000]),
+
+    dict(name = 'fig1_2',
+         tags = ['2006-2010'],
+         datalist = ["MEDLISPRIUS", "MEDLISPRIPERSQUFEEUS"],
+         chart_title = "Home List Price vs. Home List Price per Square Foot, 2006-2010",
+         start_date = "2006-01-01",
+         end_date = "2010-09-01",
+         y_axis_title = "U.S. Dollars",
+         split_y_axis_title = "U.S. Dollars",
+         split_y_axis = True,
+         num_lines_split_axis = 1),
+
+    dict(name = 'fig1_3',
+         tags = ['2006-2010'],
+         datalist = ["MSPUS"],
+         chart_title = "Home Sale Price, 2006-2010",
+         start_date = "2006-01-01",
+         end_date = "2010-09-01",
+         y_axis_title = "U.S. Dollars",
+         y_axis_range = [200000, 300000]),
+
+    dict(name = 'fig1_4',
+         tags = ['2006-2010'],
+         datalist = ["MORTGAGE30US"],
+         chart_title = "30 Year Fixed Rate Mortage Average, 2006-2010",
+         start_date = "2006-01-01",
+         end_date = "2010-09-01",
+         y_axis_title = "Percent",
+         y_axis_range = [4, 8]),
+
+    dict(name = 'fig1_5',
+         tags = ['2006-2010'],
+         datalist = ["DPCCRV1Q225SBEA", "FEDFUNDS", "IORB"],
+         chart_title = "Core PCE, Federal Funds Rate, vs. Interest on Reserved Balances, 2006-2010",
+         start_date = "2006-01-01",
+         end_date = "2010-09-01",
+         y_axis_title = "Percent",
+         split_y_axis = True,
+         num_lines_split_axis = 2,
+         split_y_axis_title = "Percent",
+         y_axis_range = [-1, 10],
+         split_y_axis_range = [0, 6]),
+
+    dict(name = 'fig1_6',
+         tags = ['2006-2010'],
+         datalist = ["NFCI"],
+         chart_title = "Chicago Fed National Financial Conditions Index, 2006-2010",
+         start_date = "2006-01-01",
+         end_date = "2010-09-01",
+         y_axis_title = "Index",
+         y_axis_range = [-1, 3]),
+
+    dict(name = 'fig1_7',
+         tags = ['2006-2010'],
+         datalist = ["DJIA", "SP500"],
+         chart_title = "DJIA & S&P500, 2006-2010",
+         start_date = "2006-01-01",
+         end_date = "2010-09-01",
+         y_axis_title = "Index",
+         split_y_axis = True,
+         num_lines_split_axis = 1,
+         split_y_axis_title = "Index",
+         y_axis_range = [0, 15000],
+         split_y_axis_range = [1000, 2000]),
+
+    dict(name = 'fig1_8',
+         tags = ['2006-2010'],
+         datalist = ["T10Y2Y"],
+         chart_title = "10-Year Treasury Constant Maturity Minus 2-Year Treasury Constant Maturity, 2006-2010",
+         start_date = "2006-01-01",
+         end_date = "2010-09-01",
+         y_axis_title = "Percent"),
+
+    dict(name = 'fig1_9',
+         tags = ['2006-2010'],
+         datalist = ["UMCSENT"],
+         chart_title = "University of Michigan Consumer Sentiment, 2006-2010",
+         start_date = "2006-01-01",
+         end_date = "2010-09-01",
+         y_axis_title = "Index: 1996"),
+
+    dict(name = 'fig1_10',
+         tags = ['2006-2010'],
+         datalist = ["VIXCLS"],
+         chart_title = "CBOE Volatility Index, 2006-2010",
+         start_date = "2006-01-01",
+         end_date = "2010-09-01",
+         y_axis_title = "Index"),
+
+    dict(name = 'fig1_101',
+         tags = ['2006-2010'],
+         datalist = ["WLEMUINDXD"],
+         chart_title = "Equity Market-related Economic Uncertainty Index, 2006-2010",
+         start_date = "2006-01-01",
+         end_date = "2010-09-01",
+         y_axis_title = "Index",
+         y_axis_range = [0, 1500]),
+
+
+    ########################
+    ### 2018-2024 GRAPHS ###
+    ########################
+
+    dict(name = 'fig1_11',
+         tags = ['2018-2024'],
+         datalist = ["GDPC1", "GDPPOT"],
+         chart_title = "GDP vs. Potential GDP, 2018-2024",
+         legend_titles = ["Real GDP", "Real Potential GDP"],
+         start_date = "2018-01-01",
+         end_date = "2024-09-01",
+         y_axis_title = "Billions of Dollars",
+         y_axis_range = [18500, 24000]),
+
+    dict(name = 'fig1_12',
+         tags = ['2018-2024'],
+         datalist = ["MEDLISPRIUS", "MEDLISPRIPERSQUFEEUS"],
+         chart_title = "Home List Price vs. Home List Price per Square Foot, 2018-2024",
+         start_date = "2018-01-01",
+         end_date = "2024-09-01",
+         y_axis_title = "U.S. Dollars",
+         split_y_axis_title = "U.S. Dollars",
+         split_y_axis = True,
+         num_lines_split_axis = 1),
+
+    dict(name = 'fig1_13',
+         tags = ['2018-2024'],
+         datalist = ["MSPUS"],
+         chart_title = "Home Sale Price, 2018-2024",
+         start_date = "2018-01-01",
+         end_date = "2024-09-01",
+         y_axis_title = "U.S. Dollars",
+         y_axis_range = [300000, 450000]),
+
+    dict(name = 'fig1_14',
+         tags = ['2018-2024'],
+         datalist = ["MORTGAGE30US"],
+         chart_title = "30 Year Fixed Rate Mortage Average, 2018-2024",
+         start_date = "2018-01-01",
+         end_date = "2024-09-01",
+         y_axis_title = "Percent",
+         y_axis_range = [1, 8]),
+
+    dict(name = 'fig1_15',
+         tags = ['2018-2024'],
+         datalist = ["DPCCRV1Q225SBEA", "FEDFUNDS", "IORB"],
+         chart_title = "Core PCE, Federal Funds Rate, vs. Interest on Reserved Balances, 2018-2024",
+         start_date = "2018-01-01",
+         end_date = "2024-09-01",
+         y_axis_title = "Percent",
+         split_y_axis = True,
+         num_lines_split_axis = 2,
+         split_y_axis_title = "Percent",
+         y_axis_range = [-1, 10],
+         split_y_axis_range = [0, 6]),
+
+    dict(name = 'fig1_16',
+         tags = ['2018-2024'],
+         datalist = ["NFCI"],
+         chart_title = "Chicago Fed National Financial Conditions Index, 2018-2024",
+         start_date = "2018-01-01",
+         end_date = "2024-09-01",
+         y_axis_title = "Index",
+         y_axis_range = [-1, 1]),
+
+    dict(name = 'fig1_20',
+         tags = ['2018-2024'],
+         datalist = ["DJIA", "SP500"],
+         chart_title = "DJIA & S&P500, 2018-2024",
+         start_date = "2018-01-01",
+         end_date = "2024-09-01",
+         y_axis_title = "Index",
+         split_y_axis = True,
+         num_lines_split_axis = 1,
+         split_y_axis_title = "Index",
+         y_axis_range = [20000, 45000],
+         split_y_axis_range = [2000, 6000]),
+
+    dict(name = 'fig1_17',
+         tags = ['2018-2024'],
+         datalist = ["T10Y2Y"],
+         chart_title = "10-Year Treasury Constant Maturity Minus 2-Year Treasury Constant Maturity, 2018-2024",
+         start_date = "2018-01-01",
+         end_date = "2024-09-01",
+         y_axis_title = "Percent"),
+
+    dict(name = 'fig1_18',
+         tags = ['2018-2024'],
+         datalist = ["UMCSENT"],
+         chart_title = "University of Michigan Consumer Sentiment, 2018-2024",
+         start_date = "2018-01-01",
+         end_date = "2024-09-01",
+         y_axis_title = "Index: 1996"),
+
+    dict(name = 'fig1_19',
+         tags = ['2018-2024'],
+         datalist = ["VIXCLS"],
+         chart_title = "CBOE Volatility Index, 2018-2024",
+         start_date = "2018-01-01",
+         end_date = "2024-09-01",
+         y_axis_title = "Index"),
+
+    dict(name = 'fig1_21',
+         tags = ['2018-2024'],
+         datalist = ["WLEMUINDXD"],
+         chart_title = "Equity Market-related Economic Uncertainty Index, 2018-2024",
+         start_date = "2018-01-01",
+         end_date = "2024-09-01",
+         y_axis_title = "Index",
+         y_axis_range = [0, 1500]),
+
+
+    ########################
+    ### 2006-2024 GRAPHS ###
+    ########################
+
+    dict(name = 'fig1_22',
+         tags = ['2006-2024'],
+         datalist = ["GDPC1", "GDPPOT"],
+         chart_title = "GDP vs. Potential GDP, 2006-2024",
+         legend_titles = ["Real GDP", "Real Potential GDP"],
+         start_date = "2006-01-01",
+         end_date = "2024-09-01",
+         fomc = False,
+         y_axis_title = "Billions of Dollars",
+         y_axis_range = [15000, 24000]),
+
+    dict(name = 'fig1_23',
+         tags = ['2006-2024'],
+         datalist = ["MEDLISPRIUS", "MEDLISPRIPERSQUFEEUS"],
+         chart_title = "Home List Price vs. Home List Price per Square Foot, 2006-2024",
+         start_date = "2006-01-01",
+         end_date = "2024-09-01",
+         fomc = False,
+         y_axis_title = "U.S. Dollars",
+         split_y_axis_title = "U.S. Dollars",
+         split_y_axis = True,
+         num_lines_split_axis = 1),
+
+    dict(name = 'fig1_24',
+         tags = ['2006-2024'],
+         datalist = ["MSPUS"],
+         chart_title = "Home Sale Price, 2006-2024",
+         start_date = "2006-01-01",
+         end_date = "2024-09-01",
+         fomc = False,
+         y_axis_title = "U.S. Dollars",
+         y_axis_range = [200000, 450000]),
+
+    dict(name = 'fig1_25',
+         tags = ['2006-2024'],
+         datalist = ["MORTGAGE30US"],
+         chart_title = "30 Year Fixed Rate Mortage Average, 2006-2024",
+         start_date = "2006-01-01",
+         end_date = "2024-09-01",
+         fomc = False,
+         y_axis_title = "Percent",
+         y_axis_range = [1, 8]),
+
+    dict(name = 'fig1_26',
+         tags = ['2006-2024'],
+         datalist = ["DPCCRV1Q225SBEA", "FEDFUNDS", "IORB"],
+         chart_title = "Core PCE, Federal Funds Rate, vs. Interest on Reserved Balances, 2006-2024",
+         start_date = "2006-01-01",
+         end_date = "2024-09-01",
+         fomc = False,
+         y_axis_title = "Percent",
+         split_y_axis = True,
+         num_lines_split_axis = 2,
+         split_y_axis_title = "Percent",
+         y_axis_range = [-1, 10],
+         split_y_axis_range = [0, 6]),
+
+    dict(name = 'fig1_27',
+         tags = ['2006-2024'],
+         datalist = ["NFCI"],
+         chart_title = "Chicago Fed National Financial Conditions Index, 2006-2024",
+         start_date = "2006-01-01",
+         end_date = "2024-09-01",
+         fomc = False,
+         y_axis_title = "Index",
+         y_axis_range = [-1, 3]),
+
+    dict(name = 'fig1_28',
+         tags = ['2006-2024'],
+         datalist = ["DJIA", "SP500"],
+         chart_title = "DJIA & S&P500, 2006-2024",
+         start_date = "2006-01-01",
+         end_date = "2024-09-01",
+         fomc = False,
+         y_axis_title = "Index",
+         split_y_axis = True,
+         num_lines_split_axis = 1,
+         split_y_axis_title = "Index",
+         y_axis_range = [0, 45000],
+         split_y_axis_range = [1000, 6000]),
+
+    dict(name = 'fig1_29',
+         tags = ['2006-2024'],
+         datalist = ["T10Y2Y"],
+         chart_title = "10-Year Treasury Constant Maturity Minus 2-Year Treasury Constant Maturity, 2006-2024",
+         start_date = "2006-01-01",
+         end_date = "2024-09-01",
+         fomc = False,
+         y_axis_title = "Percent"),
+
+    dict(name = 'fig1_30',
+         tags = ['2006-2024'],
+         datalist = ["UMCSENT"],
+         chart_title = "University of Michigan Consumer Sentiment, 2006-2024",
+         start_date = "2006-01-01",
+         end_date = "2024-09-01",
+         fomc = False,
+         y_axis_title = "Index: 1996"),
+
+    dict(name = 'fig1_31',
+         tags = ['2006-2024'],
+         datalist = ["VIXCLS"],
+         chart_title = "CBOE Volatility Index, 2006-2024",
+         start_date = "2006-01-01",
+         end_date = "2024-09-01",
+         fomc = False,
+         y_axis_title = "Index"),
+
+    dict(name = 'fig1_32',
+         tags = ['2006-2024'],
+         datalist = ["WLEMUINDXD"],
+         chart_title = "Equity Market-related Economic Uncertainty Index, 2006-2024",
+         start_date = "2006-01-01",
+         end_date = "2024-09-01",
+         fomc = False,
+         y_axis_title = "Index",
+         y_axis_range = [0, 1500]),
+
+    ########################
+    ### 2006+2024 GRAPHS ###
+    ########################
+
+    # TODO: Add this lol
+]
+
+# keys in a spec that aren't create_line_graph arguments
+SPEC_KEYS = ('name', 'tags')
+
+######################
+## HELPER FUNCTIONS ##
+######################
+
+def get_spec(name):
+    """
+    Returns the spec with the given name.
+    """
+    for spec in CHART_SPECS:
+        if spec['name'] == name:
+            return spec
+    raise KeyError("No chart named '%s' in the catalog" % name)
+
+def select_specs(names = None, tags = None):
+    """
+    Returns the specs matching any of the given names or tags (each can be a
+    single string or a list), in catalog order. With neither, returns every
+    spec.
+    """
+    if isinstance(names, str):
+        names = [names]
+    if isinstance(tags, str):
+        tags = [tags]
+    if names is None and tags is None:
+        return list(CHART_SPECS)
+
+    for name in names or []:
+        get_spec(name)  # fail loudly on typos
+
+    selected = []
+    for spec in CHART_SPECS:
+        if (names and spec['name'] in names) or (tags and set(tags) & set(spec['tags'])):
+            selected.append(spec)
+    return selected
+
+def list_tags():
+    """
+    Returns every tag used in the catalog, in the order they first appear.
+    """
+    return list(dict.fromkeys(tag for spec in CHART_SPECS for tag in spec['tags']))
+
+def chart_kwargs(spec):
+    """
+    The create_line_graph arguments for a spec.
+    """
+    return {key: value for key, value in spec.items() if key not in SPEC_KEYS}
+
+##############
+## PLANNING ##
+##############
+
+def _spec_window(spec):
+    """
+    The (start, end) dates a spec needs data for, including any overlay
+    periods. end is None when the chart runs to the latest observation.
+    """
+    import inspect
+    from fedchallenge import create_line_graph
+    defaults = {name: param.default for name, param in
+                inspect.signature(create_line_graph).parameters.items()}
+    kwargs = dict(defaults, **chart_kwargs(spec))
+
+    periods = list(kwargs['periods'] or [])
+    if kwargs['two_time_periods']:
+        periods.append((kwargs['second_start_date'], kwargs['second_end_date']))
+
+    start = min(pd.Timestamp(d) for d in [kwargs['start_date']] + [p[0] for p in periods])
+    end = None
+    if kwargs['end_date'] != 'Default':
+        end = max(pd.Timestamp(d) for d in [kwargs['end_date']] + [p[1] for p in periods])
+    return start, end, kwargs['units']
+
+def plan_build(specs):
+    """
+    Works out the unique series a list of specs needs and the union of the
+    date windows each one is charted over. Returns a dict with:
+
+    series            {series_id: (start, end)} to fetch, end None = latest
+    charts            number of charts in the build
+    series_requests   series downloads if every chart fetched its own data
+    unique_series     series downloads with the plan
+    requests_saved    the difference
+    """
+    from fedchallenge import _cached_info
+
+    windows = {}
+    series_requests = 0
+    for spec in specs:
+        start, end, units = _spec_window(spec)
+
+        # transformed units need some history before the window starts, and
+        # expressions need the series in them
+        for series_id in expressions.series_ids(spec['datalist']):
+            series_requests += 1
+            series_start = start
+            if units != 'lin':
+                series_start = start - transforms.lookback(units, _cached_info(series_id))
+
+            if series_id not in windows:
+                windows[series_id] = (series_start, end)
+            else:
+                old_start, old_end = windows[series_id]
+                windows[series_id] = (min(old_start, series_start),
+                                      None if old_end is None or end is None else max(old_end, end))
+
+    return {'series': windows,
+            'charts': len(specs),
+            'series_requests': series_requests,
+            'unique_series': len(windows),
+            'requests_saved': series_requests - len(windows)}
+
+def _overridden(specs, overrides):
+    # the specs as build_spec will chart them
+    return [dict(spec, **(overrides or {})) for spec in specs]
+
+def prefetch(plan):
+    """
+    Downloads (or loads from cache) every series in a plan at once and returns
+    them as a SeriesStore (see store.py), ready to be passed to
+    create_line_graph as preloaded.
+    """
+    from fedchallenge import _fetch_arrays
+    series_ids = list(plan['series'])
+    starts = [plan['series'][series_id][0] for series_id in series_ids]
+    ends = [plan['series'][series_id][1] for series_id in series_ids]
+    store = SeriesStore()
+    for series_id, start, end, (data, info) in zip(series_ids, starts, ends,
+                                                   _fetch_arrays(series_ids, 'lin', starts, ends)):
+        store.add(series_id, data, info, start, end)
+    return store
+
+#####################
+## BUILD FUNCTIONS ##
+#####################
+
+def build_spec(spec, preloaded = None, overrides = None):
+    """
+    Builds the figure for a single spec. preloaded is shared series data from
+    prefetch, if there is any. overrides is a dict of create_line_graph
+    arguments applied on top of the spec, e.g. {'downsample': 'lttb'}.
+    """
+    from fedchallenge import create_line_graph
+    kwargs = dict(chart_kwargs(spec), **(overrides or {}))
+    return create_line_graph(**kwargs, preloaded = preloaded)
+
+def build_chart(name):
+    """
+    Builds one chart from the catalog by name.
+    """
+    return build_spec(get_spec(name))
+
+def iter_charts(names = None, tags = None, overrides = None, snapshot = None, plan = None):
+    """
+    Builds the charts matching names/tags one at a time, yielding
+    (chart_title, figure). The series are fetched once up front like
+    build_charts does (or read from snapshot), but only the figure being
+    handed out is kept, so once the caller is done with it memory goes back
+    to the shared series data. plan is the plan_build result for these
+    charts and overrides, if the caller already has it.
+    """
+    specs = select_specs(names, tags)
+    if snapshot is not None:
+        from fedchallenge.snapshot import load_snapshot
+        preloaded = load_snapshot(snapshot)
+    else:
+        # planned with the overrides, since they can move the window or units
+        preloaded = prefetch(plan or plan_build(_overridden(specs, overrides)))
+
+    for spec in specs:
+        yield spec['chart_title'], build_spec(spec, preloaded, overrides)
+
+def build_charts(names = None, tags = None, report = False, overrides = None,
+                 snapshot = None):
+    """
+    Builds the charts matching names/tags (everything if neither is given) and
+    returns (figures_list, chart_titles). Every series is fetched once up
+    front and shared between the charts, or read from the snapshot directory
+    snapshot if one is given (see snapshot.py). overrides is passed to
+    build_spec for every chart. With report = True the build plan (see
+    plan_build) is returned as a third value, along with the build's timings
+    (see instrument.py): 'timings' (the span table per stage), 'counters',
+    'summary' (both as printable text), 'rss_before' and 'rss_after' (the
+    process' memory before and after the build) and 'process_peak_rss' (the
+    most it has ever used, possibly before this build), all in bytes.
+
+    Every figure stays in memory until the lists are dropped, use
+    iter_charts (or export.stream_catalog) for big builds.
+    """
+    figures_list = []
+    chart_titles = []
+    rss_before = instrument.current_rss()
+    with (instrument.recording() if report else nullcontext()) as recorder:
+        # planned once, for the build and the report
+        plan = None
+        if report or snapshot is None:
+            plan = plan_build(_overridden(select_specs(names, tags), overrides))
+        for chart_title, fig in iter_charts(names, tags, overrides, snapshot, plan):
+            figures_list.append(fig)
+            chart_titles.append(chart_title)
+
+    if report:
+        plan['timings'] = recorder.spans()
+        plan['counters'] = recorder.counters()
+        plan['summary'] = recorder.summary()
+        plan['rss_before'] = rss_before
+        plan['rss_after'] = instrument.current_rss()
+        plan['process_peak_rss'] = instrument.peak_rss()
+        return figures_list, chart_titles, plan
+    return figures_list, chart_titles
@@ -0,0 +1,236 @@
+"""
+This file is used to save the graphs as image files. It takes the
+figures_list/chart_titles pair that build_charts returns (or builds the
+catalog itself) and writes one file per chart to an output directory:
+
+export_catalog('charts', tags = '2006-2010', formats = ('png', 'svg'))
+
+Charts are split across a pool of worker processes, one per core. Each
+worker starts a single kaleido renderer and keeps it for every image it
+draws, instead of paying the renderer's start-up cost for every file.
+File names come from the chart titles.
+
+With snapshot = <directory> (see snapshot.py), export_catalog sends the
+workers chart names instead of finished figures, and every worker builds
+its own charts from the memory-mapped snapshot, so the series data is
+shared through the page cache instead of pickled to each process.
+
+stream_catalog is for big catalogs (e.g. full-history daily charts): it
+builds one chart at a time and writes it while the next one is built, so
+at most two figures are in memory at once, however many charts there are.
+"""
+
+# Libraries
+import os
+import re
+import json
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from fedchallenge import instrument
+
+##############
+### SET-UP ###
+##############
+
+DEFAULT_WIDTH = 1400
+DEFAULT_HEIGHT = 500
+DEFAULT_SCALE = 1
+
+# one renderer per process, see get_renderer
+_renderer = None
+
+##############
+## RENDERER ##
+##############
+
+def get_renderer():
+    """
+    Returns this process' kaleido renderer, starting it on first use. The
+    renderer keeps its browser process alive between images.
+    """
+    global _renderer
+    if _renderer is None:
+        import plotly
+        from kaleido.scopes.plotly import PlotlyScope
+
+        # use the plotly.js that ships with the plotly package so the renderer
+        # understands everything the figures we build can contain
+        plotlyjs = os.path.join(os.path.dirname(plotly.__file__), 'package_data', 'plotly.min.js')
+        _renderer = PlotlyScope(plotlyjs=plotlyjs if os.path.exists(plotlyjs) else None)
+    return _renderer
+
+def render(figure, format = 'png', width = DEFAULT_WIDTH, height = DEFAULT_HEIGHT,
+           scale = DEFAULT_SCALE):
+    """
+    Renders a figure (a plotly Figure or its dict form) and returns the image
+    bytes.
+    """
+    if not isinstance(figure, dict):
+        figure = _figure_dict(figure)
+    return get_renderer().transform(figure, format=format, width=width,
+                                    height=height, scale=scale)
+
+def _figure_dict(fig):
+    # round trip through JSON so dates, numpy arrays etc. are plain values
+    return json.loads(fig.to_json())
+
+######################
+## HELPER FUNCTIONS ##
+######################
+
+def chart_filename(chart_title, format = 'png'):
+    """
+    Turns a chart title into a file name, e.g.
+    "GDP vs. Potential GDP, 2006-2010" -> "gdp_vs_potential_gdp_2006-2010.png"
+    """
+    name = re.sub(r'[^a-z0-9\-]+', '_', chart_title.lower()).strip('_')
+    return f'{name}.{format}'
+
+def _output_paths(chart_titles, out_dir, formats):
+    # one path per chart and format, two charts with the same title
+    # shouldn't overwrite each other
+    paths = []
+    used_names = set()
+    for chart_title in chart_titles:
+        for format in formats:
+            filename = chart_filename(chart_title, format)
+            stem, n = filename[:-len(format) - 1], 2
+            while filename in used_names:
+                filename = f'{stem}_{n}.{format}'
+                n += 1
+            used_names.add(filename)
+            paths.append(os.path.join(out_dir, filename))
+    return paths
+
+def _export_one(job):
+    figure, path, format, width, height, scale = job
+    image = render(figure, format, width, height, scale)
+    with open(path, 'wb') as f:
+        f.write(image)
+    return path
+
+def _export_spec(job):
+    # builds the chart in this process, reading its series from the snapshot,
+    # and writes it in every format
+    name, snapshot, outputs, width, height, scale = job
+    from fedchallenge.catalog import build_spec, get_spec
+    figure = _figure_dict(build_spec(get_spec(name), preloaded = snapshot))
+    return [_export_one((figure, path, format, width, height, scale))
+            for path, format in outputs]
+
+def _run_jobs(function, jobs, max_workers):
+    if max_workers is None:
+        max_workers = _available_cores()
+    max_workers = max(1, min(max_workers, len(jobs)))
+
+    with instrument.span('export', jobs=len(jobs), workers=max_workers):
+        # not worth starting a pool (and more renderers) for a single worker
+        if max_workers == 1:
+            return [function(job) for job in jobs]
+
+        # hand each worker a contiguous chunk so it reuses its renderer
+        chunksize = -(-len(jobs) // max_workers)
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            return list(pool.map(function, jobs, chunksize=chunksize))
+
+def _available_cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+############
+## EXPORT ##
+############
+
+def export_figures(figures_list, chart_titles, out_dir, formats = ('png',),
+                   width = DEFAULT_WIDTH, height = DEFAULT_HEIGHT, scale = DEFAULT_SCALE,
+                   max_workers = None):
+    """
+    Writes every figure to out_dir in each of formats, named after its chart
+    title. max_workers defaults to the number of available cores. Returns
+    the paths written, in the same order as figures_list (and formats).
+    """
+    if isinstance(formats, str):
+        formats = (formats,)
+    os.makedirs(out_dir, exist_ok=True)
+
+    paths = iter(_output_paths(chart_titles, out_dir, formats))
+    jobs = []
+    for fig in figures_list:
+        figure = _figure_dict(fig)
+        for format in formats:
+            jobs.append((figure, next(paths), format, width, height, scale))
+    return _run_jobs(_export_one, jobs, max_workers)
+
+def export_catalog(out_dir, names = None, tags = None, formats = ('png',),
+                   width = DEFAULT_WIDTH, height = DEFAULT_HEIGHT, scale = DEFAULT_SCALE,
+                   max_workers = None, snapshot = None):
+    """
+    Builds the catalog charts matching names/tags (everything if neither is
+    given) and exports them to out_dir. With snapshot (a snapshot directory,
+    see snapshot.py) each worker builds its charts from the snapshot itself.
+    Returns the paths written.
+    """
+    from fedchallenge.catalog import build_charts, select_specs
+    if snapshot is None:
+        figures_list, chart_titles = build_charts(names, tags)
+        return export_figures(figures_list, chart_titles, out_dir, formats, width,
+                              height, scale, max_workers)
+
+    if isinstance(formats, str):
+        formats = (formats,)
+    os.makedirs(out_dir, exist_ok=True)
+    snapshot = os.path.abspath(snapshot)
+    specs = select_specs(names, tags)
+    paths = iter(_output_paths([spec['chart_title'] for spec in specs], out_dir, formats))
+    jobs = [(spec['name'], snapshot, [(next(paths), format) for format in formats],
+             width, height, scale)
+            for spec in specs]
+    return [path for paths in _run_jobs(_export_spec, jobs, max_workers) for path in paths]
+
+def stream_catalog(out_dir, names = None, tags = None, formats = ('png',),
+                   width = DEFAULT_WIDTH, height = DEFAULT_HEIGHT, scale = DEFAULT_SCALE,
+                   overrides = None, snapshot = None):
+    """
+    Builds and exports the catalog charts matching names/tags one at a time
+    (see catalog.iter_charts): each figure is written to out_dir in a
+    background thread while the next one is built, then dropped. Returns a
+    dict with 'paths' (in catalog order), 'charts', 'rss_before' and
+    'rss_after' (the process' memory before and after the build, in bytes,
+    see instrument.current_rss) and 'process_peak_rss' (the most the process
+    has ever used, which may be from before this build, see
+    instrument.peak_rss).
+    """
+    from fedchallenge.catalog import iter_charts, select_specs
+    if isinstance(formats, str):
+        formats = (formats,)
+    os.makedirs(out_dir, exist_ok=True)
+    rss_before = instrument.current_rss()
+
+    specs = select_specs(names, tags)
+    paths = iter(_output_paths([spec['chart_title'] for spec in specs], out_dir, formats))
+
+    def write(figure, outputs):
+        return [_export_one((figure, path, format, width, height, scale))
+                for path, format in outputs]
+
+    written = []
+    pending = None
+    with instrument.span('export', jobs=len(specs), workers=1), \
+            ThreadPoolExecutor(max_workers=1) as writer:
+        for _, fig in iter_charts(names, tags, overrides, snapshot):
+            figure = _figure_dict(fig)
+            del fig
+            # wait for the chart before, so only it and this one are alive
+            if pending is not None:
+                written.extend(pending.result())
+            pending = writer.submit(write, figure, [(next(paths), format) for format in formats])
+            del figure
+        if pending is not None:
+            written.extend(pending.result())
+
+    return {'paths': written,
+            'charts': len(specs),
+            'rss_before': rss_before,
+            'rss_after': instrument.current_rss(),
+            'process_peak_rss': instrument.peak_rss()}
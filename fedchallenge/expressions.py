@@ -0,0 +1,282 @@
+"""
+This file is used to chart series computed from other series. Anywhere a
+datalist takes a FRED series ID it also takes an expression over IDs:
+
+datalist = ["(GDPC1/GDPPOT - 1)*100", "FEDFUNDS - DPCCRV1Q225SBEA"]
+
+Expressions can use + - * / ** and parentheses, numbers, and log, exp,
+sqrt and abs. Only the series in them are fetched, and the rest is computed
+locally with NumPy on the series put onto one calendar (see align.py): the
+coarsest frequency among them, averaging the finer ones, so FEDFUNDS -
+DPCCRV1Q225SBEA is quarterly. units apply to each series before the
+expression is computed.
+
+Each expression is parsed once and normalized (spacing, upper case IDs,
+operands of + and * in a fixed order), so '(gdpc1/gdppot-1)*100' and
+'100 * (GDPC1 / GDPPOT - 1)' are the same expression. Every part of an
+expression that involves a series is memoized by its normalized text and
+the data it was computed from, so GDPC1 / GDPPOT is only computed once
+across every chart in a catalog build that uses it.
+"""
+
+# Libraries
+import re
+import ast
+import threading
+from functools import lru_cache
+from collections import OrderedDict
+import numpy as np
+from fedchallenge import align, fred_client
+from fedchallenge.store import SeriesArray
+
+##############
+### SET-UP ###
+##############
+
+# anything that isn't a plain FRED ID is an expression
+SERIES_ID = re.compile(r'^[A-Za-z0-9_]+$')
+
+OPERATORS = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply,
+             ast.Div: np.true_divide, ast.Pow: np.power}
+UNARY = {ast.USub: np.negative, ast.UAdd: np.positive}
+FUNCTIONS = {'log': np.log, 'exp': np.exp, 'sqrt': np.sqrt, 'abs': np.abs}
+COMMUTATIVE = (ast.Add, ast.Mult)
+
+# computed subexpressions kept, most recently used last
+MEMO_SIZE = 256
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+#############
+## PARSING ##
+#############
+
+def is_expression(entry):
+    return isinstance(entry, str) and not SERIES_ID.match(entry)
+
+def _normalize(node, text):
+    # checks every node is one we can compute, and rebuilds it canonically
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) \
+            and not isinstance(node.value, bool):
+        return ast.Constant(float(node.value))
+    if isinstance(node, ast.Name):
+        return ast.Name(node.id.upper(), ast.Load())
+    if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY:
+        return ast.UnaryOp(node.op, _normalize(node.operand, text))
+    if isinstance(node, ast.BinOp) and type(node.op) in OPERATORS:
+        left, right = _normalize(node.left, text), _normalize(node.right, text)
+        if isinstance(node.op, COMMUTATIVE) and ast.unparse(right) < ast.unparse(left):
+            left, right = right, left
+        return ast.BinOp(left, node.op, right)
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) \
+            and node.func.id.lower() in FUNCTIONS and len(node.args) == 1 and not node.keywords:
+        return ast.Call(ast.Name(node.func.id.lower(), ast.Load()),
+                        [_normalize(node.args[0], text)], [])
+    raise ValueError("Can't compute '%s' in expression '%s', expressions can use "
+                     "series IDs, numbers, + - * / ** and %s"
+                     % (ast.unparse(node), text, ', '.join(FUNCTIONS)))
+
+def _names(node):
+    # series IDs in the order they first appear
+    ids = [n.id for n in ast.walk(node) if isinstance(n, ast.Name) and n.id not in FUNCTIONS]
+    return tuple(dict.fromkeys(ids))
+
+class Expression:
+    """
+    A parsed expression: text as written, normalized text, the normalized
+    tree and the series IDs it uses.
+    """
+
+    __slots__ = ('text', 'normalized', 'tree', 'series_ids')
+
+    def __init__(self, text, tree):
+        self.text = text
+        self.tree = tree
+        self.normalized = ast.unparse(tree)
+        self.series_ids = _names(tree)
+
+    def __repr__(self):
+        return 'Expression(%r)' % self.normalized
+
+@lru_cache(maxsize=1024)
+def parse(text):
+    """
+    Parses and normalizes an expression, once per distinct text. Raises
+    ValueError for anything that isn't an expression we can compute.
+    """
+    try:
+        tree = ast.parse(text.strip(), mode='eval').body
+    except SyntaxError as exc:
+        raise ValueError("Can't parse expression '%s': %s" % (text, exc.msg)) from None
+    tree = _normalize(tree, text)
+    if not _names(tree):
+        raise ValueError("Expression '%s' doesn't use any series" % text)
+    return Expression(text, tree)
+
+def series_ids(datalist):
+    """
+    Every FRED series ID a datalist needs, with expressions replaced by the
+    series in them, in order and without repeats.
+    """
+    ids = []
+    for entry in datalist:
+        ids.extend(parse(entry).series_ids if is_expression(entry) else [entry])
+    return list(dict.fromkeys(ids))
+
+def expression_info(text, infos = None):
+    """
+    Info for an expression in the shape of FRED's series info, so titles,
+    axis labels and cache stamps work like they do for a series. infos is
+    {series_id: info} for the series in it, looked up if not given.
+    """
+    expression = parse(text)
+    if infos is None:
+        infos = {series_id: fred_client.get_series_info(series_id)
+                 for series_id in expression.series_ids}
+    used = [infos[series_id] for series_id in expression.series_ids]
+    frequency = align.common_frequency(used)
+    return {'id': expression.normalized,
+            'title': text.strip(),
+            'units': text.strip(),
+            'frequency_short': frequency,
+            'frequency': frequency,
+            'last_updated': max(str(info.get('last_updated')) for info in used),
+            'notes': 'Computed from ' + ', '.join(expression.series_ids)}
+
+################
+## EVALUATING ##
+################
+
+def _on_calendar(data, frequency):
+    # one series on the calendar, without the empty periods
+    dates, values = align.align_arrays([data], frequency)
+    keep = ~np.isnan(values[:, 0])
+    return SeriesArray(dates[keep], values[keep, 0])
+
+def _combine(function, left, right, frequency):
+    if not isinstance(left, SeriesArray) and not isinstance(right, SeriesArray):
+        return float(function(left, right))
+    if not isinstance(right, SeriesArray):
+        return SeriesArray(left.dates, function(left.values, right))
+    if not isinstance(left, SeriesArray):
+        return SeriesArray(right.dates, function(left, right.values))
+    # both are already on the calendar, so this only lines up their dates
+    dates, values = align.align_arrays([left, right], frequency)
+    keep = ~np.isnan(values).any(axis=1)
+    return SeriesArray(dates[keep], function(values[keep, 0], values[keep, 1]))
+
+def _constant(node):
+    # a part of an expression with no series in it
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, ast.UnaryOp):
+        return float(UNARY[type(node.op)](_constant(node.operand)))
+    if isinstance(node, ast.Call):
+        return float(FUNCTIONS[node.func.id](_constant(node.args[0])))
+    return float(OPERATORS[type(node.op)](_constant(node.left), _constant(node.right)))
+
+def _evaluate(node, leaves, stamps, frequency):
+    names = _names(node)
+    if not names:
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            return _constant(node)
+
+    # memoized by what's computed and from which data
+    key = (ast.unparse(node), frequency, tuple(stamps[name] for name in names))
+    with _memo_lock:
+        if key in _memo:
+            _memo.move_to_end(key)
+            _stats['hits'] += 1
+            return _memo[key]
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        if isinstance(node, ast.Name):
+            result = _on_calendar(leaves[node.id], frequency)
+        elif isinstance(node, ast.UnaryOp):
+            operand = _evaluate(node.operand, leaves, stamps, frequency)
+            result = SeriesArray(operand.dates, UNARY[type(node.op)](operand.values))
+        elif isinstance(node, ast.Call):
+            argument = _evaluate(node.args[0], leaves, stamps, frequency)
+            result = SeriesArray(argument.dates, FUNCTIONS[node.func.id](argument.values))
+        else:
+            result = _combine(OPERATORS[type(node.op)],
+                              _evaluate(node.left, leaves, stamps, frequency),
+                              _evaluate(node.right, leaves, stamps, frequency), frequency)
+
+    with _memo_lock:
+        _stats['misses'] += 1
+        _memo[key] = result
+        while len(_memo) > MEMO_SIZE:
+            _memo.popitem(last=False)
+    return result
+
+def evaluate(text, leaves, context = ()):
+    """
+    Computes an expression from leaves, {series_id: (SeriesArray, info)}.
+    context is anything else the leaves depend on (units, vintage), for
+    memoizing. Returns (SeriesArray, info).
+    """
+    expression = parse(text)
+    infos = {series_id: leaves[series_id][1] for series_id in expression.series_ids}
+    info = expression_info(text, infos)
+
+    # what each series' data is, without hashing the data itself
+    stamps = {}
+    for series_id in expression.series_ids:
+        data, series_info = leaves[series_id]
+        stamps[series_id] = (series_id, len(data),
+                             str(data.first_date()) if len(data) else None,
+                             str(data.last_date()) if len(data) else None,
+                             str(series_info.get('last_updated'))) + tuple(context)
+
+    data = {series_id: leaves[series_id][0] for series_id in expression.series_ids}
+    result = _evaluate(expression.tree, data, stamps, info['frequency_short'])
+    return result, info
+
+def fetch(entries, units, starts, ends, fetch_series, whole = False, context = ()):
+    """
+    Like fetching entries one by one, where entries can be expressions.
+    fetch_series(series_ids, units, starts, ends) fetches plain series and
+    returns a list of (SeriesArray, info). Every series is fetched once in
+    one call. With whole = True the series in expressions are fetched over
+    everything available (e.g. all of a catalog build's data), so charts
+    with different windows share the computed results.
+    """
+    requests = {}
+    for entry, entry_units, start, end in zip(entries, units, starts, ends):
+        if is_expression(entry):
+            for series_id in parse(entry).series_ids:
+                window = (None, None) if whole else (start, end)
+                requests.setdefault((series_id, entry_units) + window, None)
+        else:
+            requests.setdefault((entry, entry_units, start, end), None)
+
+    keys = list(requests)
+    fetched = fetch_series([k[0] for k in keys], [k[1] for k in keys],
+                           [k[2] for k in keys], [k[3] for k in keys])
+    requests = dict(zip(keys, fetched))
+
+    results = []
+    for entry, entry_units, start, end in zip(entries, units, starts, ends):
+        if not is_expression(entry):
+            results.append(requests[(entry, entry_units, start, end)])
+            continue
+        window = (None, None) if whole else (start, end)
+        leaves = {series_id: requests[(series_id, entry_units) + window]
+                  for series_id in parse(entry).series_ids}
+        data, info = evaluate(entry, leaves, (entry_units,) + tuple(context))
+        results.append((data.window(start, end), info))
+    return results
+
+def cache_info():
+    """
+    Subexpression memo hits, misses and size.
+    """
+    with _memo_lock:
+        return dict(_stats, size=len(_memo))
+
+def clear_memo():
+    with _memo_lock:
+        _memo.clear()
+        _stats.update(hits=0, misses=0)
@@ -0,0 +1,241 @@
+"""
+This file is used to hold the FRED client that the whole package shares, and
+a memo of each series' info so it only gets requested from FRED once per
+process. Everything that talks to FRED (fred_api, fred_api_info, get_datasets,
+create_line_graph) goes through here instead of building its own Fred object.
+"""
+
+# Libraries
+import os
+import time
+import random
+import threading
+import http.client
+from urllib.request import urlopen
+from urllib.error import HTTPError, URLError
+import xml.etree.ElementTree as ET
+from xml.etree.ElementTree import ParseError
+import pandas as pd
+from fredapi import Fred
+from fedchallenge import instrument
+from fedchallenge.transport import HTTPTransport
+
+##############
+### SET-UP ###
+##############
+
+# read from the environment (or the .env file load_dotenv picked up)
+FRED_API_KEY = os.getenv("FRED_API_KEY")
+
+# reuse connections to FRED (see transport.py), FEDCHALLENGE_HTTP_POOL=0 goes
+# back to one connection per request
+HTTP_POOL = os.getenv("FEDCHALLENGE_HTTP_POOL", "1") != "0"
+
+_client = None
+_client_lock = threading.Lock()
+
+_series_info = {}
+_info_lock = threading.Lock()
+
+# FRED allows 120 requests per minute per key, stay a little under it
+REQUESTS_PER_MINUTE = 110
+BURST = 10
+
+# retry settings for rate limit (429) and server (5xx) errors
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0   # seconds, doubled on each retry
+BACKOFF_MAX = 30.0
+
+# the instrument stage each client method's time is reported under
+METHOD_STAGES = {'get_series': 'fetch', 'get_series_info': 'metadata',
+                 'get_series_updates': 'metadata'}
+
+# series/updates pages hold at most 1000 series, and FRED keeps the feed
+# for the last two weeks only. Its times are US Central.
+UPDATES_PAGE = 1000
+UPDATES_WINDOW = pd.Timedelta(days=14)
+UPDATES_COLUMNS = ['id', 'title', 'frequency_short', 'units', 'last_updated']
+FRED_TIMEZONE = 'America/Chicago'
+
+############
+## CLIENT ##
+############
+
+class FredClient(Fred):
+    """
+    fredapi's Fred, fetching each response itself: through transport (an
+    HTTPTransport, see transport.py) when there is one, otherwise with a new
+    urllib connection like Fred does. Either way the bytes received are
+    counted (see instrument.py), and errors come out the same as from Fred.
+    """
+
+    def __init__(self, api_key = None, api_key_file = None, proxies = None, transport = None):
+        super().__init__(api_key=api_key, api_key_file=api_key_file, proxies=proxies)
+        self.transport = transport
+
+    def _Fred__fetch_data(self, url):
+        url += '&api_key=' + self.api_key
+        try:
+            if self.transport is not None:
+                body = self.transport.get(url)
+            else:
+                body = urlopen(url).read()
+                instrument.count('bytes_received', len(body))
+        except HTTPError as exc:
+            root = ET.fromstring(exc.read())
+            raise ValueError(root.get('message'))
+        return ET.fromstring(body)
+
+    def get_series_updates(self, start_time = None, end_time = None, offset = 0,
+                           limit = UPDATES_PAGE):
+        """
+        One page of FRED's series/updates feed: the series updated between
+        start_time and end_time (naive times are UTC), most recently updated
+        first. Returns (DataFrame of UPDATES_COLUMNS, total number of series
+        in the feed).
+        """
+        url = '%s/series/updates?filter_value=all&offset=%d&limit=%d' % (self.root_url, offset, limit)
+        if start_time is not None:
+            url += '&start_time=%s&end_time=%s' % (_fred_time(start_time),
+                                                   _fred_time(end_time or pd.Timestamp.now('UTC')))
+        root = self._Fred__fetch_data(url)
+        updates = pd.DataFrame([child.attrib for child in root], columns=UPDATES_COLUMNS)
+        return updates, int(root.get('count', len(updates)))
+
+def _fred_time(time):
+    time = pd.Timestamp(time)
+    if time.tzinfo is None:
+        time = time.tz_localize('UTC')
+    return time.tz_convert(FRED_TIMEZONE).strftime('%Y%m%d%H%M')
+
+def get_client():
+    """
+    Returns the process-wide Fred client, creating it on first use.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = FredClient(api_key=FRED_API_KEY,
+                                     transport=HTTPTransport() if HTTP_POOL else None)
+    return _client
+
+def set_client(client):
+    """
+    Swaps out the shared client, e.g. for one with a different API key or a
+    local stand-in that has the same get_series/get_series_info interface.
+    Clients with rate_limited = False (like offline.OfflineFred) skip the
+    rate limiter. Passing None resets it so the next call builds a fresh one.
+    """
+    global _client
+    with _client_lock:
+        _client = client
+
+###################
+## RATE LIMITING ##
+###################
+
+class TokenBucket:
+    """
+    Simple thread-safe token bucket. Tokens refill at `rate_per_minute` and
+    at most `burst` can be saved up, acquire() blocks until one is available.
+    """
+
+    def __init__(self, rate_per_minute, burst):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+_bucket = TokenBucket(REQUESTS_PER_MINUTE, BURST)
+
+def _http_status(exc):
+    """
+    Digs the HTTP status code out of an exception, if there is one. fredapi
+    turns HTTPErrors into ValueErrors (or a ParseError when the error page
+    isn't XML), so we also look at the exception it was raised from.
+    """
+    while exc is not None:
+        if isinstance(exc, HTTPError):
+            return exc.code
+        exc = exc.__context__
+    return None
+
+def _is_retryable(exc):
+    status = _http_status(exc)
+    if status is not None:
+        return status == 429 or status >= 500
+    if isinstance(exc, ValueError) and 'too many requests' in str(exc).lower():
+        return True
+    return isinstance(exc, (URLError, ConnectionError, TimeoutError, ParseError,
+                            http.client.HTTPException))
+
+def call(method, *args, **kwargs):
+    """
+    Calls `method` on the shared client (e.g. call('get_series', 'GDPC1')),
+    waiting for a rate limit token first and retrying with exponential
+    backoff on 429s, 5xx errors and dropped connections.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        client = get_client()
+        if getattr(client, 'rate_limited', True):
+            _bucket.acquire()
+        instrument.count('fred_requests', method=method)
+        try:
+            with instrument.span(METHOD_STAGES.get(method, 'fetch'), method=method,
+                                 series_id=args[0] if args else None):
+                return getattr(client, method)(*args, **kwargs)
+        except Exception as exc:
+            if attempt == MAX_RETRIES or not _is_retryable(exc):
+                raise
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+            time.sleep(delay * random.uniform(0.5, 1.0))
+
+#################
+## SERIES INFO ##
+#################
+
+def get_series_info(series_id, refresh = False):
+    """
+    Returns the FRED info for a series, only hitting the API the first time
+    we see the series (or when refresh = True).
+    """
+    if not refresh:
+        with _info_lock:
+            if series_id in _series_info:
+                return _series_info[series_id]
+
+    info = call('get_series_info', series_id)
+    remember_info(series_id, info)
+    return info
+
+def remember_info(series_id, info):
+    """
+    Records info we already have in hand (e.g. from the on-disk cache) so
+    later lookups don't need to go to FRED.
+    """
+    with _info_lock:
+        _series_info[series_id] = info
+
+def forget_info(series_id = None):
+    """
+    Drops memoized info for one series, or for all of them.
+    """
+    with _info_lock:
+        if series_id is None:
+            _series_info.clear()
+        else:
+            _series_info.pop(series_id, None)
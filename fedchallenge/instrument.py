@@ -0,0 +1,258 @@
+"""
+This file is used to time what a build spends its time on. The rest of the
+package reports two kinds of events here:
+
+spans      how long a stage took, e.g.
+           {'event': 'span', 'stage': 'fetch', 'ms': 182.4, 'series_id': 'GDPC1', ...}
+counters   how many of something happened, e.g.
+           {'event': 'count', 'name': 'cache_hits', 'value': 1, 'series_id': 'GDPC1'}
+
+Stages are fetch (FRED observations), metadata (FRED series info),
+shaping (units transforms and DataFrames), traces, shapes, layout and
+export, plus one chart span around each create_line_graph call. Counters
+are fred_requests, bytes_received, cache_hits, cache_misses and
+connections_opened.
+
+Events go to every registered sink. A sink is any callable that takes the
+event dict, LoggingSink and JsonLinesSink are ready-made ones:
+
+add_sink(JsonLinesSink('timings.jsonl'))
+add_sink(lambda event: print(event))
+
+With no sinks registered nothing is recorded. Setting
+FEDCHALLENGE_TIMINGS=<file> adds a JsonLinesSink on import.
+build_charts(report = True) collects everything with a Recorder and adds
+the summary to its report.
+"""
+
+# Libraries
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+import pandas as pd
+
+##############
+### SET-UP ###
+##############
+
+STAGES = ('fetch', 'metadata', 'shaping', 'traces', 'shapes', 'layout', 'export', 'chart')
+COUNTERS = ('fred_requests', 'bytes_received', 'cache_hits', 'cache_misses',
+            'connections_opened')
+
+_sinks = []
+_sinks_lock = threading.Lock()
+
+###########
+## SINKS ##
+###########
+
+def add_sink(sink):
+    """
+    Registers a sink (a callable taking an event dict). Returns it.
+    """
+    with _sinks_lock:
+        _sinks.append(sink)
+    return sink
+
+def remove_sink(sink):
+    with _sinks_lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+
+def enabled():
+    return bool(_sinks)
+
+def emit(event):
+    for sink in list(_sinks):
+        sink(event)
+
+class LoggingSink:
+    """
+    Logs every event as JSON to the 'fedchallenge' logger (or the one given).
+    """
+
+    def __init__(self, logger = None, level = logging.INFO):
+        self.logger = logger or logging.getLogger('fedchallenge')
+        self.level = level
+
+    def __call__(self, event):
+        self.logger.log(self.level, json.dumps(event, default=str))
+
+class JsonLinesSink:
+    """
+    Appends every event to a file as one JSON object per line. Takes a path
+    or an open file.
+    """
+
+    def __init__(self, path_or_file):
+        if isinstance(path_or_file, str):
+            self.file = open(path_or_file, 'a')
+        else:
+            self.file = path_or_file
+        self.lock = threading.Lock()
+
+    def __call__(self, event):
+        line = json.dumps(event, default=str)
+        with self.lock:
+            self.file.write(line + '\n')
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+###########
+## SPANS ##
+###########
+
+@contextmanager
+def span(stage, **fields):
+    """
+    Times the block inside it as one span of the given stage.
+    """
+    if not _sinks:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        emit(dict(fields, event='span', stage=stage,
+                  ms=(time.perf_counter() - start) * 1000,
+                  thread=threading.current_thread().name))
+
+def count(name, value = 1, **fields):
+    """
+    Adds value to a counter.
+    """
+    if _sinks:
+        emit(dict(fields, event='count', name=name, value=value))
+
+class StageTimer:
+    """
+    Times a run of stages one after another without nesting every block in
+    a with statement: start('traces') ... start('shapes') ... finish(). Each
+    start ends the stage before it. With total (a stage name), finish() also
+    emits one span covering everything since the timer was made. fields are
+    added to every span.
+    """
+
+    def __init__(self, total = None, **fields):
+        self.total = total
+        self.fields = fields
+        self.stage = None
+        self.started = None
+        self.created = time.perf_counter()
+
+    def start(self, stage):
+        self.stop()
+        if _sinks:
+            self.stage, self.started = stage, time.perf_counter()
+
+    def stop(self):
+        if self.stage is not None:
+            emit(dict(self.fields, event='span', stage=self.stage,
+                      ms=(time.perf_counter() - self.started) * 1000,
+                      thread=threading.current_thread().name))
+        self.stage = None
+
+    def finish(self):
+        self.stop()
+        if self.total is not None and _sinks:
+            emit(dict(self.fields, event='span', stage=self.total,
+                      ms=(time.perf_counter() - self.created) * 1000,
+                      thread=threading.current_thread().name))
+
+############
+## MEMORY ##
+############
+
+def peak_rss():
+    """
+    The most memory (resident set size, in bytes) this process has used
+    since it started, None where the resource module doesn't exist
+    (Windows). It never goes down, so after the first build in a process it
+    can be that build's peak rather than the current one's, use
+    current_rss before and after a build for what the build itself kept.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def current_rss():
+    """
+    The memory (resident set size, in bytes) this process is using right
+    now, None where /proc doesn't exist (macOS, Windows).
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+#############
+## SUMMARY ##
+#############
+
+class Recorder:
+    """
+    A sink that keeps every event, for summarizing afterwards.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.lock = threading.Lock()
+
+    def __call__(self, event):
+        with self.lock:
+            self.events.append(event)
+
+    def spans(self):
+        """
+        Total, mean and max milliseconds and number of spans per stage. Spans
+        from parallel fetch threads overlap, so their total can be more
+        than the wall time they took.
+        """
+        spans = pd.DataFrame([e for e in self.events if e['event'] == 'span'],
+                             columns=['stage', 'ms'])
+        if spans.empty:
+            return pd.DataFrame(columns=['count', 'total_ms', 'mean_ms', 'max_ms'])
+        table = spans.groupby('stage')['ms'].agg(['count', 'sum', 'mean', 'max'])
+        table.columns = ['count', 'total_ms', 'mean_ms', 'max_ms']
+        order = [stage for stage in STAGES if stage in table.index]
+        return table.loc[order + sorted(set(table.index) - set(order))]
+
+    def counters(self):
+        totals = dict.fromkeys(COUNTERS, 0)
+        for event in self.events:
+            if event['event'] == 'count':
+                totals[event['name']] = totals.get(event['name'], 0) + event['value']
+        return totals
+
+    def summary(self):
+        """
+        The span table and counters as one report string.
+        """
+        counters = ', '.join(f'{name}: {value}' for name, value in self.counters().items())
+        return f'{self.spans().round(1).to_string()}\n{counters}'
+
+@contextmanager
+def recording():
+    """
+    Collects every event inside the block: with recording() as recorder: ...
+    """
+    recorder = add_sink(Recorder())
+    try:
+        yield recorder
+    finally:
+        remove_sink(recorder)
+
+if os.getenv('FEDCHALLENGE_TIMINGS'):
+    add_sink(JsonLinesSink(os.getenv('FEDCHALLENGE_TIMINGS')))
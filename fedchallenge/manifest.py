@@ -0,0 +1,170 @@
+"""
+This file is used to only rebuild the graphs that actually changed. Every
+chart gets a key made from a hash of its spec (the create_line_graph
+arguments), the export settings, and the last_updated stamp of every series
+it uses. The keys and the files they produced are recorded in a manifest
+next to the images, looking something like this:
+
+{"fig1_1": {"key": "3f9a...", "spec": "b01c...",
+            "data": {"GDPC1": "2024-09-26 07:56:02-05", "GDPPOT": "..."},
+            "files": ["charts/gdp_vs_potential_gdp_2006-2010.png"]}}
+
+rebuild('charts') then skips fetching, building and exporting every chart
+whose key hasn't changed and whose files are still there, and reports what
+it rebuilt and why.
+"""
+
+# Libraries
+import os
+import json
+import hashlib
+from fedchallenge import cache, fred_client, expressions
+from fedchallenge.catalog import select_specs, chart_kwargs, build_charts
+from fedchallenge.export import (export_figures, DEFAULT_WIDTH, DEFAULT_HEIGHT,
+                                 DEFAULT_SCALE)
+
+##############
+### SET-UP ###
+##############
+
+MANIFEST_FILE = 'manifest.json'
+
+######################
+## HELPER FUNCTIONS ##
+######################
+
+def _hash(value):
+    text = json.dumps(value, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def spec_hash(spec):
+    """
+    Hash of a spec's create_line_graph arguments.
+    """
+    return _hash(chart_kwargs(spec))
+
+def series_last_updated(series_id, ttl = None):
+    """
+    The last_updated stamp of a series. A cached copy inside its TTL is
+    trusted, otherwise we ask FRED (one info request, shared with the build).
+    """
+    entry = cache.load_entry(series_id)
+    if entry is not None and cache.is_fresh(entry['fetched_at'], ttl):
+        return entry['info'].get('last_updated')
+
+    info = fred_client.get_series_info(series_id, refresh = True)
+    if entry is not None and entry['info'].get('last_updated') == info.get('last_updated'):
+        # confirmed unchanged, so the build doesn't need to ask again
+        cache.touch_series(series_id, info = info)
+    return info.get('last_updated')
+
+def chart_key(spec, render_settings, ttl = None, known = None):
+    """
+    Returns (key, spec hash, {series_id: last_updated}) for a chart. known is
+    a dict of stamps already looked up in this run, so series shared between
+    charts are only checked once. Expressions are stamped by the series in
+    them.
+    """
+    known = {} if known is None else known
+    spec_digest = spec_hash(spec)
+    stamps = {}
+    for series_id in expressions.series_ids(spec['datalist']):
+        if series_id not in known:
+            known[series_id] = series_last_updated(series_id, ttl)
+        stamps[series_id] = known[series_id]
+    return _hash([spec_digest, render_settings, stamps]), spec_digest, stamps
+
+def load_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+def _moved(record, stamps):
+    # series whose stamp changed since the chart was last drawn
+    if record is None:
+        return []
+    return sorted(series_id for series_id, stamp in stamps.items()
+                  if record['data'].get(series_id) != stamp)
+
+def _rebuild_reason(record, key, spec_digest, stamps, render_settings):
+    if record is None:
+        return 'new chart'
+    if record['key'] == key:
+        missing = [path for path in record['files'] if not os.path.exists(path)]
+        return 'output missing' if missing else None
+    if record['spec'] != spec_digest:
+        return 'spec changed'
+    if record.get('render') != render_settings:
+        return 'export settings changed'
+    moved = _moved(record, stamps)
+    if moved:
+        return 'data updated: ' + ', '.join(moved)
+    return 'key changed'
+
+#############
+## REBUILD ##
+#############
+
+def rebuild(out_dir, names = None, tags = None, formats = ('png',),
+            width = DEFAULT_WIDTH, height = DEFAULT_HEIGHT, scale = DEFAULT_SCALE,
+            max_workers = None, ttl = None, force = False):
+    """
+    Exports the catalog charts matching names/tags to out_dir, skipping every
+    chart whose key is unchanged since the last run. force = True rebuilds
+    everything. Returns a report dict:
+
+    rebuilt   [(name, reason), ...] for every chart that was rebuilt
+    skipped   names of the charts that were up to date
+    """
+    if isinstance(formats, str):
+        formats = (formats,)
+    render_settings = {'formats': list(formats), 'width': width,
+                       'height': height, 'scale': scale}
+
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = load_manifest(out_dir)
+
+    stale = []
+    moved = set()
+    known = {}
+    report = {'rebuilt': [], 'skipped': []}
+    for spec in select_specs(names, tags):
+        key, spec_digest, stamps = chart_key(spec, render_settings, ttl, known)
+        reason = 'forced' if force else _rebuild_reason(manifest.get(spec['name']), key,
+                                                        spec_digest, stamps, render_settings)
+        if reason is None:
+            report['skipped'].append(spec['name'])
+        else:
+            stale.append((spec, key, spec_digest, stamps))
+            report['rebuilt'].append((spec['name'], reason))
+            moved.update(_moved(manifest.get(spec['name']), stamps))
+
+    if not stale:
+        return report
+
+    # series that moved since their charts were drawn are checked with FRED
+    # again, so the rebuild draws the new data rather than the cached copy
+    if moved:
+        cache.expire_series(moved)
+
+    # only the stale charts get fetched, built and exported
+    figures_list, chart_titles = build_charts(names = [spec['name'] for spec, *_ in stale])
+    paths = export_figures(figures_list, chart_titles, out_dir, formats, width, height,
+                           scale, max_workers)
+
+    for i, (spec, key, spec_digest, stamps) in enumerate(stale):
+        manifest[spec['name']] = {'key': key,
+                                  'spec': spec_digest,
+                                  'render': render_settings,
+                                  'data': stamps,
+                                  'files': paths[i * len(formats):(i + 1) * len(formats)]}
+    save_manifest(out_dir, manifest)
+    return report
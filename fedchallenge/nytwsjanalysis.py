@@ -1,12 +1,329 @@
 """
-This file is used to conduct frequency analysis of New York Times and Wall 
+This file is used to conduct frequency analysis of New York Times and Wall
 Street Journal articles. The input will look something like this:
 
+archives/nyt_2008.jsonl.gz    one article per line, e.g.
+                              {"pub_date": "2008-12-16T05:00:00+0000",
+                               "headline": {"main": "Fed Cuts Key Rate to a Record Low"},
+                               "abstract": "...", "lead_paragraph": "..."}
+archives/wsj_2008.csv         one article per row, with a date column and
+                              text columns (headline, body, ...)
+
+counter = count_terms(['archives/nyt_2008.jsonl.gz', 'archives/wsj_2008.csv'],
+                      terms = ['inflation', 'recession', 'rate cut'], by = 'M')
+
 The output will look something like this:
 
+counter.mentions()            times each term appears, per month
+            inflation  recession  rate cut
+date
+2008-11-01        212        540        31
+2008-12-01        187        611        58
+
+counter.articles() is the number of articles mentioning each term instead,
+and counter.totals() the number of articles per period. Files can be JSON
+lines (.jsonl), CSV (.csv) or the NYT Archive API's monthly JSON (.json),
+any of them gzipped (.gz), or directories of them.
 
+Everything is a generator pipeline (files -> records -> (date, text) ->
+matches), so only one article is in memory at a time. Counts are kept per
+period for the given terms only, so memory depends on the number of
+periods and terms, not on how many articles are read. Terms and phrases
+are matched with one precompiled, case-insensitive pattern.
 """
 
 # TODO: Get all of Gabriel's code imported
 # TODO: Integrate it with Paa and Rowan's code and get everything functional
-# TODO: Decide on and implement output/input functions
\ No newline at end of file
+
+# Libraries
+import os
+import re
+import csv
+import sys
+import gzip
+import json
+import argparse
+import numpy as np
+import pandas as pd
+
+##############
+### SET-UP ###
+##############
+
+# terms counted when none are given
+DEFAULT_TERMS = ('inflation', 'deflation', 'recession', 'unemployment', 'layoffs',
+                 'interest rates', 'federal reserve', 'rate hike', 'rate cut',
+                 'soft landing', 'stagflation', 'housing market', 'stock market')
+
+# where the date and text of an article are, in the order they're tried
+DATE_FIELDS = ('pub_date', 'date', 'published', 'publication_date')
+TEXT_FIELDS = ('headline', 'abstract', 'lead_paragraph', 'snippet', 'text', 'body', 'article')
+
+# periods counts are kept by: day, month or year
+PERIODS = ('D', 'M', 'A')
+
+# how much of a .json file is read at a time
+JSON_CHUNK = 1 << 16
+
+_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}')
+_SPACE = re.compile(r'\s+')
+
+# article bodies are far longer than csv's default field limit
+csv.field_size_limit(min(sys.maxsize, 2 ** 31 - 1))
+
+######################
+## HELPER FUNCTIONS ##
+######################
+
+def _open(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+def _format(path):
+    name = path[:-len('.gz')] if path.endswith('.gz') else path
+    return os.path.splitext(name)[1].lower()
+
+def _text(value):
+    # NYT headlines are dicts like {'main': ..., 'print_headline': ...}
+    if isinstance(value, dict):
+        value = value.get('main') or value.get('print_headline')
+    return value if isinstance(value, str) else None
+
+def _period(date, by):
+    if by == 'M':
+        return date[:7] + '-01'
+    if by == 'A':
+        return date[:4] + '-01-01'
+    return date
+
+def _clean(term):
+    return _SPACE.sub(' ', term.strip().lower())
+
+def compile_terms(terms):
+    """
+    One case-insensitive pattern matching any of terms as whole words, with
+    phrases matching across any whitespace. Longer terms are tried first, so
+    'interest rates' wins over 'interest' where both are counted. With no
+    (non-blank) terms the pattern never matches.
+    """
+    words = sorted({_clean(term) for term in terms} - {''}, key=len, reverse=True)
+    if not words:
+        return re.compile(r'(?!)')
+    alternatives = [r'\s+'.join(re.escape(word) for word in term.split(' ')) for term in words]
+    return re.compile(r'\b(?:%s)\b' % '|'.join(alternatives), re.IGNORECASE)
+
+def _json_docs(f):
+    # the articles in an Archive API file ({"response": {"docs": [...]}}) or
+    # a JSON list, decoded one at a time rather than loading the whole file
+    decoder = json.JSONDecoder()
+    buffer, position = '', 0
+
+    def more():
+        nonlocal buffer, position
+        chunk = f.read(JSON_CHUNK)
+        buffer, position = buffer[position:] + chunk, 0
+        return bool(chunk)
+
+    # find the list of articles: [container, key] of everything we're inside
+    stack = []
+    expect_key = False
+    while True:
+        if position >= len(buffer) and not more():
+            return
+        char = buffer[position]
+        if char == '"':
+            try:
+                text, end = json.decoder.scanstring(buffer, position + 1)
+            except json.JSONDecodeError:
+                if not more():
+                    raise
+                continue
+            if expect_key:
+                stack[-1][1] = text
+            position = end
+            continue
+        if char == '[' and (not stack or [key for _, key in stack] == ['response', 'docs']):
+            position += 1
+            break
+        if char in '{[':
+            stack.append([char, None])
+            expect_key = char == '{'
+        elif char in '}]':
+            stack.pop()
+        elif char == ',':
+            expect_key = stack[-1][0] == '{'
+        elif char == ':':
+            expect_key = False
+        position += 1
+
+    # then the articles themselves
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if position >= len(buffer):
+            if not more():
+                return
+            continue
+        if buffer[position] == ']':
+            return
+        try:
+            doc, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if not more():
+                raise
+            continue
+        yield doc
+        position = end
+
+##############
+## PIPELINE ##
+##############
+
+def iter_files(paths):
+    """
+    Every article file in paths (files or directories, searched
+    recursively), in sorted order.
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if _format(name) in ('.jsonl', '.csv', '.json'):
+                    yield os.path.join(root, name)
+
+def read_records(path):
+    """
+    The articles in one file as dicts, one at a time.
+    """
+    extension = _format(path)
+    with _open(path) as f:
+        if extension == '.csv':
+            yield from csv.DictReader(f)
+        elif extension == '.json':
+            # the Archive API's monthly files are one document per month
+            yield from _json_docs(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+def iter_articles(records, date_fields = DATE_FIELDS, text_fields = TEXT_FIELDS):
+    """
+    (date, text) for every record with a date, date as 'YYYY-MM-DD' and text
+    as the article's text fields joined together.
+    """
+    for record in records:
+        date = next((record[field] for field in date_fields if record.get(field)), None)
+        if not isinstance(date, str) or not _DATE.match(date):
+            continue
+        text = ' '.join(t for t in (_text(record.get(field)) for field in text_fields) if t)
+        yield date[:10], text
+
+##############
+## COUNTING ##
+##############
+
+class TermCounter:
+    """
+    Counts terms (words or phrases) in articles, per period ('D' for day,
+    'M' for month, 'A' for year). add articles one by one or update with
+    any iterable of (date, text).
+    """
+
+    def __init__(self, terms = DEFAULT_TERMS, by = 'D'):
+        if by not in PERIODS:
+            raise ValueError("Unknown period '%s', expected one of %s" % (by, ', '.join(PERIODS)))
+        self.terms = list(dict.fromkeys(term for term in map(_clean, terms) if term))
+        self.by = by
+        self.pattern = compile_terms(self.terms)
+        self._index = {term: i for i, term in enumerate(self.terms)}
+        # matches as they appear in the text ('Rate  Cut') -> term index,
+        # there are only ever a few spellings of each term
+        self._spellings = {}
+        self._mentions = {}
+        self._articles = {}
+        self._totals = {}
+
+    def add(self, date, text):
+        period = _period(date, self.by)
+        if period not in self._mentions:
+            self._mentions[period] = np.zeros(len(self.terms), dtype='int64')
+            self._articles[period] = np.zeros(len(self.terms), dtype='int64')
+            self._totals[period] = 0
+        self._totals[period] += 1
+
+        found = []
+        for match in self.pattern.findall(text):
+            index = self._spellings.get(match)
+            if index is None:
+                index = self._spellings[match] = self._index[_clean(match)]
+            found.append(index)
+        if found:
+            found = np.bincount(found, minlength=len(self.terms))
+            self._mentions[period] += found
+            self._articles[period] += found > 0
+
+    def update(self, articles):
+        for date, text in articles:
+            self.add(date, text)
+        return self
+
+    def _frame(self, counts):
+        periods = sorted(counts)
+        values = np.array([counts[p] for p in periods]).reshape(len(periods), len(self.terms))
+        return pd.DataFrame(values, columns=self.terms,
+                            index=pd.DatetimeIndex(pd.to_datetime(periods), name='date'))
+
+    def mentions(self):
+        """
+        Times each term appears, one row per period.
+        """
+        return self._frame(self._mentions)
+
+    def articles(self):
+        """
+        Number of articles each term appears in, one row per period.
+        """
+        return self._frame(self._articles)
+
+    def totals(self):
+        """
+        Number of articles read, per period.
+        """
+        periods = sorted(self._totals)
+        return pd.Series([self._totals[p] for p in periods], name='articles', dtype='int64',
+                         index=pd.DatetimeIndex(pd.to_datetime(periods), name='date'))
+
+def count_terms(paths, terms = DEFAULT_TERMS, by = 'D', date_fields = DATE_FIELDS,
+                text_fields = TEXT_FIELDS):
+    """
+    Streams every article in paths through a TermCounter and returns it.
+    """
+    counter = TermCounter(terms, by)
+    for path in iter_files(paths):
+        counter.update(iter_articles(read_records(path), date_fields, text_fields))
+    return counter
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Count terms in NYT/WSJ article archives.')
+    parser.add_argument('paths', nargs='+', help='article files or directories')
+    parser.add_argument('--terms', nargs='+', default=list(DEFAULT_TERMS))
+    parser.add_argument('--by', choices=PERIODS, default='M')
+    parser.add_argument('--articles', action='store_true',
+                        help='count articles mentioning each term instead of mentions')
+    parser.add_argument('--out', default=None, help='CSV file to write (default: print)')
+    args = parser.parse_args()
+
+    counter = count_terms(args.paths, args.terms, args.by)
+    table = counter.articles() if args.articles else counter.mentions()
+    table['articles'] = counter.totals()
+    if args.out:
+        table.to_csv(args.out)
+    else:
+        print(table.to_string())
@@ -0,0 +1,307 @@
+"""
+This file is used to run everything without FRED: no network and no API
+key. OfflineFred is a stand-in for fredapi's Fred with the same
+get_series/get_series_info/get_series_updates interface, serving series
+from a directory of recordings:
+
+recordings/GDPC1.csv            date,value rows, exactly what get_series returned
+recordings/GDPC1.json           the series info, exactly what get_series_info returned
+recordings/GDPC1.releases.csv   date,realtime_start,value rows from
+                                get_series_all_releases (optional)
+
+record_series(['GDPC1', 'GDPPOT'], 'recordings') makes the recordings
+(this one does need FRED). Series that haven't been recorded are made up
+instead: a seeded random walk at the series' real frequency, so the same
+series always gets the same numbers. To use it:
+
+install('recordings')        # every fred_api/get_datasets call now uses it
+
+client.update('GDPC1') makes a series look like it was just updated on FRED
+(a new last_updated stamp, also in get_series_updates), for trying out
+refreshes.
+"""
+
+# Libraries
+import os
+import json
+import time
+import zlib
+import threading
+from collections import Counter
+import numpy as np
+import pandas as pd
+from fedchallenge import fred_client, transforms, expressions
+
+##############
+### SET-UP ###
+##############
+
+# made-up series cover this range
+SYNTHETIC_START = '1990-01-01'
+SYNTHETIC_END = '2024-10-01'
+SYNTHETIC_LAST_UPDATED = '2024-10-01 08:00:00-05'
+
+# frequency_short -> pandas frequency for the made-up dates
+SYNTHETIC_DATES = {'D': 'B', 'W': 'W-FRI', 'BW': '2W-FRI', 'M': 'MS', 'Q': 'QS',
+                   'SA': '6MS', 'A': 'YS'}
+
+# what the made-up version of each catalog series looks like,
+# series_id: (frequency_short, title, units, starting level, step size)
+SYNTHETIC_SERIES = {
+    'GDPC1': ('Q', 'Real Gross Domestic Product', 'Billions of Chained 2017 Dollars', 10000, 80),
+    'GDPPOT': ('Q', 'Real Potential Gross Domestic Product', 'Billions of Chained 2017 Dollars', 10000, 60),
+    'MEDLISPRIUS': ('M', 'Housing Inventory: Median Listing Price in the United States', 'U.S. Dollars', 250000, 2500),
+    'MEDLISPRIPERSQUFEEUS': ('M', 'Housing Inventory: Median Listing Price per Square Feet in the United States', 'U.S. Dollars', 120, 1.5),
+    'MSPUS': ('Q', 'Median Sales Price of Houses Sold for the United States', 'Dollars', 150000, 4000),
+    'MORTGAGE30US': ('W', '30-Year Fixed Rate Mortgage Average in the United States', 'Percent', 7, 0.05),
+    'DPCCRV1Q225SBEA': ('Q', 'Personal consumption expenditures excluding food and energy (chain-type price index)', 'Percent Change from Preceding Period', 2, 0.5),
+    'FEDFUNDS': ('M', 'Federal Funds Effective Rate', 'Percent', 5, 0.2),
+    'IORB': ('D', 'Interest Rate on Reserve Balances', 'Percent', 2, 0.01),
+    'NFCI': ('W', 'Chicago Fed National Financial Conditions Index', 'Index', 0, 0.05),
+    'DJIA': ('D', 'Dow Jones Industrial Average', 'Index', 3000, 30),
+    'SP500': ('D', 'S&P 500', 'Index', 350, 4),
+    'T10Y2Y': ('D', '10-Year Treasury Constant Maturity Minus 2-Year Treasury Constant Maturity', 'Percent', 1, 0.03),
+    'UMCSENT': ('M', 'University of Michigan: Consumer Sentiment', 'Index 1966:Q1=100', 90, 2),
+    'VIXCLS': ('D', 'CBOE Volatility Index: VIX', 'Index', 20, 0.8),
+    'WLEMUINDXD': ('D', 'Equity Market-related Economic Uncertainty Index', 'Index', 50, 5),
+}
+
+# used for series that are neither recorded nor listed above
+SYNTHETIC_DEFAULT = ('M', None, 'Index', 100, 1)
+
+FREQUENCY_NAMES = {'D': 'Daily', 'W': 'Weekly', 'BW': 'Biweekly', 'M': 'Monthly',
+                   'Q': 'Quarterly', 'SA': 'Semiannual', 'A': 'Annual'}
+
+######################
+## HELPER FUNCTIONS ##
+######################
+
+def _synthetic_series(series_id):
+    frequency, _, _, level, step = SYNTHETIC_SERIES.get(series_id, SYNTHETIC_DEFAULT)
+    dates = pd.date_range(SYNTHETIC_START, SYNTHETIC_END, freq=SYNTHETIC_DATES[frequency])
+
+    # seeded by the series ID (not hash(), which changes every run)
+    rng = np.random.default_rng(zlib.crc32(series_id.encode('utf-8')))
+    values = level + np.cumsum(rng.normal(0, step, len(dates)))
+    if frequency == 'D':
+        # daily series have holidays missing, like FRED's '.'
+        values[rng.random(len(dates)) < 0.03] = np.nan
+    return pd.Series(values, index=dates)
+
+def _synthetic_releases(series_id):
+    # each observation is first published a period after its date, then
+    # revised twice, a period apart, ending at the made-up latest value
+    data = _synthetic_series(series_id)
+    frequency = SYNTHETIC_SERIES.get(series_id, SYNTHETIC_DEFAULT)[0]
+    lag = pd.Timedelta(days=transforms.PERIOD_DAYS[frequency])
+    rng = np.random.default_rng(zlib.crc32(series_id.encode('utf-8')) + 1)
+    noise = rng.normal(0, np.nanstd(np.diff(data.to_numpy())) or 1, (2, len(data)))
+    releases = [pd.DataFrame({'date': data.index, 'realtime_start': data.index + lag * (i + 1),
+                              'value': data.to_numpy() + (noise[i] if i < 2 else 0)})
+                for i in range(3)]
+    return pd.concat(releases).sort_values(['date', 'realtime_start'], ignore_index=True)
+
+def _utc(time):
+    time = pd.Timestamp(time)
+    return time.tz_localize('UTC') if time.tzinfo is None else time.tz_convert('UTC')
+
+def _synthetic_info(series_id):
+    frequency, title, units, _, _ = SYNTHETIC_SERIES.get(series_id, SYNTHETIC_DEFAULT)
+    return pd.Series({'id': series_id,
+                      'title': title or series_id,
+                      'observation_start': SYNTHETIC_START,
+                      'observation_end': SYNTHETIC_END,
+                      'frequency': FREQUENCY_NAMES[frequency],
+                      'frequency_short': frequency,
+                      'units': units,
+                      'units_short': units,
+                      'seasonal_adjustment_short': 'NSA',
+                      'last_updated': SYNTHETIC_LAST_UPDATED})
+
+##############
+## STAND-IN ##
+##############
+
+class OfflineFred:
+    """
+    Drop-in replacement for fredapi.Fred that never touches the network.
+    Series come from recordings_dir if they were recorded there, otherwise
+    they're made up (or a ValueError is raised with synthetic = False, like
+    Fred does for an unknown series). latency adds a fixed delay in seconds
+    to every request, to mimic a round trip to FRED. calls counts the
+    requests made, by method.
+    """
+
+    # nothing to protect, so fred_client.call skips its rate limiter
+    rate_limited = False
+
+    def __init__(self, recordings_dir = None, synthetic = True, latency = 0.0):
+        self.recordings_dir = recordings_dir
+        self.synthetic = synthetic
+        self.latency = latency
+        self.calls = Counter()
+        self.updated = {}
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    def _path(self, series_id, extension):
+        if self.recordings_dir is None:
+            return None
+        path = os.path.join(self.recordings_dir, f'{series_id}.{extension}')
+        return path if os.path.exists(path) else None
+
+    def _request(self, method):
+        with self._lock:
+            self.calls[method] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _level(self, series_id):
+        with self._lock:
+            if series_id in self._loaded:
+                return self._loaded[series_id]
+
+        path = self._path(series_id, 'csv')
+        if path is not None:
+            data = pd.read_csv(path, index_col=0, parse_dates=True).iloc[:, 0]
+            data.index.name = None
+            data.name = None
+        elif self.synthetic:
+            data = _synthetic_series(series_id)
+        else:
+            raise ValueError('Bad Request.  The series does not exist.')
+
+        with self._lock:
+            self._loaded[series_id] = data
+        return data
+
+    def get_series(self, series_id, observation_start = None, observation_end = None,
+                   units = 'lin', **kwargs):
+        self._request('get_series')
+        data = self._level(series_id)
+        if observation_start is not None:
+            data = data[data.index >= pd.Timestamp(observation_start)]
+        if observation_end is not None:
+            data = data[data.index <= pd.Timestamp(observation_end)]
+        return transforms.transform_units(data.copy(), units, self.get_series_info(series_id, count = False))
+
+    def get_series_all_releases(self, series_id, realtime_start = None, realtime_end = None):
+        self._request('get_series_all_releases')
+        path = self._path(series_id, 'releases.csv')
+        if path is not None:
+            releases = pd.read_csv(path, parse_dates=['date', 'realtime_start'])
+        elif self.synthetic:
+            releases = _synthetic_releases(series_id)
+        else:
+            raise ValueError('Bad Request.  The series does not exist.')
+
+        # like ALFRED: rows still in effect at realtime_start are included,
+        # with their realtime_start moved up to it
+        if realtime_start is not None:
+            realtime_start = pd.Timestamp(realtime_start)
+            ends = releases.groupby('date')['realtime_start'].shift(-1)
+            releases = releases[ends.isna() | (ends > realtime_start)].copy()
+            releases['realtime_start'] = releases['realtime_start'].clip(lower=realtime_start)
+        if realtime_end is not None:
+            releases = releases[releases['realtime_start'] <= pd.Timestamp(realtime_end)]
+        return releases.reset_index(drop=True)
+
+    def get_series_info(self, series_id, count = True):
+        if count:
+            self._request('get_series_info')
+        path = self._path(series_id, 'json')
+        if path is not None:
+            with open(path) as f:
+                info = pd.Series(json.load(f))
+        elif self.synthetic:
+            info = _synthetic_info(series_id)
+        else:
+            raise ValueError('Bad Request.  The series does not exist.')
+        if series_id in self.updated:
+            info['last_updated'] = self.updated[series_id]
+        return info
+
+    def update(self, series_id, last_updated = None):
+        """
+        Marks a series as updated on FRED at last_updated (now by default).
+        """
+        if last_updated is None:
+            last_updated = pd.Timestamp.now(fred_client.FRED_TIMEZONE).strftime('%Y-%m-%d %H:%M:%S%z')[:-2]
+        self.updated[series_id] = last_updated
+
+    def _known_series(self):
+        known = set(self.updated)
+        if self.synthetic:
+            known.update(SYNTHETIC_SERIES)
+        if self.recordings_dir is not None and os.path.isdir(self.recordings_dir):
+            known.update(name[:-len('.json')] for name in os.listdir(self.recordings_dir)
+                         if name.endswith('.json'))
+        return known
+
+    def get_series_updates(self, start_time = None, end_time = None, offset = 0,
+                           limit = fred_client.UPDATES_PAGE):
+        self._request('get_series_updates')
+        infos = [self.get_series_info(series_id, count = False) for series_id in self._known_series()]
+        updates = pd.DataFrame([{column: info.get(column) for column in fred_client.UPDATES_COLUMNS}
+                                for info in infos], columns=fred_client.UPDATES_COLUMNS)
+        stamps = pd.to_datetime(updates['last_updated'], utc=True)
+
+        # like FRED: only the last two weeks, latest first
+        lo = pd.Timestamp.now('UTC') - fred_client.UPDATES_WINDOW
+        if start_time is not None:
+            lo = max(lo, _utc(start_time))
+        keep = stamps >= lo
+        if end_time is not None:
+            keep &= stamps <= _utc(end_time)
+        updates = updates[keep].iloc[np.argsort(-stamps[keep].astype('int64').to_numpy(), kind='stable')]
+        return updates.iloc[offset:offset + limit].reset_index(drop=True), len(updates)
+
+def install(recordings_dir = None, synthetic = True, latency = 0.0):
+    """
+    Makes an OfflineFred the client every FRED request goes through (see
+    fred_client.set_client) and returns it. Info already memoized from FRED
+    is dropped so it's served by the stand-in too.
+    """
+    client = OfflineFred(recordings_dir, synthetic, latency)
+    fred_client.set_client(client)
+    fred_client.forget_info()
+    return client
+
+###############
+## RECORDING ##
+###############
+
+def record_series(series_ids, out_dir, releases = False):
+    """
+    Downloads the full history and info of every series from FRED (through
+    the shared client) and saves them to out_dir for OfflineFred, plus every
+    release from ALFRED with releases = True. Returns the paths written.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for series_id in dict.fromkeys(series_ids):
+        data = fred_client.call('get_series', series_id)
+        info = fred_client.call('get_series_info', series_id)
+
+        csv_path = os.path.join(out_dir, f'{series_id}.csv')
+        data.rename('value').to_csv(csv_path, index_label='date')
+        json_path = os.path.join(out_dir, f'{series_id}.json')
+        with open(json_path, 'w') as f:
+            json.dump({k: str(v) for k, v in dict(info).items()}, f, indent=2)
+        paths += [csv_path, json_path]
+
+        if releases:
+            releases_path = os.path.join(out_dir, f'{series_id}.releases.csv')
+            fred_client.call('get_series_all_releases', series_id).to_csv(releases_path, index=False)
+            paths.append(releases_path)
+    return paths
+
+def record_catalog(out_dir, names = None, tags = None):
+    """
+    Records every series the catalog charts matching names/tags use,
+    including the ones inside expressions.
+    """
+    from fedchallenge.catalog import select_specs
+    series_ids = expressions.series_ids([entry for spec in select_specs(names, tags)
+                                         for entry in spec['datalist']])
+    return record_series(series_ids, out_dir)
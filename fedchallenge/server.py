@@ -0,0 +1,377 @@
+"""
+This file is used to serve charts over HTTP on your own machine, so tweaking
+a title or an axis range doesn't mean re-downloading and rebuilding
+everything:
+
+python -m fedchallenge.server --port 8050
+
+POST /chart           body is the create_line_graph arguments as JSON, e.g.
+                      {"datalist": ["GDPC1", "GDPPOT"], "start_date": "2006-01-01",
+                       "chart_title": "GDP", "format": "png"}
+                      or a catalog chart plus overrides:
+                      {"name": "fig1_1", "y_axis_range": [15000, 21000]}
+GET  /chart/fig1_1.svg
+                      a catalog chart as is
+GET  /stats           what's cached
+
+format is 'png', 'svg' or 'json' (the figure as plotly JSON), and width,
+height and scale set the image size. Built figures, rendered images and
+the series data behind them share one LRU cache, bounded by memory size
+(MAX_BYTES). Series stay in memory, so only the first chart that uses a
+series reads it from the cache or FRED. Once they're older than the TTL
+they're loaded again, and if they changed the figures and images drawn
+from them are built again too. If several requests for the same chart (or
+series) arrive while it's still being built, they all wait for that one
+build.
+"""
+
+# Libraries
+import json
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pandas as pd
+from fedchallenge import cache, instrument, expressions, transforms, FETCH_WORKERS, _cached_info
+from fedchallenge.store import SeriesStore
+from fedchallenge.export import render, DEFAULT_WIDTH, DEFAULT_HEIGHT, DEFAULT_SCALE
+
+##############
+### SET-UP ###
+##############
+
+HOST = '127.0.0.1'
+PORT = 8050
+
+# memory budget for figures, images and series together
+MAX_BYTES = 256 * 1024 * 1024
+
+FORMATS = {'png': 'image/png', 'svg': 'image/svg+xml', 'json': 'application/json'}
+
+# request fields that are about the output rather than the chart
+OUTPUT_KEYS = ('format', 'width', 'height', 'scale')
+
+###############
+## LRU CACHE ##
+###############
+
+class ByteLRU:
+    """
+    A thread-safe LRU cache that evicts the least recently used entries once
+    the sizes of everything in it add up to more than max_bytes.
+    """
+
+    def __init__(self, max_bytes = MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+
+    def put(self, key, value, size):
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            kinds = {}
+            for key, (_, size) in self._entries.items():
+                kind = kinds.setdefault(key[0], {'entries': 0, 'bytes': 0})
+                kind['entries'] += 1
+                kind['bytes'] += size
+            return {'bytes': self.bytes, 'max_bytes': self.max_bytes, 'hits': self.hits,
+                    'misses': self.misses, 'evictions': self.evictions, 'kinds': kinds}
+
+class SingleFlight:
+    """
+    Runs one call per key at a time: callers asking for a key that's already
+    being worked on wait for that call and share its result (or error).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def run(self, key, function):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {'done': threading.Event()}
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call['done'].wait()
+            if 'error' in call:
+                raise call['error']
+            return call['result']
+
+        try:
+            call['result'] = function()
+            return call['result']
+        except Exception as exc:
+            call['error'] = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['done'].set()
+
+#############
+## SERVICE ##
+#############
+
+def _key(value):
+    text = json.dumps(value, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+class ChartService:
+    """
+    Builds and renders charts for the server, caching everything in one
+    ByteLRU. ttl is how long series data is kept before it's checked with
+    the on-disk cache (and FRED) again, cache.CACHE_TTL by default.
+    """
+
+    def __init__(self, max_bytes = MAX_BYTES, ttl = None):
+        self.lru = ByteLRU(max_bytes)
+        self.flights = SingleFlight()
+        self.ttl = cache.CACHE_TTL if ttl is None else ttl
+        self._render_lock = threading.Lock()
+
+    def chart_kwargs(self, request):
+        """
+        The create_line_graph arguments for a request, starting from the
+        catalog spec when the request names one.
+        """
+        from fedchallenge.catalog import get_spec, chart_kwargs
+        kwargs = {k: v for k, v in request.items() if k not in OUTPUT_KEYS}
+        name = kwargs.pop('name', None)
+        if name is not None:
+            kwargs = dict(chart_kwargs(get_spec(name)), **kwargs)
+        if 'datalist' not in kwargs:
+            raise ValueError('A chart needs a datalist (or the name of a catalog chart)')
+        return kwargs
+
+    def _load(self, series_id, start, end, now):
+        """
+        The in-memory entry for a series over at least start through end,
+        loading it if it's missing, too short or past the TTL. Requests that
+        need the same load at the same time wait for one load.
+        """
+        from fedchallenge import _fetch_arrays
+        entry = self.lru.get(('series', series_id))
+        if entry is not None:
+            covers_start = entry['start'] is None or (start is not None and entry['start'] <= start)
+            covers_end = entry['end'] is None or (end is not None and entry['end'] >= end)
+            if covers_start and covers_end and (now - entry['loaded']).total_seconds() < self.ttl:
+                return entry
+
+            # widen to whatever we already had, so a series isn't loaded
+            # over and over for charts with different windows
+            start = None if start is None or entry['start'] is None else min(start, entry['start'])
+            end = None if end is None or entry['end'] is None else max(end, entry['end'])
+
+        def load():
+            (data, info), = _fetch_arrays([series_id], 'lin', start, end, ttl = self.ttl)
+            entry = {'data': data, 'info': info, 'start': start, 'end': end,
+                     'loaded': pd.Timestamp.now()}
+            self.lru.put(('series', series_id), entry, data.nbytes)
+            return entry
+        return self.flights.run(('series', series_id, str(start), str(end)), load)
+
+    def series(self, kwargs):
+        """
+        Returns (store, version): a SeriesStore with every series the chart
+        needs, over at least the dates it needs (with the history transformed
+        units need before the start, like catalog.plan_build), from memory
+        where we have them, and a version made of each series' last_updated
+        stamp and window, so it only changes when the data does.
+        """
+        from fedchallenge.catalog import _spec_window
+        start, end, units = _spec_window(kwargs)
+        now = pd.Timestamp.now()
+
+        windows = {}
+        for series_id in expressions.series_ids(kwargs['datalist']):
+            series_start = start
+            if start is not None and units != 'lin':
+                series_start = start - transforms.lookback(units, _cached_info(series_id))
+            windows[series_id] = series_start
+
+        # series are loaded side by side, like _fetch_arrays does
+        with ThreadPoolExecutor(max_workers=max(1, min(FETCH_WORKERS, len(windows)))) as pool:
+            futures = {series_id: pool.submit(self._load, series_id, series_start, end, now)
+                       for series_id, series_start in windows.items()}
+            entries = {series_id: future.result() for series_id, future in futures.items()}
+
+        store = SeriesStore()
+        for series_id, entry in entries.items():
+            store.add(series_id, entry['data'], entry['info'], entry['start'], entry['end'])
+        version = sorted((series_id, str(entry['info'].get('last_updated')),
+                          str(entry['start']), str(entry['end']))
+                         for series_id, entry in entries.items())
+        return store, version
+
+    def figure(self, kwargs):
+        """
+        The chart as plotly JSON (bytes), built at most once per spec and
+        version of its series, so a figure is only built again once its
+        series have been updated.
+        """
+        from fedchallenge import create_line_graph
+        store, version = self.series(kwargs)
+        key = ('figure', _key([kwargs, version]))
+        figure = self.lru.get(key)
+        if figure is not None:
+            return figure
+
+        def build():
+            fig = create_line_graph(**kwargs, preloaded = store)
+            figure = fig.to_json().encode('utf-8')
+            self.lru.put(key, figure, len(figure))
+            return figure
+        return self.flights.run(key, build)
+
+    def chart(self, request):
+        """
+        Returns (content type, body) for a chart request.
+        """
+        format = request.get('format', 'png')
+        if format not in FORMATS:
+            raise ValueError("Unknown format '%s', expected one of %s"
+                             % (format, ', '.join(FORMATS)))
+        kwargs = self.chart_kwargs(request)
+
+        with instrument.span('serve', format=format):
+            figure = self.figure(kwargs)
+            if format == 'json':
+                return FORMATS[format], figure
+
+            size = (int(request.get('width', DEFAULT_WIDTH)), int(request.get('height', DEFAULT_HEIGHT)),
+                    float(request.get('scale', DEFAULT_SCALE)))
+            # keyed by the figure itself, so a rebuilt figure is drawn again
+            key = ('image', _key([hashlib.sha256(figure).hexdigest(), format, size]))
+            image = self.lru.get(key)
+            if image is None:
+                def draw():
+                    # one kaleido renderer per process, so one image at a time
+                    with self._render_lock:
+                        image = render(json.loads(figure), format, *size)
+                    self.lru.put(key, image, len(image))
+                    return image
+                image = self.flights.run(key, draw)
+            return FORMATS[format], image
+
+    def stats(self):
+        return dict(self.lru.stats(), coalesced=self.flights.coalesced)
+
+############
+## SERVER ##
+############
+
+class ChartHandler(BaseHTTPRequestHandler):
+    """
+    Turns HTTP requests into ChartService calls.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, value):
+        self._send(status, 'application/json', json.dumps(value, default=str).encode('utf-8'))
+
+    def _serve_chart(self, request):
+        try:
+            content_type, body = self.server.service.chart(request)
+        except (ValueError, KeyError, TypeError) as exc:
+            self._send_json(400, {'error': str(exc)})
+        except Exception as exc:
+            self._send_json(500, {'error': '%s: %s' % (type(exc).__name__, exc)})
+        else:
+            self._send(200, content_type, body)
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if path == '/stats':
+            self._send_json(200, self.server.service.stats())
+        elif path.startswith('/chart/') and '.' in path:
+            name, format = path[len('/chart/'):].rsplit('.', 1)
+            self._serve_chart({'name': name, 'format': format})
+        else:
+            self._send_json(404, {'error': 'Not found: %s' % path})
+
+    def do_POST(self):
+        if self.path.split('?')[0] != '/chart':
+            self._send_json(404, {'error': 'Not found: %s' % self.path})
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError as exc:
+            self._send_json(400, {'error': 'Bad JSON: %s' % exc})
+            return
+        if not isinstance(request, dict):
+            self._send_json(400, {'error': 'Expected a JSON object'})
+            return
+        self._serve_chart(request)
+
+def make_server(host = HOST, port = PORT, max_bytes = MAX_BYTES, ttl = None):
+    """
+    Returns the (not yet started) server, call serve_forever() on it.
+    """
+    server = ThreadingHTTPServer((host, port), ChartHandler)
+    server.daemon_threads = True
+    server.service = ChartService(max_bytes, ttl)
+    return server
+
+def serve(host = HOST, port = PORT, max_bytes = MAX_BYTES, ttl = None):
+    """
+    Serves charts until interrupted.
+    """
+    server = make_server(host, port, max_bytes, ttl)
+    print('Serving charts on http://%s:%d' % server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve fedchallenge charts over HTTP.')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--max-mb', type=float, default=MAX_BYTES / 1024 / 1024,
+                        help='memory budget for cached figures, images and series')
+    args = parser.parse_args()
+    serve(args.host, args.port, int(args.max_mb * 1024 * 1024))
@@ -0,0 +1,139 @@
+"""
+This file is used to write every series a set of charts uses into one
+point-in-time snapshot on disk, and to read it back without copying:
+
+write_snapshot('charts/data')                 # every series in the catalog
+figures_list, chart_titles = build_charts(snapshot = 'charts/data')
+
+A snapshot is a directory with two files:
+
+series.npy   one int64 array, memory-mapped when read. Each series is a
+             block of dates (datetime64[ns]) followed by a block of values
+             (float64), both stored as raw 8 byte words.
+index.json   {series_id: {offset, length, start, end, info}} plus when it
+             was written.
+
+Reading a snapshot maps series.npy instead of loading it, and every
+SeriesArray handed out is a view onto the mapping. Processes that open the
+same snapshot (e.g. export workers, see export_catalog) share the OS page
+cache rather than each unpickling or downloading their own copy. Since
+nothing is fetched from a snapshot, it's also a record of the exact data a
+set of charts was drawn from, and can be shipped next to them.
+"""
+
+# Libraries
+import os
+import json
+import time
+import numpy as np
+from fedchallenge import fred_client
+from fedchallenge.store import SeriesArray, SeriesStore
+
+##############
+### SET-UP ###
+##############
+
+SNAPSHOT_DATA = 'series.npy'
+SNAPSHOT_INDEX = 'index.json'
+
+# snapshots already opened in this process, {path: (index mtime, store)}
+_open_snapshots = {}
+
+###########
+## WRITE ##
+###########
+
+def save_snapshot(store, out_dir):
+    """
+    Writes a SeriesStore (or a dict of {series_id: (data, info)}) to out_dir
+    as a snapshot. Returns out_dir.
+    """
+    if not isinstance(store, SeriesStore):
+        series = store
+        store = SeriesStore()
+        for series_id, (data, info) in series.items():
+            store.add(series_id, data, info)
+
+    os.makedirs(out_dir, exist_ok=True)
+    blocks = []
+    index = {}
+    offset = 0
+    for series_id in store:
+        data, info = store[series_id]
+        start, end = store.window_of(series_id)
+        blocks += [data.dates.view('int64'), data.values.view('int64')]
+        index[series_id] = {'offset': offset,
+                            'length': len(data),
+                            'start': None if start is None else str(start),
+                            'end': None if end is None else str(end),
+                            'info': {k: str(v) for k, v in dict(info).items()}}
+        offset += 2 * len(data)
+
+    words = np.concatenate(blocks) if blocks else np.empty(0, dtype='int64')
+    data_path = os.path.join(out_dir, SNAPSHOT_DATA)
+    index_path = os.path.join(out_dir, SNAPSHOT_INDEX)
+
+    # write both under temporary names first so a reader never sees a data
+    # file that doesn't match its index
+    with open(data_path + '.tmp', 'wb') as f:
+        np.save(f, words)
+    with open(index_path + '.tmp', 'w') as f:
+        json.dump({'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                   'series': index}, f, indent=2)
+    os.replace(data_path + '.tmp', data_path)
+    os.replace(index_path + '.tmp', index_path)
+    return out_dir
+
+def write_snapshot(out_dir, names = None, tags = None):
+    """
+    Fetches every series the catalog charts matching names/tags need (all of
+    them if neither is given), over the dates they need, and writes them to
+    out_dir as a snapshot. Returns out_dir.
+    """
+    from fedchallenge.catalog import select_specs, plan_build, prefetch
+    return save_snapshot(prefetch(plan_build(select_specs(names, tags))), out_dir)
+
+##########
+## READ ##
+##########
+
+def load_snapshot(path):
+    """
+    Opens the snapshot in directory path and returns it as a SeriesStore of
+    read-only views onto the memory-mapped data, which can be passed
+    anywhere preloaded is accepted. Each process maps a snapshot once.
+    """
+    path = os.path.abspath(path)
+    index_path = os.path.join(path, SNAPSHOT_INDEX)
+    mtime = os.path.getmtime(index_path)
+    if path in _open_snapshots and _open_snapshots[path][0] == mtime:
+        return _open_snapshots[path][1]
+
+    with open(index_path) as f:
+        index = json.load(f)
+    words = np.load(os.path.join(path, SNAPSHOT_DATA), mmap_mode='r')
+
+    store = SeriesStore()
+    for series_id, entry in index['series'].items():
+        offset, length = entry['offset'], entry['length']
+        dates = words[offset:offset + length].view('datetime64[ns]')
+        values = words[offset + length:offset + 2 * length].view('float64')
+        store.add(series_id, SeriesArray(dates, values), entry['info'],
+                  entry.get('start'), entry.get('end'))
+        # so titles and units for the charts don't have to come from FRED
+        fred_client.remember_info(series_id, entry['info'])
+
+    _open_snapshots[path] = (mtime, store)
+    return store
+
+def snapshot_info(path):
+    """
+    When a snapshot was written and what's in it, without mapping the data:
+    {'created_at': ..., 'series': {series_id: {'length', 'last_updated'}}}
+    """
+    with open(os.path.join(path, SNAPSHOT_INDEX)) as f:
+        index = json.load(f)
+    return {'created_at': index['created_at'],
+            'series': {series_id: {'length': entry['length'],
+                                   'last_updated': entry['info'].get('last_updated')}
+                       for series_id, entry in index['series'].items()}}
@@ -0,0 +1,152 @@
+"""
+This file is used to hold series data in memory in a compact, columnar form.
+Each series is just two NumPy arrays:
+
+dates    datetime64[ns], sorted
+values   float64, NaN where FRED has no value
+
+Looking up a date range is two binary searches, and the result is a view
+onto the same arrays rather than a copy, so slicing out the chart window or
+an overlay period costs nothing no matter how long the series is.
+SeriesStore keeps one SeriesArray (and its info) per series ID, and is what
+a catalog build shares between all of its charts.
+"""
+
+# Libraries
+import numpy as np
+import pandas as pd
+
+###################
+## SERIES ARRAYS ##
+###################
+
+def _datetime64(date):
+    return pd.Timestamp(date).to_datetime64().astype('datetime64[ns]')
+
+class SeriesArray:
+    """
+    One series as a sorted datetime64[ns] array of dates and a float64 array
+    of values.
+    """
+
+    __slots__ = ('dates', 'values')
+
+    def __init__(self, dates, values):
+        self.dates = np.asarray(dates, dtype='datetime64[ns]')
+        self.values = np.asarray(values, dtype='float64')
+
+    @classmethod
+    def from_series(cls, data):
+        """
+        From a pandas Series indexed by date (what fredapi returns), without
+        copying when the dtypes already match.
+        """
+        return cls(pd.DatetimeIndex(data.index).values, data.to_numpy(dtype='float64'))
+
+    def __len__(self):
+        return len(self.dates)
+
+    def bounds(self, start = None, end = None):
+        """
+        (lo, hi) positions of the observations between start and end
+        (inclusive, None meaning unbounded).
+        """
+        lo = 0 if start is None else self.dates.searchsorted(_datetime64(start), side='left')
+        hi = len(self.dates) if end is None else self.dates.searchsorted(_datetime64(end), side='right')
+        return lo, hi
+
+    def window(self, start = None, end = None):
+        """
+        The observations between start and end as a view, not a copy.
+        """
+        lo, hi = self.bounds(start, end)
+        return SeriesArray(self.dates[lo:hi], self.values[lo:hi])
+
+    def first_date(self):
+        return pd.Timestamp(self.dates[0]) if len(self.dates) else None
+
+    def last_date(self):
+        return pd.Timestamp(self.dates[-1]) if len(self.dates) else None
+
+    @property
+    def nbytes(self):
+        return self.dates.nbytes + self.values.nbytes
+
+    def to_series(self, name = None):
+        return pd.Series(self.values, index=pd.DatetimeIndex(self.dates), name=name, copy=False)
+
+    def to_frame(self):
+        """
+        The ['index', 'values'] DataFrame get_datasets has always returned.
+        """
+        return pd.DataFrame({'index': self.dates, 'values': self.values},
+                            index=pd.DatetimeIndex(self.dates))
+
+##################
+## SERIES STORE ##
+##################
+
+class SeriesStore:
+    """
+    The level data and info of a set of series, keyed by series ID. Works
+    like a read-only dict of {series_id: (SeriesArray, info)}.
+    """
+
+    def __init__(self):
+        self._arrays = {}
+        self._info = {}
+        self._windows = {}
+
+    def add(self, series_id, data, info, start = None, end = None):
+        """
+        Stores a series. data can be a SeriesArray or a pandas Series. start
+        and end are the dates it was fetched for, None meaning all of it.
+        """
+        if not isinstance(data, SeriesArray):
+            data = SeriesArray.from_series(data)
+        self._arrays[series_id] = data
+        self._info[series_id] = info
+        self._windows[series_id] = (None if start is None else pd.Timestamp(start),
+                                    None if end is None else pd.Timestamp(end))
+
+    def covers(self, series_id, start = None, end = None):
+        """
+        Whether a series is stored over at least start through end.
+        """
+        if series_id not in self._arrays:
+            return False
+        stored_start, stored_end = self._windows[series_id]
+        covers_start = stored_start is None or (start is not None and stored_start <= pd.Timestamp(start))
+        covers_end = stored_end is None or (end is not None and stored_end >= pd.Timestamp(end))
+        return covers_start and covers_end
+
+    def window_of(self, series_id):
+        """
+        The (start, end) a series was fetched for.
+        """
+        return self._windows[series_id]
+
+    def __contains__(self, series_id):
+        return series_id in self._arrays
+
+    def __getitem__(self, series_id):
+        return self._arrays[series_id], self._info[series_id]
+
+    def __iter__(self):
+        return iter(self._arrays)
+
+    def __len__(self):
+        return len(self._arrays)
+
+    def get(self, series_id, default = None):
+        return self[series_id] if series_id in self else default
+
+    def info(self, series_id):
+        return self._info[series_id]
+
+    def window(self, series_id, start = None, end = None):
+        return self._arrays[series_id].window(start, end)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self._arrays.values())
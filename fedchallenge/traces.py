@@ -0,0 +1,228 @@
+"""
+This file is used to turn a series into a plotly line trace. It's where the
+optional downsampling happens: a 2006-2024 daily series has thousands of
+points, but a 1400 px wide chart can only show about one point per pixel
+column, so we keep just the points that matter for the shape of the line.
+
+minmax   keeps the lowest and highest point in each pixel-wide bucket, so
+         every spike survives. Fully vectorized.
+lttb     Largest-Triangle-Three-Buckets, keeps one point per bucket, the one
+         forming the biggest triangle with its neighbours. Looks the most
+         like the original line for a given number of points.
+
+Series that already fit in the target number of points are left alone.
+
+For interactive/HTML output there are two more knobs:
+
+render_mode      'svg' (default) always uses go.Scatter, 'webgl' always uses
+                 go.Scattergl, and 'auto' switches to go.Scattergl for
+                 traces with more than webgl_threshold points.
+compact_arrays   sends dates as milliseconds since the epoch in a float64
+                 array instead of one date string per point, so plotly
+                 serializes both x and y as base64 typed arrays.
+
+serialization_benchmark/compare_render_modes measure what these save.
+"""
+
+# Libraries
+import time
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+##############
+### SET-UP ###
+##############
+
+DOWNSAMPLE_METHODS = ('minmax', 'lttb')
+RENDER_MODES = ('svg', 'webgl', 'auto')
+
+# points above which render_mode = 'auto' switches a trace to WebGL
+WEBGL_THRESHOLD = 1000
+
+######################
+## HELPER FUNCTIONS ##
+######################
+
+def _as_float(x):
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[ns]').astype('int64').astype('float64')
+    return x.astype('float64')
+
+def _bucket_edges(n, n_buckets):
+    # first and last points get buckets of their own
+    inner = np.linspace(1, n - 1, n_buckets + 1).astype('int64')
+    return np.unique(np.concatenate([[0], inner, [n]]))
+
+##################
+## DOWNSAMPLING ##
+##################
+
+def minmax_indices(y, n_out):
+    """
+    Indices of the min and max point in each of n_out // 2 buckets (plus the
+    first and last point), in order.
+    """
+    n = len(y)
+    if n <= n_out:
+        return np.arange(n)
+
+    edges = _bucket_edges(n, max(1, (n_out - 2) // 2))
+    bucket = np.repeat(np.arange(len(edges) - 1), np.diff(edges))
+
+    # sort by (bucket, value): the first entry of each bucket is its min and
+    # the last is its max
+    order = np.lexsort((y, bucket))
+    starts, ends = edges[:-1], edges[1:] - 1
+    keep = np.concatenate([order[starts], order[ends]])
+    return np.unique(keep)
+
+def lttb_indices(x, y, n_out):
+    """
+    Indices of the points Largest-Triangle-Three-Buckets keeps, in order.
+    """
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+
+    x = _as_float(x)
+    y = np.asarray(y, dtype='float64')
+    edges = np.linspace(1, n - 1, n_out - 1).astype('int64')
+
+    # average point of every bucket, used as the "next" corner of the triangle
+    sums_x = np.add.reduceat(x[:n - 1], edges[:-1])
+    sums_y = np.add.reduceat(y[:n - 1], edges[:-1])
+    counts = np.diff(edges)
+    avg_x = np.append(sums_x / counts, x[-1])
+    avg_y = np.append(sums_y / counts, y[-1])
+
+    keep = np.empty(n_out, dtype='int64')
+    keep[0], keep[-1] = 0, n - 1
+    prev = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        # twice the triangle area for every candidate in the bucket at once
+        area = np.abs((x[prev] - avg_x[b + 1]) * (y[lo:hi] - y[prev])
+                      - (x[prev] - x[lo:hi]) * (avg_y[b + 1] - y[prev]))
+        prev = lo + int(np.argmax(area))
+        keep[b + 1] = prev
+    return keep
+
+def _runs(valid):
+    # [start, stop) positions of every run of True
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], valid.astype('int8'), [0]])))
+    return edges[::2], edges[1::2]
+
+def downsample(x, y, n_out, method = 'minmax'):
+    """
+    Reduces the points (x, y) to about n_out with the given method. Each
+    stretch of data between missing values gets its share of n_out and is
+    reduced on its own, and the gaps between them are kept as one missing
+    point, so the line still breaks where the data does. Returns the new
+    (x, y) arrays.
+    """
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError("Unknown downsample method '%s', expected one of %s"
+                         % (method, ', '.join(DOWNSAMPLE_METHODS)))
+    x, y = np.asarray(x), np.asarray(y, dtype='float64')
+    if len(y) <= n_out:
+        return x, y
+
+    starts, stops = _runs(~np.isnan(y))
+    total = max(1, int((stops - starts).sum()))
+    keep = []
+    for start, stop in zip(starts, stops):
+        if keep:
+            # the first missing point after the last run marks the gap
+            keep.append(np.array([keep[-1][-1] + 1]))
+        run_out = max(3, int(round(n_out * (stop - start) / total)))
+        if method == 'minmax':
+            run = minmax_indices(y[start:stop], run_out)
+        else:
+            run = lttb_indices(x[start:stop], y[start:stop], run_out)
+        keep.append(start + run)
+    keep = np.concatenate(keep) if keep else np.empty(0, dtype='int64')
+    return x[keep], y[keep]
+
+############
+## TRACES ##
+############
+
+def epoch_ms(dates):
+    """
+    Dates as float64 milliseconds since the epoch, which plotly date axes
+    accept directly (and which serialize as a typed array).
+    """
+    return np.asarray(dates, dtype='datetime64[ns]').astype('datetime64[ms]').astype('int64').astype('float64')
+
+def line_trace(dates, values, name, color, line_width, downsample_method = None,
+               width = 1400, render_mode = 'svg', webgl_threshold = WEBGL_THRESHOLD,
+               compact_arrays = False, **kwargs):
+    """
+    A line trace for one series. With downsample_method ('minmax' or 'lttb')
+    long series are reduced to fit a figure `width` pixels wide: 2 points per
+    pixel column for minmax, 1 for lttb. render_mode and compact_arrays are
+    described at the top of this file. Extra kwargs go straight to the trace
+    (e.g. xaxis='x2').
+    """
+    if render_mode not in RENDER_MODES:
+        raise ValueError("Unknown render mode '%s', expected one of %s"
+                         % (render_mode, ', '.join(RENDER_MODES)))
+
+    if downsample_method is not None:
+        n_out = 2 * width if downsample_method == 'minmax' else width
+        dates, values = downsample(dates, values, n_out, downsample_method)
+
+    if compact_arrays:
+        dates = epoch_ms(dates)
+        values = np.asarray(values, dtype='float64')
+
+    use_webgl = render_mode == 'webgl' or (render_mode == 'auto' and len(values) > webgl_threshold)
+    trace_type = go.Scattergl if use_webgl else go.Scatter
+    return trace_type(x=dates, y=values, mode='lines', name=name,
+                      line=dict(width=line_width, color=color), **kwargs)
+
+###############
+## BENCHMARK ##
+###############
+
+def serialization_benchmark(figures_list, chart_titles, repeat = 3):
+    """
+    Times fig.to_json() for each figure (best of `repeat`) and measures the
+    JSON size. Returns a DataFrame with one row per chart.
+    """
+    rows = []
+    for fig, chart_title in zip(figures_list, chart_titles):
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            text = fig.to_json()
+            best = min(best, time.perf_counter() - start)
+        rows.append({'chart_title': chart_title,
+                     'points': sum(len(trace.y) for trace in fig.data if trace.y is not None),
+                     'json_bytes': len(text.encode('utf-8')),
+                     'json_ms': best * 1000})
+    return pd.DataFrame(rows)
+
+def compare_render_modes(names = None, tags = None, repeat = 3, **overrides):
+    """
+    Builds the catalog charts matching names/tags twice, once as they are
+    and once with render_mode = 'auto' and compact_arrays = True (plus any
+    other create_line_graph overrides passed in), and returns the
+    serialization benchmark for both side by side with a TOTAL row.
+    """
+    from fedchallenge.catalog import build_charts
+
+    results = {}
+    settings = {'default': {},
+                'compact': dict({'render_mode': 'auto', 'compact_arrays': True}, **overrides)}
+    for label, chart_overrides in settings.items():
+        figures_list, chart_titles = build_charts(names, tags, overrides = chart_overrides)
+        results[label] = serialization_benchmark(figures_list, chart_titles, repeat).set_index('chart_title')
+
+    table = results['default'].join(results['compact'], lsuffix='_default', rsuffix='_compact')
+    table.loc['TOTAL'] = table.sum()
+    table['size_ratio'] = table['json_bytes_compact'] / table['json_bytes_default']
+    table['time_ratio'] = table['json_ms_compact'] / table['json_ms_default']
+    return table
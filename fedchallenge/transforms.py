@@ -0,0 +1,117 @@
+"""
+This file is used to compute FRED's unit transformations ourselves, so we
+only ever download (and cache) the level ('lin') of a series. The formulas
+follow FRED's definitions, where n is the number of observations per year
+for the series' frequency:
+
+chg   Change                                    x(t) - x(t-1)
+ch1   Change from Year Ago                      x(t) - x(t-n)
+pch   Percent Change                            ((x(t)/x(t-1)) - 1) * 100
+pc1   Percent Change from Year Ago              ((x(t)/x(t-n)) - 1) * 100
+pca   Compounded Annual Rate of Change          (((x(t)/x(t-1)) ** n) - 1) * 100
+cch   Continuously Compounded Rate of Change    (ln(x(t)) - ln(x(t-1))) * 100
+cca   Continuously Compounded Annual Rate       (ln(x(t)) - ln(x(t-1))) * 100 * n
+log   Natural Log                               ln(x(t))
+
+Like FRED, missing observations ('.') are skipped when lagging, and stay
+missing in the output.
+"""
+
+# Libraries
+import numpy as np
+import pandas as pd
+
+##############
+### SET-UP ###
+##############
+
+UNITS = ('lin', 'chg', 'ch1', 'pch', 'pc1', 'pca', 'cch', 'cca', 'log')
+
+# observations per year, keyed by FRED's frequency_short
+OBS_PER_YEAR = {'D': 260, 'W': 52, 'BW': 26, 'M': 12, 'Q': 4, 'SA': 2, 'A': 1}
+
+# rough number of calendar days one observation covers
+PERIOD_DAYS = {'D': 7 / 5, 'W': 7, 'BW': 14, 'M': 31, 'Q': 92, 'SA': 183, 'A': 366}
+
+######################
+## HELPER FUNCTIONS ##
+######################
+
+def _frequency(info_or_frequency):
+    if isinstance(info_or_frequency, str):
+        return info_or_frequency
+    return info_or_frequency['frequency_short']
+
+def _lags(units, frequency):
+    if units in ('ch1', 'pc1'):
+        return OBS_PER_YEAR[frequency]
+    return 1
+
+def lookback(units, info_or_frequency):
+    """
+    How far before a window's start we need the level series so the first
+    transformed observation in the window isn't missing.
+    """
+    if units in ('lin', 'log'):
+        return pd.Timedelta(0)
+    frequency = _frequency(info_or_frequency)
+    days = _lags(units, frequency) * PERIOD_DAYS.get(frequency, 366)
+    return pd.Timedelta(days=int(days * 1.1) + 31)
+
+####################
+## TRANSFORMATION ##
+####################
+
+def transform_array(values, units, info_or_frequency):
+    """
+    Applies a FRED units transformation to a float64 array of level values
+    in date order. Returns a new array of the same length.
+    """
+    if units not in UNITS:
+        raise ValueError("Unknown units '%s', expected one of %s" % (units, ', '.join(UNITS)))
+    values = np.asarray(values, dtype='float64')
+    if units == 'lin':
+        return values
+
+    frequency = _frequency(info_or_frequency)
+    if units != 'log' and frequency not in OBS_PER_YEAR:
+        raise ValueError("Can't compute '%s' for a series with frequency '%s'" % (units, frequency))
+
+    # lag over the observations we actually have
+    valid = ~np.isnan(values)
+    x = values[valid]
+    k = _lags(units, frequency)
+    prev = np.full_like(x, np.nan)
+    if len(x) > k:
+        prev[k:] = x[:-k]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if units in ('chg', 'ch1'):
+            out = x - prev
+        elif units in ('pch', 'pc1'):
+            out = (x / prev - 1) * 100
+        elif units == 'pca':
+            out = ((x / prev) ** OBS_PER_YEAR[frequency] - 1) * 100
+        elif units == 'cch':
+            out = (np.log(x) - np.log(prev)) * 100
+        elif units == 'cca':
+            out = (np.log(x) - np.log(prev)) * 100 * OBS_PER_YEAR[frequency]
+        else:
+            out = np.log(x)
+
+    result = np.full(len(values), np.nan)
+    result[valid] = out
+    return result
+
+def transform_units(data, units, info_or_frequency):
+    """
+    Applies a FRED units transformation to a level series (a pandas Series
+    indexed by date, like fredapi returns). info_or_frequency is the series'
+    info or just its frequency_short ('D', 'W', 'M', 'Q', ...).
+    """
+    if units not in UNITS:
+        raise ValueError("Unknown units '%s', expected one of %s" % (units, ', '.join(UNITS)))
+    if units == 'lin':
+        return data
+    result = transform_array(data.to_numpy(dtype='float64'), units, info_or_frequency)
+    return pd.Series(result, index=data.index, name=data.name)
@@ -0,0 +1,144 @@
+"""
+This file is used to talk HTTP to FRED over persistent connections. fredapi
+opens a new connection (TCP + TLS handshake) for every request. A build
+makes dozens of requests, so HTTPTransport keeps a small pool of open
+keep-alive connections per host and reuses them:
+
+transport = HTTPTransport()
+body = transport.get('https://api.stlouisfed.org/fred/series?series_id=GDPC1&api_key=...')
+
+After the first request to a host, every request costs one round trip.
+Responses are requested gzip-compressed (compress = False turns that off).
+Errors look like urllib's: an HTTPError for 4xx/5xx responses (with the
+response body readable from it, like fredapi expects), and ConnectionError,
+TimeoutError or http.client errors for dropped connections.
+
+fred_client's FredClient sends all of its requests through one of these.
+"""
+
+# Libraries
+import io
+import gzip
+import queue
+import threading
+import http.client
+from urllib.error import HTTPError
+from urllib.parse import urlsplit
+from urllib.request import getproxies, proxy_bypass
+from fedchallenge import instrument
+
+##############
+### SET-UP ###
+##############
+
+# open connections kept per host, matches the number of fetch threads
+POOL_SIZE = 8
+TIMEOUT = 30   # seconds
+
+USER_AGENT = 'fedchallenge'
+
+# errors that mean a kept-alive connection was closed by the server while it
+# sat in the pool, the request is safe to send again on a new one
+_STALE_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+###############
+## TRANSPORT ##
+###############
+
+class HTTPTransport:
+    """
+    A pool of keep-alive HTTP(S) connections, shared between threads. At
+    most pool_size idle connections are kept per host. Honours the usual
+    HTTPS_PROXY/HTTP_PROXY/NO_PROXY environment variables.
+    """
+
+    def __init__(self, pool_size = POOL_SIZE, timeout = TIMEOUT, compress = True):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.compress = compress
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def _pool(self, key):
+        with self._lock:
+            if key not in self._pools:
+                self._pools[key] = queue.LifoQueue()
+            return self._pools[key]
+
+    def _connect(self, scheme, host, port):
+        connection_type = (http.client.HTTPSConnection if scheme == 'https'
+                           else http.client.HTTPConnection)
+        proxy = getproxies().get(scheme)
+        if proxy and not proxy_bypass(host):
+            proxy = urlsplit(proxy)
+            connection = connection_type(proxy.hostname, proxy.port, timeout=self.timeout)
+            connection.set_tunnel(host, port)
+        else:
+            connection = connection_type(host, port, timeout=self.timeout)
+        instrument.count('connections_opened', host=host)
+        return connection
+
+    def _release(self, key, connection):
+        pool = self._pool(key)
+        if pool.qsize() < self.pool_size:
+            pool.put(connection)
+        else:
+            connection.close()
+
+    def get(self, url):
+        """
+        GETs url and returns the (decompressed) response body as bytes.
+        """
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        key = (parts.scheme, parts.hostname, port)
+        path = parts.path + ('?' + parts.query if parts.query else '')
+        headers = {'User-Agent': USER_AGENT, 'Connection': 'keep-alive'}
+        if self.compress:
+            headers['Accept-Encoding'] = 'gzip'
+
+        try:
+            connection, reused = self._pool(key).get_nowait(), True
+        except queue.Empty:
+            connection, reused = self._connect(*key), False
+
+        try:
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+            except _STALE_ERRORS:
+                if not reused:
+                    raise
+                # the server closed it while it was idle, try once on a new one
+                connection.close()
+                connection = self._connect(*key)
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+            body = response.read()
+        except Exception:
+            connection.close()
+            raise
+
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(key, connection)
+
+        instrument.count('bytes_received', len(body))
+        if response.getheader('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+
+        if response.status >= 400:
+            raise HTTPError(url, response.status, response.reason, response.headers,
+                            io.BytesIO(body))
+        return body
+
+    def close(self):
+        """
+        Closes every idle connection.
+        """
+        with self._lock:
+            pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            while not pool.empty():
+                pool.get_nowait().close()
@@ -0,0 +1,151 @@
+"""
+This file is used to find out which cached series changed on FRED with a
+handful of requests, instead of asking for every series' info one by one:
+
+report = refresh_cache()
+report['changed']      # e.g. ['FEDFUNDS', 'IORB']
+
+FRED's series/updates feed lists every series updated recently, newest
+first, 1000 to a page. We read it back to the oldest copy in the cache and
+compare its last_updated stamps with ours. Series that moved are expired
+(the next fetch downloads them again and stores the new stamp, so the
+refresh after that finds them unchanged), the rest have their TTL clock
+reset so nothing asks FRED about them again until the TTL is up.
+
+The feed only goes back two weeks. Series cached before that are checked
+the old way, one get_series_info each. So are any we haven't seen by the
+time reading the feed has cost as many requests as asking for them one by
+one would, since FRED updates thousands of series a day. Run this nightly (or with
+python -m fedchallenge.updates) and that never happens.
+"""
+
+# Libraries
+import argparse
+import pandas as pd
+from fedchallenge import cache, fred_client, expressions
+
+##############
+### SET-UP ###
+##############
+
+# FRED's stamps are to the second and its feed can lag a little, so we read
+# it from a bit before the oldest fetch (extra rows are just compared)
+FEED_MARGIN = pd.Timedelta(hours=1)
+
+######################
+## HELPER FUNCTIONS ##
+######################
+
+def _utc(time):
+    time = pd.Timestamp(time)
+    return time.tz_localize('UTC') if time.tzinfo is None else time.tz_convert('UTC')
+
+def _same_stamp(a, b):
+    # stamps come as text, compare them as times so formatting doesn't matter
+    try:
+        return _utc(a) == _utc(b)
+    except (ValueError, TypeError):
+        return str(a) == str(b)
+
+#############
+## UPDATES ##
+#############
+
+def recent_updates(since = None, series_ids = None):
+    """
+    {series_id: last_updated} for every series updated on FRED since since
+    (at most two weeks ago, the default), paging through the feed. Given
+    series_ids, paging stops as soon as all of them have been seen, or once
+    it has taken as many requests as asking for the unseen ones one by one
+    would. Returns (updates, number of requests made, whether the feed was
+    read all the way back to since).
+    """
+    oldest = pd.Timestamp.now('UTC') - fred_client.UPDATES_WINDOW
+    since = oldest if since is None else max(_utc(since), oldest)
+    unseen = None if series_ids is None else set(series_ids)
+
+    updates = {}
+    offset, requests = 0, 0
+    while True:
+        page, count = fred_client.call('get_series_updates', start_time = since, offset = offset)
+        requests += 1
+        # the feed is newest first, a series can only show up once
+        updates.update(zip(page['id'], page['last_updated']))
+        offset += len(page)
+        if len(page) == 0 or offset >= count:
+            return updates, requests, True
+        if unseen is not None:
+            unseen.difference_update(page['id'])
+            if not unseen or requests >= len(unseen):
+                return updates, requests, False
+
+def refresh_cache(since = None):
+    """
+    Checks every cached series against FRED, expiring the ones that changed
+    and resetting the TTL on the rest. since limits the check to updates
+    after it, by default the oldest fetch in the cache. Returns a dict:
+
+    changed     series IDs updated on FRED since we fetched them
+    unchanged   series IDs that are still current
+    fallback    series IDs too old for the feed (or not reached before the
+                feed got more expensive than asking), checked one by one
+    requests    FRED requests made
+    """
+    report = {'changed': [], 'unchanged': [], 'fallback': [], 'requests': 0}
+    cached = cache.cached_series()
+    if cached.empty:
+        return report
+
+    cached['fetched_at'] = cached['fetched_at'].dt.tz_localize('UTC')
+    entries = cached.groupby('series_id').agg(last_updated=('last_updated', 'first'),
+                                              fetched_at=('fetched_at', 'min'))
+
+    # the feed covers the last two weeks, back to the oldest copy we have
+    feed_start = max(entries['fetched_at'].min() - FEED_MARGIN,
+                     pd.Timestamp.now('UTC') - fred_client.UPDATES_WINDOW)
+    if since is not None:
+        feed_start = max(feed_start, _utc(since))
+    updates, report['requests'], complete = recent_updates(feed_start, entries.index)
+
+    for series_id, entry in entries.iterrows():
+        if series_id in updates:
+            moved = not _same_stamp(updates[series_id], entry['last_updated'])
+        elif complete and entry['fetched_at'] >= feed_start + FEED_MARGIN:
+            # not updated since before we fetched it
+            moved = False
+        else:
+            report['fallback'].append(series_id)
+            info = fred_client.get_series_info(series_id, refresh = True)
+            report['requests'] += 1
+            moved = not _same_stamp(info.get('last_updated'), entry['last_updated'])
+        report['changed' if moved else 'unchanged'].append(series_id)
+
+    if report['changed']:
+        cache.expire_series(report['changed'])
+        for series_id in report['changed']:
+            fred_client.forget_info(series_id)
+    if report['unchanged']:
+        cache.touch_many(report['unchanged'])
+    return report
+
+def affected_charts(series_ids):
+    """
+    Names of the catalog charts that use any of series_ids, i.e. the ones
+    worth rebuilding after a refresh.
+    """
+    from fedchallenge.catalog import CHART_SPECS
+    series_ids = set(series_ids)
+    return [spec['name'] for spec in CHART_SPECS
+            if series_ids.intersection(expressions.series_ids(spec['datalist']))]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check every cached FRED series for updates.')
+    parser.add_argument('--since', default=None, help='only look at updates after this time')
+    args = parser.parse_args()
+    report = refresh_cache(args.since)
+    print('%d changed, %d unchanged (%d checked one by one), %d requests'
+          % (len(report['changed']), len(report['unchanged']), len(report['fallback']),
+             report['requests']))
+    if report['changed']:
+        print('Changed: ' + ', '.join(report['changed']))
+        print('Charts to rebuild: ' + ', '.join(affected_charts(report['changed'])))
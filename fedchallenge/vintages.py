@@ -0,0 +1,200 @@
+"""
+This file is used to get series as they looked at some point in the past,
+from ALFRED (FRED's archive of every release and revision). Instead of the
+latest data, fred_api/get_datasets/create_line_graph can be asked for a
+vintage:
+
+vintage = '2008-12-16'   the data as it was known on that day (e.g. at an
+                         FOMC meeting), revisions published later ignored
+vintage = 'first'        every observation as it was first released
+
+Every vintage of a series is kept as deltas: one row when an observation is
+first released, and one more each time a revision changes its value,
+stamped with the day it was published (its realtime_start). A series
+revised hundreds of times stays about as small as its revisions, and any
+vintage can be rebuilt from the rows with a couple of vectorized passes.
+
+Rows are stored in the SQLite cache (see cache.py). Past vintages never
+change, so an as-of date before our last download is always served
+straight from the cache. Otherwise, once the TTL has passed, we only ask
+ALFRED for releases since the last download.
+"""
+
+# Libraries
+import numpy as np
+import pandas as pd
+from fedchallenge import cache, fred_client
+from fedchallenge.store import SeriesArray, _datetime64
+
+##############
+### SET-UP ###
+##############
+
+FIRST_RELEASE = 'first'
+
+####################
+## VINTAGE ARRAYS ##
+####################
+
+class VintageArray:
+    """
+    The vintage deltas of one series: dates, realtime_starts (both
+    datetime64[ns]) and values, sorted by date and then realtime_start.
+    """
+
+    __slots__ = ('dates', 'realtime_starts', 'values')
+
+    def __init__(self, dates, realtime_starts, values):
+        self.dates = np.asarray(dates, dtype='datetime64[ns]')
+        self.realtime_starts = np.asarray(realtime_starts, dtype='datetime64[ns]')
+        self.values = np.asarray(values, dtype='float64')
+
+    @classmethod
+    def from_rows(cls, dates, realtime_starts, values):
+        """
+        Sorts release rows and drops the ones that don't change anything:
+        repeats of the same (date, realtime_start), where the last one wins,
+        and rows restating the value an observation already had.
+        """
+        dates = np.asarray(pd.to_datetime(dates), dtype='datetime64[ns]')
+        realtime_starts = np.asarray(pd.to_datetime(realtime_starts), dtype='datetime64[ns]')
+        values = np.asarray(values, dtype='float64')
+
+        order = np.lexsort((realtime_starts, dates))
+        dates, realtime_starts, values = dates[order], realtime_starts[order], values[order]
+
+        same_date = dates[1:] == dates[:-1]
+        repeated = np.append(same_date & (realtime_starts[1:] == realtime_starts[:-1]), False)
+        keep = ~repeated
+        dates, realtime_starts, values = dates[keep], realtime_starts[keep], values[keep]
+
+        same_date = dates[1:] == dates[:-1]
+        same_value = (values[1:] == values[:-1]) | (np.isnan(values[1:]) & np.isnan(values[:-1]))
+        keep = np.insert(~(same_date & same_value), 0, True)
+        return cls(dates[keep], realtime_starts[keep], values[keep])
+
+    @classmethod
+    def from_releases(cls, releases):
+        """
+        From the DataFrame fredapi's get_series_all_releases returns.
+        """
+        return cls.from_rows(releases['date'], releases['realtime_start'],
+                             pd.to_numeric(releases['value'], errors='coerce'))
+
+    def __len__(self):
+        return len(self.dates)
+
+    def merge(self, other):
+        """
+        These rows plus other's, where other wins on the same (date,
+        realtime_start).
+        """
+        return VintageArray.from_rows(np.concatenate([self.dates, other.dates]),
+                                      np.concatenate([self.realtime_starts, other.realtime_starts]),
+                                      np.concatenate([self.values, other.values]))
+
+    def as_of(self, date):
+        """
+        The series as it was known on date.
+        """
+        known = self.realtime_starts <= _datetime64(date)
+        # last known row for each date: known, and the next row is either
+        # another date or a revision that came later
+        next_same = np.append(self.dates[1:] == self.dates[:-1], False)
+        next_known = np.append(known[1:], False)
+        last = known & ~(next_same & next_known)
+        return SeriesArray(self.dates[last], self.values[last])
+
+    def first_release(self):
+        """
+        Every observation as it was first published.
+        """
+        first = np.insert(self.dates[1:] != self.dates[:-1], 0, True)
+        return SeriesArray(self.dates[first], self.values[first])
+
+    def latest(self):
+        last = np.append(self.dates[1:] != self.dates[:-1], True)
+        return SeriesArray(self.dates[last], self.values[last])
+
+    def vintage(self, vintage):
+        """
+        vintage is FIRST_RELEASE ('first') or an as-of date.
+        """
+        if isinstance(vintage, str) and vintage == FIRST_RELEASE:
+            return self.first_release()
+        return self.as_of(vintage)
+
+    def vintage_dates(self):
+        """
+        Every day a release or revision was published, sorted.
+        """
+        return pd.DatetimeIndex(np.unique(self.realtime_starts))
+
+    def rows(self, since = None):
+        """
+        The rows as (dates, realtime_starts, values), only those published on
+        or after since if given.
+        """
+        if since is None:
+            return self.dates, self.realtime_starts, self.values
+        keep = self.realtime_starts >= _datetime64(since)
+        return self.dates[keep], self.realtime_starts[keep], self.values[keep]
+
+##############
+## FETCHING ##
+##############
+
+def _download(series_id, realtime_start = None):
+    releases = fred_client.call('get_series_all_releases', series_id,
+                                realtime_start = None if realtime_start is None
+                                else pd.Timestamp(realtime_start).strftime('%Y-%m-%d'))
+    if len(releases) == 0:
+        return VintageArray([], [], [])
+    return VintageArray.from_releases(releases)
+
+def load_vintages(series_id, vintage = None, refresh = False, ttl = None, use_cache = True):
+    """
+    Every stored vintage delta of a series as a VintageArray, updated from
+    ALFRED if needed to serve vintage (None meaning as up to date as the
+    TTL allows). refresh = True downloads every release again.
+    """
+    today = pd.Timestamp.now().normalize()
+    entry = cache.load_vintages(series_id) if use_cache and not refresh else None
+
+    if entry is None:
+        vintages = _download(series_id)
+        if use_cache:
+            cache.append_vintages(series_id, *vintages.rows(), realtime_end = today)
+        return vintages
+
+    vintages = VintageArray(pd.to_datetime(entry['dates']), pd.to_datetime(entry['realtime_starts']),
+                            entry['values'])
+
+    # a vintage from before our last download can't have changed since
+    as_of_past = (vintage is not None and not (isinstance(vintage, str) and vintage == FIRST_RELEASE)
+                  and pd.Timestamp(vintage) < entry['realtime_end'])
+    if as_of_past or cache.is_fresh(entry['fetched_at'], ttl):
+        return vintages
+
+    # only what was published since the last download
+    new = _download(series_id, entry['realtime_end'])
+    vintages = vintages.merge(new)
+    cache.append_vintages(series_id, *vintages.rows(since = entry['realtime_end']),
+                          realtime_end = today)
+    return vintages
+
+def vintage_series(series_id, vintage, refresh = False, ttl = None, use_cache = True):
+    """
+    Returns (SeriesArray, info) for one vintage of a series: 'first' for
+    first releases, otherwise an as-of date.
+    """
+    vintages = load_vintages(series_id, vintage, refresh, ttl, use_cache)
+    return vintages.vintage(vintage), fred_client.get_series_info(series_id)
+
+def vintage_label(vintage):
+    """
+    What gets added to a series' name for a vintage, e.g. ' (as of 2008-12-16)'.
+    """
+    if isinstance(vintage, str) and vintage == FIRST_RELEASE:
+        return ' (first release)'
+    return ' (as of %s)' % pd.Timestamp(vintage).strftime('%Y-%m-%d')
@@ -0,0 +1,18 @@
+"""
+This file is used to set up the tests: every test that asks for the fred
+fixture gets the offline FRED stand-in (see offline.py) and an empty cache
+of its own, so nothing touches the network or the real cache.
+"""
+
+# Libraries
+import pytest
+from fedchallenge import cache, offline, align, expressions, fred_client
+
+@pytest.fixture
+def fred(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, 'CACHE_DIR', str(tmp_path))
+    client = offline.install()
+    align.clear_memo()
+    expressions.clear_memo()
+    yield client
+    fred_client.forget_info()
@@ -0,0 +1,76 @@
+# Libraries
+import numpy as np
+import pandas as pd
+import pytest
+import fedchallenge
+from fedchallenge import align
+from fedchallenge.store import SeriesArray
+
+def series(dates, values):
+    return SeriesArray(pd.to_datetime(dates).values, values)
+
+def test_period_codes_and_labels():
+    dates = pd.to_datetime(['2024-03-01', '2024-03-02', '2024-03-04'])  # Fri, Sat, Mon
+    daily = align.period_codes(dates, 'D')
+    # weekend observations count towards the Friday before
+    assert daily[0] == daily[1] != daily[2]
+    weekly = align.period_dates(align.period_codes(dates, 'W'), 'W')
+    assert list(pd.DatetimeIndex(weekly).strftime('%Y-%m-%d')) == ['2024-03-01', '2024-03-08', '2024-03-08']
+    quarterly = align.period_dates(align.period_codes(pd.to_datetime(['2024-05-17']), 'Q'), 'Q')
+    assert pd.Timestamp(quarterly[0]) == pd.Timestamp('2024-04-01')
+
+@pytest.mark.parametrize('how, expected', [('mean', [2.0, 5.0]), ('last', [3.0, 5.0]),
+                                           ('first', [1.0, 5.0]), ('sum', [6.0, 5.0]),
+                                           ('min', [1.0, 5.0]), ('max', [3.0, 5.0])])
+def test_aggregations(how, expected):
+    monthly = series(['2024-01-01', '2024-02-01', '2024-03-01', '2024-04-01'], [1.0, 2.0, 3.0, 5.0])
+    dates, values = align.align_arrays([monthly], 'Q', how)
+    assert list(pd.DatetimeIndex(dates).strftime('%Y-%m')) == ['2024-01', '2024-04']
+    assert list(values[:, 0]) == expected
+
+def test_mixed_frequencies_share_a_calendar():
+    quarterly = series(['2024-01-01', '2024-04-01'], [1.0, 2.0])
+    monthly = series(['2024-01-01', '2024-02-01', '2024-03-01', '2024-04-01'], [1.0, 2.0, np.nan, 4.0])
+    dates, values = align.align_arrays([quarterly, monthly], 'M')
+    assert len(dates) == 4
+    np.testing.assert_array_equal(values[:, 0], [1.0, np.nan, np.nan, 2.0])
+    # missing observations are skipped, not averaged in
+    np.testing.assert_array_equal(values[:, 1], [1.0, 2.0, np.nan, 4.0])
+
+def test_fills():
+    quarterly = series(['2024-01-01', '2024-04-01', '2024-07-01'], [1.0, 4.0, 7.0])
+    _, values = align.align_arrays([quarterly], 'M', fill = 'ffill', limit = 1)
+    np.testing.assert_array_equal(values[:, 0], [1, 1, np.nan, 4, 4, np.nan, 7])
+    _, values = align.align_arrays([quarterly], 'M', fill = 'bfill')
+    np.testing.assert_array_equal(values[:, 0], [1, 4, 4, 4, 7, 7, 7])
+    _, values = align.align_arrays([quarterly], 'M', fill = 'interpolate')
+    np.testing.assert_array_equal(values[:, 0], np.arange(1.0, 8.0))
+
+def test_window_and_bad_settings():
+    monthly = series(['2024-01-01', '2024-02-01'], [1.0, 2.0])
+    dates, values = align.align_arrays([monthly], 'M', start = '2023-12-15', end = '2024-03-31')
+    assert len(dates) == 4 and np.isnan(values[0, 0]) and np.isnan(values[-1, 0])
+    with pytest.raises(ValueError):
+        align.align_arrays([monthly], 'H')
+    with pytest.raises(ValueError):
+        align.align_arrays([monthly], 'M', 'median')
+
+def test_common_frequency():
+    assert align.common_frequency([{'frequency_short': 'D'}, {'frequency_short': 'Q'}]) == 'Q'
+    assert align.common_frequency([{'frequency_short': 'BW'}, {'frequency_short': 'D'}]) == 'W'
+
+def test_repeats_are_served_without_fetching(fred, monkeypatch):
+    calls = []
+    fetch = fedchallenge._fetch_arrays
+    monkeypatch.setattr(fedchallenge, '_fetch_arrays', lambda *a, **k: calls.append(a) or fetch(*a, **k))
+
+    first = align.get_aligned(['GDPC1', 'FEDFUNDS'], 'Q', start = '2006-01-01', end = '2010-12-31')
+    assert len(calls) == 1
+    again = align.get_aligned(['GDPC1', 'FEDFUNDS'], 'Q', start = '2006-01-01', end = '2010-12-31')
+    assert len(calls) == 1
+    pd.testing.assert_frame_equal(first, again)
+
+    # an update on FRED shows up once the cache has the new data
+    fred.update('GDPC1', '2030-01-01 00:00:00-05')
+    align.get_aligned(['GDPC1', 'FEDFUNDS'], 'Q', start = '2006-01-01', end = '2010-12-31', ttl = 0)
+    assert len(calls) == 2
@@ -0,0 +1,52 @@
+# Libraries
+import pandas as pd
+import fedchallenge as fc
+from fedchallenge import cache
+
+def test_only_the_window_is_downloaded(fred):
+    data, _ = fc.fred_api('GDPC1', start = '2006-01-01', end = '2010-12-31')
+    assert data.index[0] == pd.Timestamp('2006-01-01')
+    assert data.index[-1] == pd.Timestamp('2010-10-01')
+    entry = cache.load_entry('GDPC1')
+    assert entry['window_start'] == pd.Timestamp('2006-01-01')
+    assert entry['window_end'] == pd.Timestamp('2010-12-31')
+
+def test_repeats_come_from_the_cache(fred):
+    fc.fred_api('GDPC1', start = '2006-01-01', end = '2010-12-31')
+    fc.fred_api('GDPC1', start = '2007-01-01', end = '2009-12-31')
+    assert fred.calls['get_series'] == 1
+
+def test_wider_windows_append_what_is_missing(fred):
+    fc.fred_api('GDPC1', start = '2006-01-01', end = '2010-12-31')
+    data, _ = fc.fred_api('GDPC1', start = '2004-01-01', end = '2012-12-31')
+    # one download for the head and one for the tail, not the whole window again
+    assert fred.calls['get_series'] == 3
+    assert data.index[0] == pd.Timestamp('2004-01-01')
+    assert data.index[-1] == pd.Timestamp('2012-10-01')
+    assert data.index.is_unique and data.index.is_monotonic_increasing
+    full = fred._level('GDPC1')
+    pd.testing.assert_series_equal(data, full['2004-01-01':'2012-12-31'], check_names=False,
+                                   check_freq=False, check_index_type=False)
+
+def test_closed_windows_are_refreshed_when_fred_moves(fred):
+    before, _ = fc.fred_api('GDPC1', start = '2006-01-01', end = '2010-12-31')
+
+    # past the TTL but unchanged on FRED: no new download
+    fc.fred_api('GDPC1', start = '2006-01-01', end = '2010-12-31', ttl = 0)
+    assert fred.calls['get_series'] == 1
+
+    # revised on FRED: the window is downloaded again
+    fred._loaded['GDPC1'] = fred._level('GDPC1') + 1000
+    fred.update('GDPC1', '2030-01-01 00:00:00-05')
+    after, info = fc.fred_api('GDPC1', start = '2006-01-01', end = '2010-12-31', ttl = 0)
+    assert fred.calls['get_series'] == 2
+    assert (after - before == 1000).all()
+    assert cache.load_entry('GDPC1')['info']['last_updated'] == info['last_updated']
+
+def test_expired_series_are_downloaded_again(fred):
+    from fedchallenge import updates
+    fc.fred_api('GDPC1', start = '2006-01-01', end = '2010-12-31')
+    fred.update('GDPC1', '2030-01-01 00:00:00-05')
+    assert updates.refresh_cache()['changed'] == ['GDPC1']
+    fc.fred_api('GDPC1', start = '2006-01-01', end = '2010-12-31')
+    assert updates.refresh_cache()['changed'] == []
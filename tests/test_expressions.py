@@ -0,0 +1,58 @@
+# Libraries
+import numpy as np
+import pandas as pd
+import pytest
+import fedchallenge as fc
+from fedchallenge import expressions
+
+def test_normalized_text():
+    a = expressions.parse('(gdpc1/gdppot-1)*100')
+    b = expressions.parse('100 * (GDPC1 / GDPPOT - 1)')
+    assert a.normalized == b.normalized
+    assert a.series_ids == ('GDPC1', 'GDPPOT')
+
+def test_series_ids():
+    datalist = ['FEDFUNDS', 'FEDFUNDS - DPCCRV1Q225SBEA', 'log(GDPC1)']
+    assert expressions.series_ids(datalist) == ['FEDFUNDS', 'DPCCRV1Q225SBEA', 'GDPC1']
+    assert not expressions.is_expression('GDPC1')
+    assert expressions.is_expression('GDPC1 * 2')
+
+@pytest.mark.parametrize('text', ['GDPC1 +', '__import__("os")', 'GDPC1 % 2', '1 + 2', 'max(GDPC1)'])
+def test_rejects_what_it_cant_compute(text):
+    with pytest.raises(ValueError):
+        expressions.parse(text)
+
+def test_matches_computing_by_hand(fred):
+    (gap, info), = fc.fetch_many(['(GDPC1/GDPPOT - 1)*100'], start = '2006-01-01', end = '2010-12-31')
+    gdp, _ = fc.fred_api('GDPC1', start = '2006-01-01', end = '2010-12-31')
+    potential, _ = fc.fred_api('GDPPOT', start = '2006-01-01', end = '2010-12-31')
+    expected = ((gdp / potential - 1) * 100).dropna()
+    np.testing.assert_allclose(gap.to_numpy(), expected.to_numpy())
+    assert info['frequency_short'] == 'Q'
+
+def test_mixed_frequencies_use_the_coarsest(fred):
+    (spread, info), = fc.fetch_many(['FEDFUNDS - DPCCRV1Q225SBEA'], start = '2010-01-01', end = '2010-12-31')
+    funds, _ = fc.fred_api('FEDFUNDS', start = '2010-01-01', end = '2010-12-31')
+    core, _ = fc.fred_api('DPCCRV1Q225SBEA', start = '2010-01-01', end = '2010-12-31')
+    assert info['frequency_short'] == 'Q' and len(spread) == 4
+    quarterly_funds = funds.groupby(funds.index.to_period('Q')).mean().to_numpy()
+    np.testing.assert_allclose(spread.to_numpy(), quarterly_funds - core.to_numpy())
+
+def test_subexpressions_are_shared(fred):
+    fc.fetch_many(['GDPC1/GDPPOT', '(GDPC1/GDPPOT - 1)*100'], start = '2006-01-01', end = '2010-12-31')
+    stats = expressions.cache_info()
+    # GDPC1/GDPPOT is computed for the first entry and reused by the second
+    assert stats['hits'] >= 1
+
+    # the same expression again is one memo hit, no recomputation
+    misses = stats['misses']
+    fc.fetch_many(['(GDPC1/GDPPOT - 1)*100'], start = '2006-01-01', end = '2010-12-31')
+    assert expressions.cache_info()['misses'] == misses
+
+def test_new_data_is_not_served_from_the_memo(fred):
+    (before, _), = fc.fetch_many(['GDPC1 * 2'], start = '2006-01-01', end = '2010-12-31')
+    fred._level('GDPC1')
+    fred._loaded['GDPC1'] = fred._loaded['GDPC1'] + 1000
+    fred.update('GDPC1', '2030-01-01 00:00:00-05')
+    (after, _), = fc.fetch_many(['GDPC1 * 2'], start = '2006-01-01', end = '2010-12-31', ttl = 0)
+    np.testing.assert_allclose(after.to_numpy() - before.to_numpy(), 2000)
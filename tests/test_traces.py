@@ -0,0 +1,47 @@
+# Libraries
+import numpy as np
+import pandas as pd
+import pytest
+from fedchallenge import traces
+
+def daily(n = 5000, seed = 0):
+    dates = pd.date_range('2006-01-02', periods=n, freq='D').values
+    values = np.cumsum(np.random.default_rng(seed).normal(size=n))
+    return dates, values
+
+@pytest.mark.parametrize('method, n_out', [('minmax', 400), ('lttb', 200)])
+def test_reduces_to_about_n_out(method, n_out):
+    dates, values = daily()
+    x, y = traces.downsample(dates, values, n_out, method)
+    assert len(x) <= n_out + 2
+    # still in date order, ends kept
+    assert np.all(np.diff(x.astype('int64')) > 0)
+    assert x[0] == dates[0] and x[-1] == dates[-1]
+
+def test_minmax_keeps_every_extreme():
+    dates, values = daily()
+    values[1234] = 1000.0
+    values[4321] = -1000.0
+    _, y = traces.downsample(dates, values, 400, 'minmax')
+    assert y.max() == 1000.0 and y.min() == -1000.0
+
+def test_short_series_are_left_alone():
+    dates, values = daily(100)
+    x, y = traces.downsample(dates, values, 400, 'lttb')
+    assert len(x) == 100 and np.array_equal(y, values)
+
+@pytest.mark.parametrize('method', traces.DOWNSAMPLE_METHODS)
+def test_gaps_stay_gaps(method):
+    dates, values = daily()
+    values[2000:2500] = np.nan
+    x, y = traces.downsample(dates, values, 400, method)
+    # one missing point where the gap starts, so plotly breaks the line there
+    missing = np.isnan(y)
+    assert missing.sum() == 1
+    assert x[missing][0] == dates[2000]
+    assert x[np.flatnonzero(missing)[0] + 1] == dates[2500]
+
+def test_unknown_method():
+    dates, values = daily(10)
+    with pytest.raises(ValueError):
+        traces.downsample(dates, values, 5, 'average')
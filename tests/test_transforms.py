@@ -0,0 +1,60 @@
+# Libraries
+import numpy as np
+import pandas as pd
+import pytest
+import fedchallenge as fc
+from fedchallenge import transforms
+
+# a quarterly level with a missing observation, like FRED's '.'
+LEVEL = np.array([100.0, 102.0, np.nan, 103.0, 105.0, 104.0, 108.0, 110.0, 111.0])
+
+def fred_definition(values, units, n):
+    # FRED's formulas, lagging over the observations that exist
+    x = pd.Series(values).dropna()
+    lagged = x.shift(1 if units in ('chg', 'pch', 'pca', 'cch', 'cca') else n)
+    out = {'chg': x - lagged, 'ch1': x - lagged,
+           'pch': (x / lagged - 1) * 100, 'pc1': (x / lagged - 1) * 100,
+           'pca': ((x / lagged) ** n - 1) * 100,
+           'cch': (np.log(x) - np.log(lagged)) * 100,
+           'cca': (np.log(x) - np.log(lagged)) * 100 * n,
+           'log': np.log(x)}[units]
+    return out.reindex(range(len(values))).to_numpy()
+
+@pytest.mark.parametrize('units', [u for u in transforms.UNITS if u != 'lin'])
+def test_matches_fred_definitions(units):
+    result = transforms.transform_array(LEVEL, units, 'Q')
+    np.testing.assert_allclose(result, fred_definition(LEVEL, units, 4), equal_nan=True)
+
+def test_missing_observations_stay_missing():
+    result = transforms.transform_array(LEVEL, 'chg', 'Q')
+    assert np.isnan(result[2])
+    # the lag skips the missing quarter
+    assert result[3] == 103.0 - 102.0
+
+def test_unknown_units_and_frequency():
+    with pytest.raises(ValueError):
+        transforms.transform_array(LEVEL, 'pct', 'Q')
+    with pytest.raises(ValueError):
+        transforms.transform_array(LEVEL, 'pc1', 'X')
+
+def test_lookback_covers_a_year_of_lags():
+    assert transforms.lookback('lin', 'M') == pd.Timedelta(0)
+    assert transforms.lookback('pc1', 'Q') >= pd.Timedelta(days=4 * 92)
+    assert transforms.lookback('pch', 'M') >= pd.Timedelta(days=31)
+
+def test_fred_api_units_computed_from_the_level(fred):
+    level, _ = fc.fred_api('GDPC1', start = '2004-01-01', end = '2010-12-31')
+    pc1, _ = fc.fred_api('GDPC1', units = 'pc1', start = '2006-01-01', end = '2010-12-31')
+    expected = (level / level.shift(4) - 1) * 100
+    pd.testing.assert_series_equal(pc1, expected[pc1.index], check_names=False, check_freq=False)
+    # the first quarter in the window isn't missing, and the cached level
+    # was enough to compute it
+    assert not np.isnan(pc1.iloc[0])
+    assert fred.calls['get_series'] == 1
+
+def test_cached_units_need_no_info_request(fred):
+    fc.fred_api('FEDFUNDS', start = '2010-01-01', end = '2012-01-01')
+    fc.fred_client.forget_info()
+    fred.calls.clear()
+    fc.fred_api('FEDFUNDS', units = 'pc1', start = '2011-01-01', end = '2012-01-01')
+    assert fred.calls['get_series_info'] == 0
@@ -0,0 +1,61 @@
+# Libraries
+import numpy as np
+import pandas as pd
+from fedchallenge import vintages, cache
+from fedchallenge.vintages import VintageArray
+
+def releases():
+    # Q1 is released at 100, revised to 101, then restated at 101; Q2 is
+    # released at 200 and revised to 190
+    return VintageArray.from_rows(
+        ['2020-01-01', '2020-01-01', '2020-01-01', '2020-04-01', '2020-04-01'],
+        ['2020-04-30', '2020-05-28', '2020-06-25', '2020-07-30', '2020-08-27'],
+        [100.0, 101.0, 101.0, 200.0, 190.0])
+
+def test_restated_values_are_dropped():
+    rows = releases()
+    assert len(rows) == 4
+    assert list(rows.values) == [100.0, 101.0, 200.0, 190.0]
+
+def test_repeated_rows_keep_the_last():
+    rows = VintageArray.from_rows(['2020-01-01'] * 2, ['2020-04-30'] * 2, [1.0, 2.0])
+    assert list(rows.values) == [2.0]
+
+def test_as_of():
+    rows = releases()
+    known = rows.as_of('2020-06-01')
+    assert list(known.values) == [101.0]
+    known = rows.as_of('2020-08-01')
+    assert list(known.values) == [101.0, 200.0]
+    assert len(rows.as_of('2020-01-01')) == 0
+
+def test_first_release_and_latest():
+    rows = releases()
+    assert list(rows.first_release().values) == [100.0, 200.0]
+    assert list(rows.latest().values) == [101.0, 190.0]
+    assert list(rows.vintage('first').values) == [100.0, 200.0]
+
+def test_merge_prefers_the_new_rows():
+    rows = releases().merge(VintageArray.from_rows(['2020-04-01'], ['2020-08-27'], [195.0]))
+    assert list(rows.latest().values) == [101.0, 195.0]
+
+def test_vintages_are_cached_as_deltas(fred):
+    first = vintages.vintage_series('GDPC1', 'first')[0]
+    latest = vintages.vintage_series('GDPC1', '2030-01-01')[0]
+    assert fred.calls['get_series_all_releases'] == 1
+
+    # three releases per observation, stored as three rows
+    stored = cache.load_vintages('GDPC1')
+    assert len(stored['dates']) == 3 * len(latest)
+    assert not np.allclose(first.values, latest.values)
+
+    # a past as-of date is served from the cache, even past the TTL
+    vintages.vintage_series('GDPC1', '2010-01-01', ttl = 0)
+    assert fred.calls['get_series_all_releases'] == 1
+
+def test_level_matches_latest_vintage(fred):
+    import fedchallenge as fc
+    level, _ = fc.fred_api('GDPC1', start = '2006-01-01', end = '2010-12-31')
+    latest, _ = fc.fred_api('GDPC1', start = '2006-01-01', end = '2010-12-31', vintage = '2030-01-01')
+    np.testing.assert_allclose(latest.to_numpy(), level.to_numpy())
+    assert pd.Timestamp(latest.index[0]) == pd.Timestamp('2006-01-01')